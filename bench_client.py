@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+プロトコル共通のベンチマーククライアント
+HTTP/2（httpx + h2）とHTTP/3（aioquic）を同じイベントループ・同じ計時コードで実行し、
+共通の結果型 FetchResult を返す。docker_benchmark.sh の bench_once は両プロトコルとも
+このクライアントを呼び出す（curl と Python クライアントの計測方法の差をなくすため）
+
+計時はどちらも perf_counter_ns で、クライアント生成（SSLコンテキスト構築）後から
+レスポンスボディの最終バイト受信までを time_total とし、フェーズは http3_client.phase_times
+で開始からの累積秒に変換する
+
+出力（--output curl）: time_total,speed_download(バイト/秒),http_version,size_download
+（curl -w "%{time_total},%{speed_download},%{http_version},%{size_download}" と同じ並び）
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+from urllib.parse import urlparse
+
+import anyio
+import httpx
+
+from benchmark_csv import PHASE_FIELDS
+from http3_client import HTTP3Client, REQUEST_TIMEOUT_SEC, phase_times
+from throughput_timeline import DEFAULT_BIN_SEC, ThroughputTimeline, next_timeline_path
+
+PROTOCOLS = ('h2', 'h3')
+PROTOCOL_LABELS = {'h2': 'HTTP/2', 'h3': 'HTTP/3'}
+
+# httpcoreのtraceイベント → phase_times() の引数
+TRACE_STAMPS = {
+    'connection.connect_tcp.complete': 'connect_ns',
+    'connection.start_tls.complete': 'appconnect_ns',
+    'http2.receive_response_headers.complete': 'headers_ns',
+    'http11.receive_response_headers.complete': 'headers_ns',
+}
+
+
+@dataclass
+class FetchResult:
+    """1リクエストの計測結果（フェーズは開始からの累積秒、未計測はNone）"""
+    protocol: str
+    status: int
+    http_version: str
+    size_download: int
+    time_total: float
+    time_connect: Optional[float] = None
+    time_appconnect: Optional[float] = None
+    time_starttransfer: Optional[float] = None
+    time_firstbyte: Optional[float] = None
+    time_lastbyte: Optional[float] = None
+    timeline: Optional[ThroughputTimeline] = field(default=None, repr=False)
+
+    @property
+    def ok(self):
+        return self.status == 200 and self.time_total > 0
+
+    @property
+    def speed_download(self):
+        """バイト/秒（curlの speed_download と同じ単位）"""
+        return self.size_download / self.time_total if self.time_total > 0 else 0
+
+    def curl_format(self):
+        """curl -w と同じ並びの4列の後にフェーズ（PHASE_FIELDS の順, 未計測は空）を続ける"""
+        phases = [self.time_connect, self.time_appconnect, self.time_starttransfer,
+                  self.time_firstbyte, self.time_lastbyte]
+        return ','.join([f"{self.time_total:.6f}", f"{self.speed_download:.0f}", self.http_version,
+                         str(self.size_download)] + ['' if t is None else f"{t:.6f}" for t in phases])
+
+    def to_dict(self):
+        result = asdict(self)
+        del result['timeline']
+        return result
+
+    def write_timeline(self, directory, latency_label):
+        """受信スループットの時系列をサイドカーに保存する（記録していなければ何もしない）"""
+        if self.timeline is None:
+            return
+        try:
+            self.timeline.write(next_timeline_path(directory, self.protocol, latency_label),
+                                protocol=self.protocol, latency=latency_label,
+                                time_total=self.time_total, size_download=self.size_download)
+        except OSError as e:
+            print(f"timeline write failed: {e}", file=sys.stderr)
+
+
+async def fetch_h2(url, timeline_bin=None):
+    """HTTP/2（httpx + h2）で1回GETする。接続は毎回新規"""
+    stamps = {}
+
+    async def trace(event_name, info):
+        key = TRACE_STAMPS.get(event_name)
+        if key is not None:
+            stamps[key] = time.perf_counter_ns()
+
+    async with httpx.AsyncClient(http2=True, verify=False, timeout=REQUEST_TIMEOUT_SEC) as client:
+        # クライアント生成は計測に含めない（HTTP/3側の QuicConfiguration 構築と揃える）
+        start_ns = time.perf_counter_ns()
+        timeline = ThroughputTimeline(start_ns, timeline_bin) if timeline_bin else None
+        async with client.stream('GET', url, extensions={'trace': trace}) as response:
+            size_download = 0
+            async for chunk in response.aiter_raw():
+                if chunk:
+                    now_ns = time.perf_counter_ns()
+                    stamps.setdefault('first_byte_ns', now_ns)
+                    if timeline is not None:
+                        timeline.record(now_ns, len(chunk))
+                size_download += len(chunk)
+            end_ns = time.perf_counter_ns()
+
+    phases = phase_times(start_ns, stamps.get('connect_ns'), stamps.get('appconnect_ns'),
+                         stamps.get('headers_ns'), stamps.get('first_byte_ns'), end_ns)
+    return FetchResult(protocol='HTTP/2', status=response.status_code,
+                       http_version=response.http_version.replace('HTTP/', ''),
+                       size_download=size_download, time_total=(end_ns - start_ns) / 1e9,
+                       timeline=timeline, **phases)
+
+
+async def fetch_h3(url, timeline_bin=None):
+    """HTTP/3（aioquic）で1回GETする。接続は毎回新規（1-RTTハンドシェイク）"""
+    result = await HTTP3Client(url, mode='cold', timeline_bin=timeline_bin).fetch()
+    return FetchResult(protocol='HTTP/3', status=result['status'], http_version=str(result['http_version']),
+                       size_download=result['size_download'], time_total=result['time_total'],
+                       timeline=result.get('timeline'), **{f: result[f] for f in PHASE_FIELDS})
+
+
+FETCHERS = {'h2': fetch_h2, 'h3': fetch_h3}
+
+
+async def warm_up(url):
+    """名前解決用のワーカースレッドを事前に起動しておく
+
+    初回の getaddrinfo はスレッド起動を伴い（httpx側のanyioで数十ms）、1プロセス1リクエストで
+    実行すると毎回の計測に上乗せされるため、計時の前に両プロトコル分を一度ずつ済ませる。
+    """
+    parsed = urlparse(url)
+    host, port = parsed.hostname or 'localhost', parsed.port or 443
+    for resolve in (anyio.getaddrinfo, asyncio.get_running_loop().getaddrinfo):
+        try:
+            await resolve(host, port)
+        except OSError:
+            pass
+
+
+async def fetch(protocol, url, timeline_bin=None):
+    """protocol（'h2' / 'h3'）で1回GETし、FetchResult を返す（失敗時は例外）"""
+    return await FETCHERS[protocol](url, timeline_bin)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Protocol-agnostic benchmark client (HTTP/2 and HTTP/3)')
+    parser.add_argument('url', help='Target URL (e.g., https://localhost:8443/1mb)')
+    parser.add_argument('--protocol', choices=PROTOCOLS, required=True, help='使用するプロトコル')
+    parser.add_argument('--output', choices=['curl', 'json'], default='curl', help='出力形式')
+    parser.add_argument('--latency', default='0ms', help='時系列サイドカーに記録する遅延ラベル')
+    parser.add_argument('--timeline-dir', help='受信スループットの時系列サイドカーの保存先ディレクトリ')
+    parser.add_argument('--timeline-bin', type=float, default=DEFAULT_BIN_SEC * 1000,
+                        help='時系列のビン幅（ミリ秒）')
+
+    args = parser.parse_args()
+    timeline_bin = args.timeline_bin / 1000 if args.timeline_dir else None
+
+    await warm_up(args.url)
+    try:
+        result = await fetch(args.protocol, args.url, timeline_bin)
+    except Exception as e:
+        print(f"{PROTOCOL_LABELS[args.protocol]} request failed: {e}", file=sys.stderr)
+        if args.output == 'json':
+            print(json.dumps({'success': False}))
+        sys.exit(1)
+
+    if args.timeline_dir:
+        result.write_timeline(args.timeline_dir, args.latency)
+
+    if args.output == 'curl':
+        print(result.curl_format())
+    else:
+        print(json.dumps(dict(result.to_dict(), success=result.ok)))
+    sys.exit(0 if result.ok else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+ベンチマーク結果CSVの共通スキーマと追記ヘルパー
+http3_client.py（aioquic）と http3_simple_client.py（httpx）の双方から使用する
+"""
+
+import csv
+import os
+
+# フェーズ別タイミング列（リクエスト開始からの累積秒）
+PHASE_FIELDS = ['time_connect', 'time_appconnect', 'time_starttransfer',
+                'time_firstbyte', 'time_lastbyte']
+
+# docker_benchmark.sh と共通のCSVスキーマ（末尾は拡張列）
+CSV_FIELDS = ['timestamp', 'protocol', 'latency', 'iteration', 'time_total',
+              'speed_kbps', 'success', 'http_version', 'mode'] + PHASE_FIELDS
+
+# docker_benchmark.py の結果CSV: 共通スキーマに取得したペイロードサイズ（バイト）を加える
+PAYLOAD_CSV_FIELDS = CSV_FIELDS + ['payload_bytes']
+
+# 多重化ベンチマーク（1接続上でK本の同時ストリーム）のスキーマ: 1行 = 1ストリーム
+# stream_time はバッチ開始からそのストリームの最終バイト受信まで、batch_time は全ストリーム完了まで
+MULTIPLEX_CSV_FIELDS = ['timestamp', 'protocol', 'latency', 'loss', 'iteration', 'streams',
+                        'stream_index', 'stream_time', 'batch_time', 'bytes', 'success', 'http_version']
+
+# ページ読み込みワークロードのスキーマ: 1行 = 1オブジェクト
+# start/end はページ読み込み開始からの秒、page_load_time は全オブジェクト完了まで
+PAGELOAD_CSV_FIELDS = ['timestamp', 'protocol', 'latency', 'iteration', 'workload', 'object_id', 'wave',
+                       'priority', 'size', 'start', 'end', 'bytes', 'page_load_time', 'success', 'http_version']
+
+# 逐次停止規則のサマリー: 1行 = 1条件×1プロトコル（docker_benchmark.py --ci-width）
+STOPPING_CSV_FIELDS = ['timestamp', 'protocol', 'latency', 'criterion', 'target_width', 'iterations', 'samples',
+                       'mean', 'ci_low', 'ci_high', 'relative_width', 'stop_reason']
+
+# tc設定の読み戻し結果: 1行 = 1条件（docker_benchmark.py, netshape.py）
+SHAPING_CSV_FIELDS = ['timestamp', 'latency', 'backend', 'rate_bps', 'delay_ms', 'loss', 'jitter_ms', 'reorder',
+                      'apply_ms']
+
+# ユーザー空間エミュレータ（netem_proxy.py）の統計: 1行 = 1条件×1方向（docker_benchmark.py --emulator）
+# lost は損失モデルで、dropped は待ち行列溢れで捨てたパケット。lateness は予定時刻からの送出の遅れ
+EMULATOR_CSV_FIELDS = ['timestamp', 'latency', 'direction', 'packets', 'bytes', 'lost', 'dropped',
+                       'queue_delay_mean_ms', 'queue_delay_max_ms', 'backlog_max',
+                       'lateness_mean_ms', 'lateness_p99_ms', 'lateness_max_ms']
+
+# 実験マトリクス（experiment.py）: 共通スキーマに条件の全次元を加える
+# condition は条件ID、loss / reorder は%、jitter_ms はミリ秒
+MATRIX_DIMENSION_FIELDS = ['condition', 'bandwidth', 'delay_ms', 'loss', 'jitter_ms', 'reorder', 'payload_bytes']
+MATRIX_CSV_FIELDS = CSV_FIELDS + MATRIX_DIMENSION_FIELDS
+
+
+# トレース再生（trace_replay.py）: latency 列はトレース名、trace_segments は転送中に有効だった区間（; 区切り）
+TRACE_FIELDS = ['trace', 'trace_cycle', 'trace_offset', 'trace_segments']
+TRACE_CSV_FIELDS = CSV_FIELDS + TRACE_FIELDS
+
+# トレースの区間が実際に有効になった時刻: 1行 = 1回の変更（offset は再生の開始からの秒）
+TRACE_APPLIED_FIELDS = ['trace', 'run', 'cycle', 'segment', 'scheduled_offset', 'applied_offset', 'apply_ms',
+                        'skipped', 'bandwidth', 'delay_ms', 'loss']
+
+# 接続確立レート（handshake_bench.py）: 1行 = 1種類（HTTP/3 1-RTT / 0-RTT / TCP+TLS）
+# <段階>_<統計>_ms は接続開始からの時間（connect / handshake / request）、cpu_per_handshake_ms はクライアントのCPU時間
+# not_resumed は 0-RTT の計測で再開できずフルハンドシェイクになった接続の数（handshakes・rate・時間には含めない）
+HANDSHAKE_STAGE_FIELDS = [f'{stage}_{stat}_ms' for stage in ('connect', 'handshake', 'request')
+                          for stat in ('p50', 'p90', 'p99', 'p99.9', 'mean', 'max')]
+HANDSHAKE_CSV_FIELDS = (['timestamp', 'protocol', 'latency', 'concurrency', 'workers', 'duration', 'request',
+                         'handshakes', 'errors', 'resumed', 'not_resumed', 'early_data', 'rate']
+                        + HANDSHAKE_STAGE_FIELDS + ['cpu_per_handshake_ms', 'cpu_utilization', 'client_saturated'])
+
+
+def open_result_csv(csv_path, default_fields=CSV_FIELDS):
+    """追記用にCSVを開き (file, DictWriter) を返す
+
+    既存ファイルにヘッダーがあればその列構成に合わせ、無い列は書き込まない
+    （シェルスクリプトが作成したCSVにもそのまま追記できる）。
+    """
+    fields = None
+    if os.path.exists(csv_path) and os.path.getsize(csv_path) > 0:
+        with open(csv_path, newline='') as f:
+            fields = next(csv.reader(f), None)
+
+    f = open(csv_path, 'a', newline='')
+    writer = csv.DictWriter(f, fieldnames=fields or default_fields, extrasaction='ignore')
+    if not fields:
+        writer.writeheader()
+        f.flush()
+    return f, writer
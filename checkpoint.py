@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+ベンチマークの進捗ジャーナル（中断からの再開用）
+ログディレクトリの journal.jsonl に1行1レコードで追記し、書き込みごとに fsync する:
+
+  {"event": "start",     "bandwidth": "5mbit", "latency": "50ms", "offsets": {"benchmark_results.csv": 1234, ...}}
+  {"event": "iteration", "bandwidth": "5mbit", "latency": "50ms", "protocol": "HTTP/3", "iteration": 6}
+  {"event": "done",      "bandwidth": "5mbit", "latency": "50ms", "means": {"HTTP/2": 1.23, "HTTP/3": 1.18}}
+
+iteration は結果CSVに行をフラッシュした後に記録する進捗の記録（再開の判定には使わない）。
+start はその時点でまだ無いファイルも切り詰め位置0として記録する（条件の途中で初めて作られるファイルも戻す）。
+再開時は done の条件をスキップし、start だけがある書きかけの条件は start 時点のサイズまで
+CSVを切り詰め、その条件の時系列サイドカーも削除して最初から計測し直す
+（ウォームアップと逐次停止規則の状態は条件単位なので、条件の途中からは再開しない）。
+"""
+
+import glob
+import json
+import os
+import shutil
+
+JOURNAL_NAME = 'journal.jsonl'
+
+
+class Journal:
+    def __init__(self, log_dir, bandwidth, resume=True):
+        """resume=False なら既存のジャーナルを破棄して新しく記録する"""
+        self.path = os.path.join(log_dir, JOURNAL_NAME)
+        self.bandwidth = bandwidth
+        # 遅延ラベル → 平均応答時間（完了した条件）
+        self.done = {}
+        # 遅延ラベル → start 時点の各ファイルのサイズ（書きかけの条件）
+        self.pending = {}
+        if resume and os.path.exists(self.path):
+            self._load()
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 書き込み途中で中断された最終行
+                    continue
+                if record.get('bandwidth') != self.bandwidth:
+                    continue
+                latency = record['latency']
+                if record['event'] == 'start':
+                    self.done.pop(latency, None)
+                    self.pending[latency] = record['offsets']
+                elif record['event'] == 'done':
+                    self.pending.pop(latency, None)
+                    self.done[latency] = record['means']
+
+    def _append(self, record):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(dict(record, bandwidth=self.bandwidth), ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def is_done(self, latency_label):
+        return latency_label in self.done
+
+    def means(self, latency_label):
+        return self.done[latency_label]
+
+    def rollback(self, directory, timeline_dir=None):
+        """書きかけの条件の行をCSVから切り詰め、時系列サイドカーを削除する（切り詰めた条件を返す）"""
+        latencies = sorted(self.pending)
+        if not latencies:
+            return []
+        # 条件は順に計測するので、最も手前の start 位置まで切り詰めれば書きかけの行はすべて消える
+        for name in {name for offsets in self.pending.values() for name in offsets}:
+            path = os.path.join(directory, name)
+            offset = min(offsets[name] for offsets in self.pending.values() if name in offsets)
+            if os.path.exists(path) and os.path.getsize(path) > offset:
+                with open(path, 'r+b') as f:
+                    f.truncate(offset)
+        if timeline_dir:
+            for latency in latencies:
+                # ペイロードサイズごとのサブディレクトリ（docker_benchmark.py --payloads）も含める
+                for path in glob.glob(os.path.join(timeline_dir, '**', f"*_{latency}_*.tl"), recursive=True):
+                    os.remove(path)
+                # 実験マトリクス（experiment.py）は条件IDごとのディレクトリに保存する
+                shutil.rmtree(os.path.join(timeline_dir, latency), ignore_errors=True)
+        self.pending.clear()
+        return latencies
+
+    def start(self, latency_label, paths):
+        """条件の計測開始を記録する（paths の各ファイルの現在のサイズを切り詰め位置として残す, 無ければ0）"""
+        offsets = {os.path.basename(p): os.path.getsize(p) if os.path.exists(p) else 0 for p in paths}
+        self._append({'event': 'start', 'latency': latency_label, 'offsets': offsets})
+        self.pending[latency_label] = offsets
+
+    def iteration(self, latency_label, protocol, iteration):
+        self._append({'event': 'iteration', 'latency': latency_label, 'protocol': protocol, 'iteration': iteration})
+
+    def finish(self, latency_label, means):
+        self._append({'event': 'done', 'latency': latency_label, 'means': means})
+        self.pending.pop(latency_label, None)
+        self.done[latency_label] = means
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+HTTP/2とHTTP/3の優位逆転地点の適応的探索
+遅延を一様に全点掃引する代わりに、粗いグリッドを計測して平均応答時間の差
+（HTTP/2 − HTTP/3）の符号が変わる隣接区間を見つけ、その区間を二分して計測を追加する。
+全ての符号変化区間の幅が resolution 以下になるまで繰り返すので、複数の逆転地点も
+それぞれ絞り込まれる。逆転遅延は最終区間の両端の差から線形補間で求める
+（scripts/generate_analysis_report.py の find_crossover_points と同じ考え方）。
+中点で差が得られなかった（計測に失敗した）場合は、区間内でまだ計測していない中点に最も近い
+整数の遅延を計測する。区間内に計測していない点が残っていなければ、その区間はそれ以上絞り込まない。
+"""
+
+import math
+
+
+class CrossoverSearch:
+    def __init__(self, low, high, coarse_step=25, resolution=1):
+        if high <= low:
+            raise ValueError(f"invalid search range: {low}-{high}")
+        self.low = low
+        self.high = high
+        self.coarse_step = max(int(coarse_step), 1)
+        self.resolution = max(int(resolution), 1)
+        # 遅延(ms) → 平均の差 HTTP/2 − HTTP/3（正ならHTTP/3が速い）
+        self.diffs = {}
+
+    def coarse_grid(self):
+        grid = list(range(self.low, self.high + 1, self.coarse_step))
+        if grid[-1] != self.high:
+            grid.append(self.high)
+        return grid
+
+    def _sign_changes(self):
+        """差の符号が変わる隣接した計測点の組（差が得られなかった点は飛ばす）"""
+        points = [(d, diff) for d, diff in sorted(self.diffs.items()) if not math.isnan(diff)]
+        return [(a, da, b, db) for (a, da), (b, db) in zip(points, points[1:]) if (da > 0) != (db > 0)]
+
+    def probe(self, a, b):
+        """区間 (a, b) の内側でまだ計測していない、中点に最も近い遅延（無ければNone）"""
+        untried = [d for d in range(a + 1, b) if d not in self.diffs]
+        if not untried:
+            return None
+        middle = (a + b) / 2
+        return min(untried, key=lambda d: (abs(d - middle), d))
+
+    def brackets(self):
+        """まだ resolution より広く、計測していない点が残っている符号変化区間"""
+        return [(a, b) for a, _, b, _ in self._sign_changes()
+                if b - a > self.resolution and self.probe(a, b) is not None]
+
+    def record(self, delay_ms, means):
+        """1条件の結果を記録する。means はプロトコル名 → 平均応答時間（秒, 計測できなければNone）"""
+        h2, h3 = means.get('HTTP/2'), means.get('HTTP/3')
+        self.diffs[delay_ms] = math.nan if h2 is None or h3 is None else h2 - h3
+
+    async def run(self, measure):
+        """measure(delay_ms) で条件を計測しながら探索し、逆転地点のリストを返す
+
+        measure はプロトコル名 → 平均応答時間 の辞書を返すコルーチン。
+        """
+        for delay in self.coarse_grid():
+            self.record(delay, await measure(delay))
+
+        # 各周回で区間ごとに未計測の点を1つ以上計測するので、有限回で終わる
+        while brackets := self.brackets():
+            for a, b in brackets:
+                delay = self.probe(a, b)
+                if delay is not None:
+                    self.record(delay, await measure(delay))
+        return self.crossovers()
+
+    def crossovers(self):
+        """符号変化区間ごとの逆転地点（線形補間）"""
+        results = []
+        for a, da, b, db in self._sign_changes():
+            results.append({
+                'low': a,
+                'high': b,
+                'latency': a + (b - a) * da / (da - db),
+                # 表記は generate_analysis_report.find_crossover_points に合わせる
+                'direction': 'H3→H2' if da < 0 else 'H2→H3',
+            })
+        return results
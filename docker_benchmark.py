@@ -0,0 +1,670 @@
+#!/usr/bin/env python3
+"""
+Docker環境ベンチマークランナー（docker_benchmark.sh のPython版）
+遅延条件ごとにサーバーコンテナのtcを設定し、HTTP/3とHTTP/2を bench_client.py で
+1プロセス・1イベントループ内で反復計測する（1リクエストごとの date/curl/cut/bc/echo の
+fork をなくし、掃引の実時間を計測そのものに使う）
+
+設定は docker_benchmark.sh と同じ環境変数で与え、コマンドライン引数で上書きできる:
+  DELAYS="0 50 100"   遅延条件（ms, 既定: 0-150msの1ms刻み）
+  ITERATIONS=25       各条件の反復回数（5回を超える場合は先頭5回をウォームアップとして記録しない）
+  BANDWIDTH=5mbit     帯域
+  PAYLOADS="1024 1048576"
+                      遅延条件ごとに /bytes/<N> を各サイズ（バイト）で計測（既定: --url の /1mb のみ）
+  SLEEP_BETWEEN_SEC   反復間の待機時間（秒）
+  TIMELINE=1          受信スループットの時系列を <ログ>/timelines に保存（ビン幅 TIMELINE_BIN_MS）
+  CI_WIDTH=0.05       逐次停止規則: 信頼区間の相対全幅がこれ以下になるまで反復する
+                      （CI_TARGET=mean|diff, MIN_ITERATIONS, MAX_ITERATIONS, stopping_rule.py 参照）
+
+SCHEDULE=randomized（--schedule randomized）では遅延条件の順序をシャッフルし、各遅延で反復ごとに
+HTTP/3, HTTP/2 を1回ずつランダムな順で計測する（schedule.py, シードは schedule.json に記録）。
+
+逐次停止規則を使う場合、ウォームアップ後は HTTP/3, HTTP/2 を1回ずつ交互に計測し、
+条件ごとの反復回数・信頼区間・停止理由を stopping_summary.csv に記録する。
+
+--search を指定すると遅延条件を全点掃引せず、粗いグリッドからHTTP/2とHTTP/3の平均の差の
+符号変化を二分探索で絞り込み（crossover_search.py）、逆転地点を crossovers.json に記録する。
+
+CSVはバッファ付きで追記し、遅延条件ごとにフラッシュする。終了後は scripts/ の
+可視化・分析をライブラリ関数として呼び出す。
+
+遅延条件の変更は netshape.py で htb/netem を change で書き換え、読み戻して一致を確認してから
+計測を始める（確認した値は shaping.csv に記録）。--tc-script で従来の tc_setup.sh による
+再構築と固定の待機時間に戻せる。
+
+--emulator を指定すると tc の代わりに netem_proxy.py（ユーザー空間のUDP+TCP転送プロキシ）を起動して
+経由し、同じ帯域・遅延を与える（NET_ADMIN不要。待ち行列と送出の遅れの統計は emulator_stats.csv）。
+
+--standin を指定すると Docker を使わず standin_server.py（Python版の代替サーバー）をローカルで
+起動して計測する（tc は設定しない。--tc-netns と併用すればその名前空間に設定する）。
+
+進捗は <ログ>/journal.jsonl に記録する（checkpoint.py）。--resume（RESUME=1）で同じ --log-dir を
+指定して再実行すると、完了済みの条件をスキップし、書きかけの条件をCSVから切り詰めて計測し直す。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+from bench_client import PROTOCOL_LABELS, fetch, warm_up
+from benchmark_csv import (EMULATOR_CSV_FIELDS, PAYLOAD_CSV_FIELDS, PHASE_FIELDS, SHAPING_CSV_FIELDS,
+                           STOPPING_CSV_FIELDS, open_result_csv)
+from checkpoint import Journal
+from crossover_search import CrossoverSearch
+from netem_proxy import EmulatorBackend
+import netem_proxy
+from netshape import Shaper, open_shaper
+from schedule import SCHEDULES, Schedule
+import standin_server
+from stopping_rule import CRITERIA, SequentialStopper
+from throughput_timeline import DEFAULT_BIN_SEC, timeline_path
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+COMPOSE_FILE = os.path.join(PROJECT_ROOT, 'docker-compose.router_tc.yml')
+TC_SETUP = os.path.join(PROJECT_ROOT, 'scripts', 'tc_setup.sh')
+SERVER_CONTAINER = 'http3-server'
+# --emulator でクライアントが接続する netem_proxy.py の待ち受けポート（制御ポートはその次）
+EMULATOR_PORT = 9443
+TARGET_URL = 'https://localhost:8443/1mb'
+
+# 1MB転送の検証に使うサイズ
+EXPECTED_BYTES = 1048576
+
+# /bytes/<N> で取得できる最大サイズ（server/main.go の maxBytesResponse と同じ）
+MAX_PAYLOAD_BYTES = 100 * 1024 * 1024
+
+# ITERATIONS がこれを超える場合、先頭この回数をウォームアップとして記録しない
+WARMUP_ITERATIONS = 5
+
+# 計測順（docker_benchmark.sh と同じくHTTP/3が先）
+PROTOCOL_ORDER = ('h3', 'h2')
+
+# コンテナ起動後の待機、tc変更後の安定化待ち（秒, 設定を読み戻して確認できない tc_setup.sh の場合のみ）
+STARTUP_WAIT_SEC = 10
+TC_SETTLE_SEC = 0.7
+
+
+def env_config():
+    """docker_benchmark.sh と同じ環境変数から既定の設定を読む"""
+    delays = os.environ.get('DELAYS')
+    return {
+        'delays': [int(d) for d in delays.split()] if delays else list(range(0, 151)),
+        'iterations': int(os.environ.get('ITERATIONS', 25)),
+        'bandwidth': os.environ.get('BANDWIDTH', '5mbit'),
+        'sleep': float(os.environ.get('SLEEP_BETWEEN_SEC', 0.1)),
+        'timeline': os.environ.get('TIMELINE', '0') == '1',
+        'timeline_bin': float(os.environ.get('TIMELINE_BIN_MS', DEFAULT_BIN_SEC * 1000)),
+        'ci_width': float(os.environ['CI_WIDTH']) if os.environ.get('CI_WIDTH') else None,
+        'ci_target': os.environ.get('CI_TARGET', 'mean'),
+        'min_iterations': int(os.environ.get('MIN_ITERATIONS', 10)),
+        'max_iterations': int(os.environ.get('MAX_ITERATIONS', 100)),
+        'resume': os.environ.get('RESUME', '0') == '1',
+        'schedule': os.environ.get('SCHEDULE', 'sequential'),
+        'seed': int(os.environ['SEED']) if os.environ.get('SEED') else None,
+        'payloads': [int(n) for n in os.environ['PAYLOADS'].split()] if os.environ.get('PAYLOADS') else None,
+    }
+
+
+def payload_url(base_url, size):
+    """計測対象URLのパスを /bytes/<size> に置き換える"""
+    return urlparse(base_url)._replace(path=f"/bytes/{size}").geturl()
+
+
+def compose(bandwidth, *args, check=True):
+    """docker-compose を帯域設定付きで実行する"""
+    return subprocess.run(['docker-compose', '-f', COMPOSE_FILE, *args],
+                          env=dict(os.environ, BANDWIDTH=bandwidth), check=check)
+
+
+def set_docker_latency(delay_ms, bandwidth):
+    """サーバーコンテナ内でtcを設定する（実機環境と同じくサーバー側のみ）"""
+    print(f"遅延設定: {delay_ms}ms (帯域: {bandwidth})")
+    subprocess.run(['docker', 'exec', SERVER_CONTAINER, './tc_setup.sh', 'eth0', bandwidth, f'{delay_ms}ms', '0%'],
+                   stdout=subprocess.DEVNULL, check=False)
+
+
+def set_netns_latency(delay_ms, bandwidth, netns, dev):
+    """ネットワーク名前空間内のインターフェースにtcを設定する（netns_sweep.py 用）"""
+    print(f"遅延設定: {delay_ms}ms (帯域: {bandwidth}, netns: {netns})")
+    subprocess.run(['ip', 'netns', 'exec', netns, TC_SETUP, dev, bandwidth, f'{delay_ms}ms', '0%'],
+                   stdout=subprocess.DEVNULL, check=False)
+
+
+class BenchmarkRunner:
+    def __init__(self, url, log_dir, iterations, sleep_between, timeline_bin=None, stopping=None, journal=None,
+                 schedule=None):
+        """stopping を渡すと逐次停止規則で反復する。journal（checkpoint.Journal）を渡すと進捗を記録する
+
+        schedule（schedule.Schedule）で遅延条件とプロトコルの計測順を決める（既定は従来の順序）。
+
+        stopping は SequentialStopper の引数（target_width, criterion, min_iterations, max_iterations）の辞書。
+        """
+        self.url = url
+        self.log_dir = log_dir
+        self.iterations = iterations
+        self.stopping = stopping
+        self.warmup = WARMUP_ITERATIONS if iterations > WARMUP_ITERATIONS or stopping else 0
+        self.sleep_between = sleep_between
+        self.timeline_bin = timeline_bin
+        self.timeline_dir = os.path.join(log_dir, 'timelines') if timeline_bin else None
+        self.csv_path = os.path.join(log_dir, 'benchmark_results.csv')
+        self.stopping_csv_path = os.path.join(log_dir, 'stopping_summary.csv')
+        self.crossover_path = os.path.join(log_dir, 'crossovers.json')
+        self.shaping_csv_path = os.path.join(log_dir, 'shaping.csv')
+        self.emulator_csv_path = os.path.join(log_dir, 'emulator_stats.csv')
+        # netem_proxy.EmulatorBackend（--emulator のとき, 条件ごとに待ち行列の統計を記録する）
+        self.emulator = None
+        # trace_replay.TraceReplayer（再生中はリクエストと重なった区間を行に加える）
+        self.trace = None
+        self.trace_align = False
+        self.journal = journal
+        self.schedule = schedule or Schedule('sequential')
+        # 転送サイズの検証値と、全ての行に加える列（experiment.py が条件ごとに設定する）
+        self.expected_bytes = EXPECTED_BYTES
+        self.extra_fields = {}
+        # 遅延条件ごとに計測するペイロードサイズ（None なら --url をそのまま取得する）
+        self.payloads = None
+        self._result_file = None
+
+    async def measure(self, protocol, latency_label, iteration):
+        """1回計測してCSVの行を返す（トレースの再生中は重なった区間の列を加える）"""
+        if self.trace is None:
+            return await self._measure(protocol, latency_label, iteration)
+        if self.trace_align:
+            await asyncio.to_thread(self.trace.restart)
+        # 区間の変更に失敗していれば、古い区間で注釈した行を書かずに条件を中止する
+        self.trace.check()
+        started = time.perf_counter()
+        row = await self._measure(protocol, latency_label, iteration)
+        self.trace.check()
+        return dict(row, **self.trace.annotate(started, time.perf_counter()))
+
+    async def _measure(self, protocol, latency_label, iteration):
+        """1回計測してCSVの行を返す（転送サイズ・HTTPバージョンを検証）"""
+        label = PROTOCOL_LABELS[protocol]
+        row = {'timestamp': int(time.time()), 'protocol': label, 'latency': latency_label,
+               'iteration': iteration, 'mode': 'cold', 'payload_bytes': self.expected_bytes, **self.extra_fields}
+        try:
+            result = await fetch(protocol, self.url, self.timeline_bin)
+        except Exception as e:
+            print(f"[WARN] {label}計測に失敗しました: {e} (latency={latency_label} iter={iteration})", file=sys.stderr)
+            return dict(row, success=0, http_version='unknown')
+
+        if result.size_download < self.expected_bytes:
+            print(f"[WARN] {protocol.upper()}測定で不完全な転送を検出: size_download={result.size_download} bytes "
+                  f"(期待値: {self.expected_bytes} bytes) (latency={latency_label} iter={iteration})", file=sys.stderr)
+        if protocol == 'h3' and result.http_version != '3':
+            # HTTP/3未使用の結果は不正データとして記録しない
+            print(f"[WARN] H3測定で http_version={result.http_version} を検出。HTTP/3未使用のためこの結果は除外します "
+                  f"(latency={latency_label} iter={iteration})", file=sys.stderr)
+            return dict(row, success=0, http_version=result.http_version)
+        if not result.ok:
+            return dict(row, success=0, http_version='unknown')
+
+        if self.timeline_dir and result.timeline is not None and iteration > self.warmup:
+            result.timeline.write(timeline_path(self.timeline_dir, label, latency_label, iteration),
+                                  protocol=label, latency=latency_label,
+                                  time_total=result.time_total, size_download=result.size_download)
+
+        # 速度 = (バイト数 * 8) / 時間（秒） → kbps
+        row.update(time_total=f"{result.time_total:.6f}",
+                   speed_kbps=f"{result.size_download * 8 / (result.time_total * 1000):.2f}",
+                   success=1, http_version=result.http_version)
+        row.update({field: '' if getattr(result, field) is None else f"{getattr(result, field):.6f}"
+                    for field in PHASE_FIELDS})
+        return row
+
+    def record(self, writer, row):
+        """結果の行を書き込む（ジャーナルがあればフラッシュしてから完了を記録する）"""
+        writer.writerow(row)
+        if self.journal is not None:
+            self._result_file.flush()
+            # experiment.py の条件は start / done と同じ条件IDで記録する
+            self.journal.iteration(self.extra_fields.get('condition', row['latency']), row['protocol'], row['iteration'])
+
+    async def check_connectivity(self, attempts=5):
+        """両プロトコルで接続できることを確認する（失敗しても続行）"""
+        for attempt in range(1, attempts + 1):
+            results = await asyncio.gather(*(fetch(p, self.url) for p in PROTOCOL_ORDER), return_exceptions=True)
+            if all(not isinstance(r, Exception) and r.ok for r in results):
+                print(f"✓ HTTP/2とHTTP/3接続確認完了 (試行 {attempt}/{attempts})")
+                return True
+            if attempt < attempts:
+                print(f"接続テスト失敗、再試行中... ({attempt}/{attempts})")
+                await asyncio.sleep(2)
+        print("警告: 接続テストに失敗しましたが、ベンチマークを続行します")
+        return False
+
+    async def stabilize(self, rounds=5):
+        """初期安定化（記録しないウォームアップ転送）"""
+        for _ in range(rounds):
+            for protocol in PROTOCOL_ORDER:
+                try:
+                    await fetch(protocol, self.url)
+                except Exception:
+                    pass
+            await asyncio.sleep(0.5)
+
+    async def run_latency(self, writer, latency_label):
+        """1つの遅延条件で両プロトコルを iterations 回ずつ計測し、プロトコルごとの成功した応答時間を返す"""
+        if self.schedule.paired:
+            return await self.run_latency_paired(writer, latency_label)
+        times = {}
+        for protocol in PROTOCOL_ORDER:
+            label = PROTOCOL_LABELS[protocol]
+            print(f"=== {label} ({self.iterations}回) ===")
+            if self.warmup:
+                print(f"  初回{self.warmup}回は除外されます")
+            times[label] = []
+            for i in range(1, self.iterations + 1):
+                row = await self.measure(protocol, latency_label, i)
+                if i > self.warmup:
+                    self.record(writer, row)
+                    if row['success']:
+                        times[label].append(float(row['time_total']))
+                # short idle to stabilize ACK clock and avoid back-to-back bursts
+                if self.sleep_between > 0:
+                    await asyncio.sleep(self.sleep_between)
+            print(f"  成功: {len(times[label])}/{self.iterations - self.warmup}")
+        return times
+
+    def condition_rng(self, latency_label):
+        """条件ごとの乱数列（実験マトリクスでは同じ遅延の条件が複数あるため条件IDで分ける）"""
+        key = self.extra_fields.get('condition', latency_label)
+        if self.payloads and len(self.payloads) > 1:
+            key = f"{key}:{self.expected_bytes}"
+        return self.schedule.rng(key)
+
+    async def run_latency_paired(self, writer, latency_label):
+        """反復ごとに両プロトコルを1回ずつ、組の中はランダムな順で計測する"""
+        print(f"=== HTTP/3, HTTP/2 組ごとにランダム順 ({self.iterations}組) ===")
+        if self.warmup:
+            print(f"  初回{self.warmup}組は除外されます")
+        rng = self.condition_rng(latency_label)
+        times = {PROTOCOL_LABELS[p]: [] for p in PROTOCOL_ORDER}
+        for i in range(1, self.iterations + 1):
+            for protocol in self.schedule.block(rng, PROTOCOL_ORDER):
+                row = await self.measure(protocol, latency_label, i)
+                if i > self.warmup:
+                    self.record(writer, row)
+                    if row['success']:
+                        times[row['protocol']].append(float(row['time_total']))
+                if self.sleep_between > 0:
+                    await asyncio.sleep(self.sleep_between)
+        for label, t in times.items():
+            print(f"  {label} 成功: {len(t)}/{self.iterations - self.warmup}")
+        return times
+
+    async def run_latency_adaptive(self, writer, summary_writer, latency_label):
+        """逐次停止規則で1つの遅延条件を計測し、停止理由をサマリーに記録する（成功した応答時間を返す）"""
+        print(f"=== HTTP/3, HTTP/2 交互 (逐次停止: {self.stopping['criterion']} "
+              f"相対幅≤{self.stopping['target_width']}, {self.stopping['min_iterations']}-"
+              f"{self.stopping['max_iterations']}回) ===")
+        for protocol in PROTOCOL_ORDER:
+            for i in range(1, self.warmup + 1):
+                await self.measure(protocol, latency_label, i)
+                if self.sleep_between > 0:
+                    await asyncio.sleep(self.sleep_between)
+
+        stopper = SequentialStopper(PROTOCOL_ORDER, **self.stopping)
+        rng = self.condition_rng(latency_label)
+        i = self.warmup
+        while active := stopper.active():
+            i += 1
+            if self.schedule.paired:
+                active = self.schedule.block(rng, active)
+            for protocol in active:
+                row = await self.measure(protocol, latency_label, i)
+                self.record(writer, row)
+                stopper.record(protocol, float(row['time_total']) if row['success'] else None)
+                if self.sleep_between > 0:
+                    await asyncio.sleep(self.sleep_between)
+
+        for protocol in PROTOCOL_ORDER:
+            summary = stopper.summary(protocol)
+            row = {k: f"{v:.6f}" if isinstance(v, float) else v for k, v in summary.items()}
+            summary_writer.writerow(dict(row, timestamp=int(time.time()), protocol=PROTOCOL_LABELS[protocol],
+                                         latency=latency_label, **self.extra_fields))
+            print(f"  {PROTOCOL_LABELS[protocol]}: {summary['iterations']}回 平均={summary['mean']:.4f}秒 "
+                  f"相対幅={summary['relative_width']:.4f} 停止理由={summary['stop_reason']}")
+        return {PROTOCOL_LABELS[p]: stopper.samples[p] for p in PROTOCOL_ORDER}
+
+    def use_payload(self, size):
+        """/bytes/<size> を取得して size バイトで検証するよう切り替える"""
+        self.url = payload_url(self.url, size)
+        self.expected_bytes = size
+        self.extra_fields = dict(self.extra_fields, payload_bytes=size)
+        if self.timeline_bin and len(self.payloads) > 1:
+            # 同じ遅延でサイズごとに計測するため時系列はサイズごとのディレクトリに分ける
+            self.timeline_dir = os.path.join(self.log_dir, 'timelines', f"{size}B")
+
+    async def run_protocols(self, writer, summary_writer, latency_label):
+        if self.stopping:
+            return await self.run_latency_adaptive(writer, summary_writer, latency_label)
+        return await self.run_latency(writer, latency_label)
+
+    async def run_condition(self, delay_ms, set_latency, writer, summary_writer):
+        """1つの遅延条件を設定して計測し、プロトコル名 → 平均応答時間（成功なしならNone）を返す
+
+        複数のペイロードサイズを計測する場合は 'HTTP/3 1024B' のようにサイズを付けたキーで返す。
+        """
+        print(f"\n=== 遅延: {delay_ms}ms ===")
+        if set_latency is not None:
+            # pyroute2（0.9以降）の同期APIは実行中のイベントループ内から呼べないため別スレッドで実行する
+            applied = await asyncio.to_thread(set_latency, delay_ms)
+            if applied is None:
+                await asyncio.sleep(TC_SETTLE_SEC)
+            else:
+                self.log_shaping(f"{delay_ms}ms", applied)
+        latency_label = f"{delay_ms}ms"
+        if not self.payloads:
+            times = await self.run_protocols(writer, summary_writer, latency_label)
+        else:
+            times = {}
+            for size in self.schedule.shuffle(self.payloads, f"payloads:{latency_label}"):
+                print(f"--- ペイロード: {size}B ---")
+                self.use_payload(size)
+                for label, t in (await self.run_protocols(writer, summary_writer, latency_label)).items():
+                    times[label if len(self.payloads) == 1 else f"{label} {size}B"] = t
+        if self.emulator is not None:
+            self.log_emulator(latency_label, await asyncio.to_thread(self.emulator.stats))
+        return {label: sum(t) / len(t) if t else None for label, t in times.items()}
+
+    def log_shaping(self, latency_label, applied):
+        """読み戻したtcの設定を shaping.csv に記録する"""
+        f, writer = open_result_csv(self.shaping_csv_path, SHAPING_CSV_FIELDS)
+        with f:
+            writer.writerow(dict(applied, timestamp=int(time.time()), latency=latency_label,
+                                 delay_ms=f"{applied['delay_ms']:.3f}", jitter_ms=f"{applied['jitter_ms']:.3f}",
+                                 apply_ms=f"{applied['apply_ms']:.3f}"))
+        print(f"tc設定確認: 遅延 {applied['delay_ms']:.3f}ms, 帯域 {applied['rate_bps']}bit/s, "
+              f"損失 {applied['loss']:g}% ({applied['backend']}, {applied['apply_ms']:.1f}ms)")
+
+    def log_emulator(self, latency_label, stats):
+        """エミュレータの統計（条件の設定から計測終了まで）を emulator_stats.csv に記録する"""
+        f, writer = open_result_csv(self.emulator_csv_path, EMULATOR_CSV_FIELDS)
+        with f:
+            for direction, summary in stats.items():
+                writer.writerow(dict({k: f"{v:.3f}" if isinstance(v, float) else v for k, v in summary.items()},
+                                     timestamp=int(time.time()), latency=latency_label, direction=direction))
+        down = stats['down']
+        print(f"エミュレータ: 待ち行列遅延 平均{down['queue_delay_mean_ms']:.2f}ms 最大{down['queue_delay_max_ms']:.2f}ms, "
+              f"送出の遅れ p99 {down['lateness_p99_ms']:.3f}ms, 損失{down['lost']} 溢れ{down['dropped']}")
+
+    async def run(self, delays, set_latency, search=None):
+        """遅延条件を順に設定して計測する。set_latency(delay_ms) は tc を設定する関数（Noneなら設定しない）
+
+        set_latency が読み戻した設定（Shaper.apply の戻り値）を返した場合は待機せずに計測を始め、
+        None を返した場合は TC_SETTLE_SEC 待つ。
+
+        search（CrossoverSearch）を渡すと delays の代わりに逆転地点の探索で計測する条件を決める。
+        """
+        if self.payloads:
+            self.use_payload(self.payloads[0])
+        await warm_up(self.url)
+        await self.check_connectivity()
+        print("初期安定化実行中...")
+        await self.stabilize()
+
+        if self.journal is not None:
+            # ペイロードサイズごとのサブディレクトリも含めて timelines 全体から削除する
+            timeline_root = os.path.join(self.log_dir, 'timelines') if self.timeline_dir else None
+            for latency in self.journal.rollback(self.log_dir, timeline_root):
+                print(f"書きかけの条件 {latency} の結果を破棄して計測し直します")
+
+        f, writer = open_result_csv(self.csv_path, PAYLOAD_CSV_FIELDS)
+        summary_f, summary_writer = (open_result_csv(self.stopping_csv_path, STOPPING_CSV_FIELDS + ['payload_bytes'])
+                                     if self.stopping else (None, None))
+        self._result_file = f
+
+        async def measure(d):
+            latency_label = f"{d}ms"
+            if self.journal is not None:
+                if self.journal.is_done(latency_label):
+                    print(f"\n=== 遅延: {d}ms === 完了済みのためスキップ")
+                    return self.journal.means(latency_label)
+                self.journal.start(latency_label, [self.csv_path, self.stopping_csv_path, self.shaping_csv_path,
+                                                   self.emulator_csv_path])
+            means = await self.run_condition(d, set_latency, writer, summary_writer)
+            # 中断されても計測済みの遅延条件が残るよう条件ごとにフラッシュ
+            f.flush()
+            if summary_f is not None:
+                summary_f.flush()
+            if self.journal is not None:
+                self.journal.finish(latency_label, means)
+            return means
+
+        try:
+            if search is None:
+                for d in self.schedule.delays(delays):
+                    await measure(d)
+            else:
+                self.write_crossovers(search, await search.run(measure))
+        finally:
+            f.close()
+            if summary_f is not None:
+                summary_f.close()
+
+    def write_crossovers(self, search, crossovers):
+        """探索結果（逆転地点と計測した条件）を crossovers.json に保存して表示する"""
+        with open(self.crossover_path, 'w') as f:
+            json.dump({
+                'range': [search.low, search.high],
+                'coarse_step': search.coarse_step,
+                'resolution': search.resolution,
+                'measured': sorted(search.diffs),
+                'crossovers': crossovers,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n逆転地点の探索: {len(search.diffs)}条件を計測")
+        if not crossovers:
+            print("  逆転地点は見つかりませんでした")
+        for c in crossovers:
+            print(f"  {c['latency']:.1f}ms ({c['low']}-{c['high']}ms, {c['direction']})")
+
+
+def run_analysis(csv_path, output_dir, timeline_dir=None):
+    """scripts/ の可視化・分析をライブラリ関数として呼び出す（失敗しても続行）"""
+    sys.path.insert(0, os.path.join(PROJECT_ROOT, 'scripts'))
+    try:
+        from visualize_response_time import visualize_response_time
+        from visualize_standard_deviation import visualize_standard_deviation
+        from visualize_percentile_range import visualize_percentile_range
+        from visualize_boxplot import visualize_boxplot
+        from visualize_phase_breakdown import visualize_phase_breakdown
+        from generate_analysis_report import generate_analysis_report
+        from visualize_payload_sweep import visualize_payload_sweep
+    except ImportError as e:
+        print(f"分析ライブラリを読み込めないためグラフ生成をスキップします: {e}")
+        return
+
+    steps = [visualize_response_time, visualize_standard_deviation, visualize_percentile_range,
+             visualize_boxplot, visualize_phase_breakdown, visualize_payload_sweep, generate_analysis_report]
+    print("グラフ生成中...")
+    for step in steps:
+        try:
+            step(csv_path, output_dir)
+        except Exception as e:
+            print(f"[WARN] {step.__name__} に失敗しました: {e}", file=sys.stderr)
+
+    if timeline_dir and os.path.isdir(timeline_dir):
+        from visualize_throughput_timeline import visualize_throughput_timeline
+        try:
+            visualize_throughput_timeline(timeline_dir, output_dir)
+        except Exception as e:
+            print(f"[WARN] visualize_throughput_timeline に失敗しました: {e}", file=sys.stderr)
+
+
+def main():
+    defaults = env_config()
+    parser = argparse.ArgumentParser(description='Docker benchmark runner (Python version of docker_benchmark.sh)')
+    parser.add_argument('--delays', type=int, nargs='+', default=defaults['delays'], help='遅延条件（ms）')
+    parser.add_argument('--iterations', type=int, default=defaults['iterations'], help='各条件の反復回数')
+    parser.add_argument('--bandwidth', default=defaults['bandwidth'], help='帯域 (例: 5mbit)')
+    parser.add_argument('--sleep', type=float, default=defaults['sleep'], help='反復間の待機時間（秒）')
+    parser.add_argument('--url', default=TARGET_URL, help='計測対象のURL')
+    parser.add_argument('--payloads', type=int, nargs='+', default=defaults['payloads'],
+                        help='遅延条件ごとに /bytes/<N> をこれらのサイズ（バイト）で計測する（--url のパスを置き換える）')
+    parser.add_argument('--log-dir', help='出力先（既定: logs/docker_<帯域>mbit_<日時>）')
+    parser.add_argument('--timeline', action='store_true', default=defaults['timeline'],
+                        help='受信スループットの時系列を <ログ>/timelines に保存')
+    parser.add_argument('--timeline-bin', type=float, default=defaults['timeline_bin'], help='時系列のビン幅（ミリ秒）')
+    parser.add_argument('--no-docker', action='store_true',
+                        help='docker-compose の起動・停止とtc設定を行わない（既存の環境をそのまま計測）')
+    parser.add_argument('--ci-width', type=float, default=defaults['ci_width'],
+                        help='逐次停止規則: 信頼区間の相対全幅の目標（指定時のみ有効）')
+    parser.add_argument('--ci-target', choices=CRITERIA, default=defaults['ci_target'],
+                        help='逐次停止規則: mean=プロトコルごとの平均, diff=HTTP/2とHTTP/3の差')
+    parser.add_argument('--min-iterations', type=int, default=defaults['min_iterations'],
+                        help='逐次停止規則: 最小反復回数（ウォームアップを除く）')
+    parser.add_argument('--max-iterations', type=int, default=defaults['max_iterations'],
+                        help='逐次停止規則: 最大反復回数（ウォームアップを除く）')
+    parser.add_argument('--standin', action='store_true',
+                        help='Dockerの代わりに standin_server.py をローカルで起動して計測する（--no-docker を含意）')
+    parser.add_argument('--emulator', action='store_true',
+                        help='tcの代わりに netem_proxy.py（ユーザー空間のエミュレータ）を経由して計測する（NET_ADMIN不要）')
+    parser.add_argument('--tc-netns', help='tcをこのネットワーク名前空間内で設定する（--no-docker を含意）')
+    parser.add_argument('--tc-dev', default='eth0', help='--tc-netns で設定するインターフェース')
+    parser.add_argument('--tc-script', action='store_true',
+                        help='tc_setup.sh で毎回qdiscを作り直す（読み戻しによる確認なし、従来の動作）')
+    parser.add_argument('--search', action='store_true',
+                        help='全点掃引の代わりにHTTP/2とHTTP/3の逆転地点を粗いグリッド＋二分探索で絞り込む')
+    parser.add_argument('--search-range', type=int, nargs=2, metavar=('LOW', 'HIGH'),
+                        help='--search の遅延範囲（ms, 既定: --delays の最小-最大）')
+    parser.add_argument('--coarse-step', type=int, default=25, help='--search の粗いグリッドの間隔（ms）')
+    parser.add_argument('--resolution', type=int, default=1, help='--search で逆転地点を絞り込む幅（ms）')
+    parser.add_argument('--schedule', choices=SCHEDULES, default=defaults['schedule'],
+                        help='計測順: sequential=従来の順序, randomized=遅延をシャッフルしプロトコルを組ごとにランダム順')
+    parser.add_argument('--seed', type=int, default=defaults['seed'], help='--schedule randomized の乱数シード（既定: ランダム）')
+    parser.add_argument('--resume', action='store_true', default=defaults['resume'],
+                        help='--log-dir のジャーナルから再開する（完了済みの条件をスキップ）')
+    parser.add_argument('--no-analysis', action='store_true', help='終了後のグラフ・レポート生成を行わない')
+
+    args = parser.parse_args()
+    if args.resume and not args.log_dir:
+        parser.error('--resume には --log-dir が必要です')
+    if args.payloads:
+        invalid = [n for n in args.payloads if not 0 < n <= MAX_PAYLOAD_BYTES]
+        if invalid:
+            parser.error(f"ペイロードサイズは1-{MAX_PAYLOAD_BYTES}バイトで指定してください: {invalid}")
+        if args.search and len(args.payloads) > 1:
+            parser.error('--search はペイロードサイズを1つだけ指定した場合に使えます')
+
+    bandwidth_suffix = args.bandwidth.replace('mbit', '')
+    log_dir = args.log_dir or os.path.join(
+        'logs', f"docker_{bandwidth_suffix}mbit_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(log_dir, exist_ok=True)
+
+    stopping = None
+    if args.ci_width is not None:
+        stopping = {'target_width': args.ci_width, 'criterion': args.ci_target,
+                    'min_iterations': args.min_iterations, 'max_iterations': args.max_iterations}
+    journal = Journal(log_dir, args.bandwidth, resume=args.resume)
+    # 再開時は中断前と同じ順序になるよう記録済みのシードを使う
+    schedule = (args.resume and Schedule.load(log_dir)) or Schedule(args.schedule, args.seed)
+    schedule.save(log_dir)
+    runner = BenchmarkRunner(args.url, log_dir, args.iterations, args.sleep,
+                             args.timeline_bin / 1000 if args.timeline else None, stopping, journal, schedule)
+    runner.payloads = args.payloads
+    search = None
+    if args.search:
+        low, high = args.search_range or (min(args.delays), max(args.delays))
+        search = CrossoverSearch(low, high, args.coarse_step, args.resolution)
+
+    print("=========================================")
+    print("Docker環境ベンチマーク開始 (Pythonランナー)")
+    print("=========================================")
+    print(f"帯域: {args.bandwidth}")
+    if search:
+        print(f"遅延条件: 逆転地点の探索 ({search.low}ms-{search.high}ms, 粗いグリッド{search.coarse_step}ms, "
+              f"分解能{search.resolution}ms)")
+    else:
+        print(f"遅延条件: {len(args.delays)}個 ({args.delays[0]}ms-{args.delays[-1]}ms)")
+    if args.payloads:
+        print(f"ペイロード: {', '.join(f'{n}B' for n in args.payloads)}")
+    if stopping:
+        print(f"反復回数: 逐次停止 ({args.ci_target}, 相対幅≤{args.ci_width}, {args.min_iterations}-{args.max_iterations}回)")
+    else:
+        print(f"反復回数: {args.iterations}回")
+    print(f"計測順: {schedule.kind}" + (f" (シード: {schedule.seed})" if schedule.paired else ""))
+    print(f"出力先: {log_dir}")
+    if journal.done:
+        print(f"再開: 完了済み {len(journal.done)}条件")
+
+    set_latency = None
+    if search is None and all(journal.is_done(f"{d}ms") for d in args.delays):
+        print("全ての遅延条件が完了済みのため計測をスキップします")
+    else:
+        shaper = None
+        standin = None
+        emulator = None
+        if args.standin:
+            # ループバック上の代替サーバーを計測する（tcは --tc-netns を指定した場合のみ）
+            args.no_docker = True
+            port = urlparse(args.url).port or 443
+            print(f"代替サーバーを起動中... (standin_server.py, ポート {port})")
+            standin = standin_server.spawn(port, os.path.join(log_dir, 'standin.log'))
+        if args.emulator:
+            # クライアントはエミュレータに接続し、エミュレータが --url のサーバーに転送する
+            target = urlparse(args.url)
+            upstream = (socket.gethostbyname(target.hostname), target.port or 443)
+            print(f"エミュレータを起動中... (netem_proxy.py, ポート {EMULATOR_PORT} → {upstream[0]}:{upstream[1]})")
+            emulator = netem_proxy.spawn(EMULATOR_PORT, upstream, log_path=os.path.join(log_dir, 'emulator.log'))
+            runner.url = target._replace(netloc=f"{target.hostname}:{EMULATOR_PORT}").geturl()
+            shaper = Shaper(EmulatorBackend(('127.0.0.1', EMULATOR_PORT + 1)))
+            runner.emulator = shaper.backend
+        if args.tc_netns:
+            args.no_docker = True
+            if args.tc_script and not args.emulator:
+                set_latency = lambda d: set_netns_latency(d, args.bandwidth, args.tc_netns, args.tc_dev)
+            elif shaper is None:
+                shaper = open_shaper(args.tc_dev, netns=args.tc_netns)
+        elif not args.no_docker:
+            print("Docker環境を起動中...")
+            compose(args.bandwidth, 'up', '-d')
+            print("サービス起動を待機中...")
+            time.sleep(STARTUP_WAIT_SEC)
+            if args.tc_script and not args.emulator:
+                set_latency = lambda d: set_docker_latency(d, args.bandwidth)
+            elif shaper is None:
+                shaper = open_shaper('eth0', container=SERVER_CONTAINER)
+        if shaper is not None:
+            print(f"tc設定方法: {shaper.name}")
+            set_latency = lambda d: shaper.apply(args.bandwidth, d)
+        if set_latency is None:
+            print("警告: tcを設定しないため、帯域・遅延の列は設定値のみを表します"
+                  "（--emulator か --tc-netns で条件を与えられます）", file=sys.stderr)
+
+        try:
+            asyncio.run(runner.run(args.delays, set_latency, search))
+        finally:
+            if shaper is not None:
+                shaper.close()
+            for proc in (emulator, standin):
+                if proc is not None:
+                    proc.terminate()
+                    proc.wait()
+            if not args.no_docker:
+                print("Docker環境を停止中...")
+                compose(args.bandwidth, 'down', check=False)
+
+    print("")
+    print("=========================================")
+    print("Docker環境ベンチマーク完了")
+    print("=========================================")
+    print(f"結果ファイル: {runner.csv_path}")
+
+    if not args.no_analysis:
+        run_analysis(runner.csv_path, log_dir, os.path.join(log_dir, 'timelines') if args.timeline else None)
+
+    print(f"完了: {log_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,12 @@ fi
 ITERATIONS="${ITERATIONS:-25}"
 SLEEP_BETWEEN_SEC=0.1
 BANDWIDTH="${BANDWIDTH:-5mbit}"  # 帯域設定（デフォルト: 5Mbps）
+# HTTP/3の実行方法: once (既定, bench_once で1リクエスト1プロセス) / python (http3_client.py のバッチモード)
+# bench_once は両プロトコルとも bench_client.py（同じ計時コード）で計測する
+H3_CLIENT="${H3_CLIENT:-once}"
+# 1: 受信スループットの時系列を $LOG_DIR/timelines に保存（ビン幅 TIMELINE_BIN_MS）
+TIMELINE="${TIMELINE:-0}"
+TIMELINE_BIN_MS="${TIMELINE_BIN_MS:-5}"
 
 # ログディレクトリ作成（帯域情報を含める）
 TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
@@ -35,8 +41,9 @@ mkdir -p "$LOG_DIR"
 
 OUTPUT_CSV="$LOG_DIR/benchmark_results.csv"
 
-# CSVヘッダー
-echo "timestamp,protocol,latency,iteration,time_total,speed_kbps,success,http_version" > "$OUTPUT_CSV"
+# CSVヘッダー（benchmark_csv.CSV_FIELDS と同じ: 共通8列 + mode + フェーズ列）
+PHASE_COLUMNS=",,,,"  # フェーズ列（time_connect..time_lastbyte）が取れなかった行の空欄
+echo "timestamp,protocol,latency,iteration,time_total,speed_kbps,success,http_version,mode,time_connect,time_appconnect,time_starttransfer,time_firstbyte,time_lastbyte" > "$OUTPUT_CSV"
 
 echo "========================================="
 echo "Docker環境ベンチマーク開始 (実測的版)"
@@ -109,40 +116,37 @@ function bench_once() {
     local t=""
     local kb=""
     
-    if [ "$proto" = "H3" ]; then
-        # HTTP/3: UDP ポート 8443（サーバーに直接接続、ホスト側から）
-        # ホスト側のhttp3_clientを使用（存在する場合）、なければコンテナ内のものを使用
-        if [ -f "./http3_client" ]; then
-            # ホスト側から直接接続（tc制限が適用される）
-            out=$(./http3_client https://localhost:8443/1mb 2>/dev/null || echo "")
-        else
-            # フォールバック: コンテナ内から実行（ただし、tc制限を受けない可能性がある）
-            echo "[WARN] ホスト側のhttp3_clientが見つかりません。コンテナ内から実行しますが、tc制限を受けない可能性があります。" >&2
-            out=$(docker exec http3-server /root/http3_client https://localhost:8443/1mb 2>/dev/null || echo "")
-        fi
-    else
-        # HTTP/2: TCP ポート 8443（サーバーに直接接続）
-        # 1MBデータ転送（size_downloadも取得して検証）
-        out=$(curl -k -s -w "%{time_total},%{speed_download},%{http_version},%{size_download}" -o /dev/null --connect-timeout 10 --max-time 30 --http2 https://localhost:8443/1mb 2>/dev/null || echo "")
+    # HTTP/3: UDP ポート 8443 / HTTP/2: TCP ポート 8443（ホスト側からサーバーに直接接続、tc制限が適用される）
+    # 両プロトコルとも bench_client.py で1MB転送し、curl -w と同じ並びで出力（size_downloadも取得して検証）
+    # 5列目以降はフェーズ（PHASE_FIELDS の順）
+    local client_proto
+    client_proto=$([ "$proto" = "H2" ] && echo "h2" || echo "h3")
+    local timeline_args=()
+    if [ "$TIMELINE" = "1" ] && [ "$warmup" != "true" ]; then
+        timeline_args=(--timeline-dir "$LOG_DIR/timelines" --timeline-bin "$TIMELINE_BIN_MS" --latency "$latency_lbl")
     fi
+    out=$(python3 "$PROJECT_ROOT/bench_client.py" --protocol "$client_proto" "${timeline_args[@]}" \
+        https://localhost:8443/1mb 2>/dev/null || echo "")
     
     if [ -n "$out" ]; then
         t=$(echo "$out" | cut -d',' -f1)
         local speed=$(echo "$out" | cut -d',' -f2)
         local http_version=$(echo "$out" | cut -d',' -f3)
         local size_download=$(echo "$out" | cut -d',' -f4)
+        local phases=$(echo "$out" | cut -d',' -f5-9)
+        [ -n "$phases" ] || phases="$PHASE_COLUMNS"
         # 転送サイズが1MB未満の場合は警告
-        if [ -n "$size_download" ] && [ "$size_download" -lt 1048576 ] && [ "$proto" = "H2" ]; then
-            echo "[WARN] H2測定で不完全な転送を検出: size_download=$size_download bytes (期待値: 1048576 bytes) (latency=$latency_lbl iter=$i)" >&2
+        if [ -n "$size_download" ] && [ "$size_download" -lt 1048576 ]; then
+            echo "[WARN] ${proto}測定で不完全な転送を検出: size_download=$size_download bytes (期待値: 1048576 bytes) (latency=$latency_lbl iter=$i)" >&2
         fi
         if [ -n "$t" ] && [ -n "$speed" ]; then
-            # curlのspeed_downloadはバイト/秒
+            # speed_downloadはバイト/秒（curlと同じ単位）
             # size_downloadが利用可能で1MB以上の場合、それから速度を再計算（より正確）
             if [ -n "$size_download" ] && [ "$size_download" -ge 1048576 ] && [ -n "$t" ] && (( $(echo "$t > 0" | bc -l) )); then
                 # 速度 = (バイト数 * 8) / 時間（秒） → kbps
                 speed_kbps=$(echo "scale=2; ($size_download * 8) / ($t * 1000)" | bc -l)
             else
-                # size_downloadが取得できない場合、curlのspeed_downloadを使用（バイト/秒 → kbps）
+                # size_downloadが取得できない場合、speed_downloadを使用（バイト/秒 → kbps）
                 # speed_downloadはバイト/秒なので、kbpsに変換: (bytes/sec * 8) / 1000
                 speed_kbps=$(echo "scale=2; ($speed * 8) / 1000" | bc -l)
             fi
@@ -155,10 +159,10 @@ function bench_once() {
                     # H3指定だが実際はHTTP/3でない場合は不正データとして記録しない
                     if [ "$proto" = "H3" ] && [ "$http_version" != "3" ]; then
                         echo "[WARN] H3測定で http_version=$http_version を検出。HTTP/3未使用のためこの結果は除外します (latency=$latency_lbl iter=$i)" >&2
-                        echo "$ts,$proto_name,$latency_lbl,$i,,,0,$http_version" >> "$OUTPUT_CSV"
+                        echo "$ts,$proto_name,$latency_lbl,$i,,,0,$http_version,cold,$PHASE_COLUMNS" >> "$OUTPUT_CSV"
                     else
                         # 実際に使用されたHTTPバージョンを記録
-                        echo "$ts,$proto_name,$latency_lbl,$i,$t,$kb,1,$http_version" >> "$OUTPUT_CSV"
+                        echo "$ts,$proto_name,$latency_lbl,$i,$t,$kb,1,$http_version,cold,$phases" >> "$OUTPUT_CSV"
                     fi
                 fi
                 return 0
@@ -170,11 +174,28 @@ function bench_once() {
     if [ "$warmup" != "true" ]; then
         local proto_name
         proto_name=$([ "$proto" = "H2" ] && echo "HTTP/2" || echo "HTTP/3")
-        echo "$ts,$proto_name,$latency_lbl,$i,,,0,unknown" >> "$OUTPUT_CSV"
+        echo "$ts,$proto_name,$latency_lbl,$i,,,0,unknown,cold,$PHASE_COLUMNS" >> "$OUTPUT_CSV"
     fi
     return 1
 }
 
+# HTTP/3バッチ実行関数（http3_client.py を1プロセスで反復実行し、CSVへ直接追記）
+function bench_h3_batch() {
+    local latency_lbl="$1"
+    local warmup=0
+    if (( ITERATIONS > 5 )); then
+        warmup=5
+        echo "  初回5回は除外されます"
+    fi
+    local timeline_args=()
+    if [ "$TIMELINE" = "1" ]; then
+        timeline_args=(--timeline-dir "$LOG_DIR/timelines" --timeline-bin "$TIMELINE_BIN_MS")
+    fi
+    python3 "$PROJECT_ROOT/http3_client.py" https://localhost:8443/1mb \
+        --iterations "$ITERATIONS" --warmup "$warmup" --latency "$latency_lbl" \
+        --csv "$OUTPUT_CSV" --sleep "$SLEEP_BETWEEN_SEC" "${timeline_args[@]}" | sed 's/^/  成功: /' || true
+}
+
 # 遅延設定関数（実機環境と同じ：サーバー側のみでtc設定）
 function set_docker_latency() {
     local delay_ms="$1"
@@ -196,7 +217,9 @@ for d in "${DELAYS[@]}"; do
     
     # HTTP/3
     echo "=== HTTP/3 (${ITERATIONS}回) ==="
-    if (( ITERATIONS > 5 )); then
+    if [ "$H3_CLIENT" = "python" ]; then
+        bench_h3_batch "${d}ms"
+    elif (( ITERATIONS > 5 )); then
         echo "  初回5回は除外されます"
         for i in $(seq 1 "$ITERATIONS"); do
             if (( i <= 5 )); then
@@ -263,6 +286,10 @@ if [ -f "$PROJECT_ROOT/venv/bin/activate" ]; then
     python3 "$PROJECT_ROOT/scripts/visualize_standard_deviation.py" 2>/dev/null || true
     python3 "$PROJECT_ROOT/scripts/visualize_percentile_range.py" 2>/dev/null || true
     python3 "$PROJECT_ROOT/scripts/visualize_boxplot.py" 2>/dev/null || true
+    python3 "$PROJECT_ROOT/scripts/visualize_phase_breakdown.py" 2>/dev/null || true
+    if [ -d "$LOG_DIR/timelines" ]; then
+        python3 "$PROJECT_ROOT/scripts/visualize_throughput_timeline.py" 2>/dev/null || true
+    fi
     python3 "$PROJECT_ROOT/scripts/generate_analysis_report.py" 2>/dev/null || true
     echo "生成されたグラフ:"
     echo "  - 応答速度比較グラフ: $LOG_DIR/response_time_comparison.png"
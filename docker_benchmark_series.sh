@@ -31,7 +31,22 @@ echo "Docker環境ベンチマーク連続実行スクリプト"
 echo "=========================================="
 echo "ベンチマーク対象帯域: ${RATES[*]}"
 echo "PROJECT_ROOT: ${PROJECT_ROOT}"
-echo "スクリプト: ${PROJECT_ROOT}/docker_benchmark.sh"
+# 各帯域の掃引を実行するランナー: python (既定, docker_benchmark.py) / sh (docker_benchmark.sh)
+RUNNER="${RUNNER:-python}"
+if [ "$RUNNER" = "sh" ]; then
+  RUNNER_CMD=(bash "${PROJECT_ROOT}/docker_benchmark.sh")
+else
+  RUNNER_CMD=(python3 "${PROJECT_ROOT}/docker_benchmark.py")
+fi
+echo "スクリプト: ${RUNNER_CMD[*]}"
+
+# pythonランナーは帯域ごとの出力を SERIES_DIR/docker_<帯域>mbit にまとめ、ジャーナルから再開する
+# 中断した連続実行を再開するには同じ SERIES_DIR を指定して再実行する
+# （例: SERIES_DIR=logs/docker_series_20250101_120000 ./docker_benchmark_series.sh）
+SERIES_DIR="${SERIES_DIR:-${PROJECT_ROOT}/logs/docker_series_$(date +%Y%m%d_%H%M%S)}"
+if [ "$RUNNER" != "sh" ]; then
+  echo "出力先: ${SERIES_DIR}"
+fi
 echo ""
 
 # デフォルトの遅延範囲と反復回数（環境変数で上書き可能）
@@ -63,12 +78,17 @@ for rate in "${RATES[@]}"; do
   
   tmp_log=$(mktemp)
   trap 'rm -f "$tmp_log"' RETURN
+
+  RATE_ARGS=()
+  if [ "$RUNNER" != "sh" ]; then
+    RATE_ARGS=(--log-dir "${SERIES_DIR}/docker_$(echo "$rate" | sed 's/mbit//')mbit" --resume)
+  fi
   
-  # docker_benchmark.sh を実行（BANDWIDTH環境変数を渡す）
+  # ランナーを実行（BANDWIDTH環境変数を渡す）
   if BANDWIDTH="$rate" DELAYS="$DELAYS" ITERATIONS="$ITERATIONS" SLEEP_BETWEEN_SEC="$SLEEP_BETWEEN_SEC" \
-     bash "${PROJECT_ROOT}/docker_benchmark.sh" 2>&1 | tee "$tmp_log"; then
+     "${RUNNER_CMD[@]}" ${RATE_ARGS[@]+"${RATE_ARGS[@]}"} 2>&1 | tee "$tmp_log"; then
     
-    # ログディレクトリのパスを取得（docker_benchmark.shの出力から）
+    # ログディレクトリのパスを取得（ランナーの出力から）
     completed_path=$(grep -E '完了:|Complete:' "$tmp_log" | tail -n 1 | awk '{print $NF}' || echo "")
     if [ -z "$completed_path" ]; then
       # 別のパターンで検索（"結果ファイル:" や "出力先:" から）
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+実験マトリクスの実行（帯域 × 遅延 × 損失 × ジッター × 並べ替え × ペイロード）
+次元ごとの値のリストを宣言的な仕様（TOML、または PyYAML があれば YAML）で与え、
+全組み合わせ（cartesian）またはラテン超方格（lhs）の計画に展開して条件ごとに計測する。
+
+仕様の例（experiments/sample_matrix.toml）:
+  design = "lhs"          # cartesian / lhs
+  samples = 24            # lhs の条件数
+  seed = 1                # lhs の乱数シード（schedule のシードも兼ねる）
+  iterations = 15
+  schedule = "randomized" # sequential / randomized（schedule.py）
+
+  [dimensions]            # 省略した次元は DEFAULT_DIMENSIONS の1水準
+  bandwidth = ["10mbit", "5mbit", "1mbit"]
+  delay = [0, 50, 100, 150]     # ms
+  loss = [0, 1]                 # %
+  jitter = [0, 10]              # ms（netem delay のジッター）
+  reorder = [0, 25]             # %（netem reorder, 遅延0とは組み合わせられない）
+  payload = [102400, 1048576]   # バイト（/bytes/<N> を取得する）
+
+lhs は各次元の水準をそれぞれ samples/水準数 回ずつ（端数は1回差）現れるよう層別して並べ替え、
+次元間を独立に組み合わせる（連続値ではなく水準のリストに対する離散のラテン超方格）。
+netem は遅延0では並べ替えられない（tc は拒否する）ため、遅延0で並べ替えが0でない条件は
+展開時に無効な条件として計画から除き、表示して design.json の invalid に残す。
+
+結果CSVは共通スキーマに全次元の列（benchmark_csv.MATRIX_DIMENSION_FIELDS）を加えたもので、
+latency 列は従来どおり '50ms' 形式。条件ごとの平均・標準偏差を matrix_summary.csv に、
+展開した計画を design.json に保存する（--resume では保存した計画とジャーナルから再開する）。
+tc は netshape.py で条件ごとに in-place で変更し、読み戻して確認する。
+"""
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tomllib
+from datetime import datetime
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+from bench_client import warm_up
+from benchmark_csv import MATRIX_CSV_FIELDS, MATRIX_DIMENSION_FIELDS, STOPPING_CSV_FIELDS, open_result_csv
+from checkpoint import Journal
+from docker_benchmark import (MAX_PAYLOAD_BYTES, SERVER_CONTAINER, STARTUP_WAIT_SEC, TARGET_URL, BenchmarkRunner,
+                              compose, env_config, payload_url)
+from netshape import open_shaper
+from schedule import SCHEDULES, Schedule
+from stopping_rule import CRITERIA
+
+DESIGNS = ('cartesian', 'lhs')
+
+# 仕様で省略した次元の値
+DEFAULT_DIMENSIONS = {
+    'bandwidth': ['5mbit'],
+    'delay': [0],
+    'loss': [0],
+    'jitter': [0],
+    'reorder': [0],
+    'payload': [1048576],
+}
+
+DESIGN_NAME = 'design.json'
+SUMMARY_NAME = 'matrix_summary.csv'
+
+
+def load_spec(path):
+    """仕様ファイルを読み、既定値を補って検証した辞書を返す"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.toml':
+        with open(path, 'rb') as f:
+            spec = tomllib.load(f)
+    elif ext in ('.yaml', '.yml'):
+        if yaml is None:
+            raise ValueError("YAMLの仕様には PyYAML が必要です（pip install pyyaml）")
+        with open(path) as f:
+            spec = yaml.safe_load(f) or {}
+    else:
+        raise ValueError(f"unsupported spec format: {path}")
+
+    unknown = set(spec.get('dimensions', {})) - set(DEFAULT_DIMENSIONS)
+    if unknown:
+        raise ValueError(f"unknown dimensions: {', '.join(sorted(unknown))}")
+    dimensions = {}
+    for name, default in DEFAULT_DIMENSIONS.items():
+        values = spec.get('dimensions', {}).get(name, default)
+        if not isinstance(values, list):
+            values = [values]
+        if not values:
+            raise ValueError(f"dimension '{name}' has no values")
+        dimensions[name] = values
+    for size in dimensions['payload']:
+        if not isinstance(size, int) or not 0 < size <= MAX_PAYLOAD_BYTES:
+            raise ValueError(f"invalid payload size: {size}")
+    dimensions['bandwidth'] = [f"{b}mbit" if str(b).isdigit() else str(b) for b in dimensions['bandwidth']]
+
+    design = spec.get('design', 'cartesian')
+    if design not in DESIGNS:
+        raise ValueError(f"unknown design: {design}")
+    if design == 'lhs' and int(spec.get('samples', 0)) <= 0:
+        raise ValueError("lhs design needs 'samples'")
+    schedule = spec.get('schedule', 'sequential')
+    if schedule not in SCHEDULES:
+        raise ValueError(f"unknown schedule: {schedule}")
+
+    return {
+        'design': design,
+        'samples': int(spec.get('samples', 0)),
+        'seed': spec.get('seed'),
+        'iterations': spec.get('iterations'),
+        'schedule': schedule,
+        'dimensions': dimensions,
+    }
+
+
+def cartesian(dimensions):
+    names = list(dimensions)
+    return [dict(zip(names, values)) for values in itertools.product(*dimensions.values())]
+
+
+def latin_hypercube(dimensions, samples, rng):
+    """水準のリストに対する離散のラテン超方格（各水準の出現回数の差は高々1）"""
+    columns = {}
+    for name, levels in dimensions.items():
+        column = [levels[i * len(levels) // samples] for i in range(samples)]
+        rng.shuffle(column)
+        columns[name] = column
+    return [{name: columns[name][i] for name in dimensions} for i in range(samples)]
+
+
+def invalid_reason(condition):
+    """計測できない条件なら理由を返す（計測できればNone）"""
+    if condition['reorder'] and not condition['delay']:
+        return '遅延0msでは並べ替えを設定できない'
+    return None
+
+
+def expand(spec):
+    """仕様を条件のリストに展開し、(計測する条件, [(無効な条件, 理由)]) を返す
+
+    各条件に条件ID 'c001' … を付ける（無効な条件も番号を消費するので、IDは仕様から一意に決まる）。
+    """
+    if spec['design'] == 'lhs':
+        points = latin_hypercube(spec['dimensions'], spec['samples'], random.Random(spec['seed']))
+    else:
+        points = cartesian(spec['dimensions'])
+    width = max(len(str(len(points))), 3)
+    conditions, invalid = [], []
+    for i, point in enumerate(points, 1):
+        condition = dict(point, condition=f"c{i:0{width}d}")
+        reason = invalid_reason(condition)
+        if reason is None:
+            conditions.append(condition)
+        else:
+            invalid.append((condition, reason))
+    return conditions, invalid
+
+
+def dimension_fields(condition):
+    """CSVに加える条件の列"""
+    return {
+        'condition': condition['condition'],
+        'bandwidth': condition['bandwidth'],
+        'delay_ms': condition['delay'],
+        'loss': condition['loss'],
+        'jitter_ms': condition['jitter'],
+        'reorder': condition['reorder'],
+        'payload_bytes': condition['payload'],
+    }
+
+
+def describe(condition):
+    return (f"帯域 {condition['bandwidth']}, 遅延 {condition['delay']}ms, 損失 {condition['loss']}%, "
+            f"ジッター {condition['jitter']}ms, 並べ替え {condition['reorder']}%, ペイロード {condition['payload']}B")
+
+
+async def run_matrix(runner, conditions, shaper, base_url):
+    """条件を順に設定して計測する（shaper が None ならtcを設定しない）"""
+    runner.url = payload_url(base_url, conditions[0]['payload'])
+    await warm_up(runner.url)
+    await runner.check_connectivity()
+    print("初期安定化実行中...")
+    await runner.stabilize()
+
+    journal = runner.journal
+    for cid in journal.rollback(runner.log_dir, os.path.join(runner.log_dir, 'timelines')):
+        print(f"書きかけの条件 {cid} の結果を破棄して計測し直します")
+
+    f, writer = open_result_csv(runner.csv_path, MATRIX_CSV_FIELDS)
+    summary_f, summary_writer = (open_result_csv(runner.stopping_csv_path, STOPPING_CSV_FIELDS + MATRIX_DIMENSION_FIELDS)
+                                 if runner.stopping else (None, None))
+    runner._result_file = f
+    try:
+        for n, condition in enumerate(conditions, 1):
+            cid = condition['condition']
+            if journal.is_done(cid):
+                print(f"\n=== [{n}/{len(conditions)}] {cid} === 完了済みのためスキップ")
+                continue
+            print(f"\n=== [{n}/{len(conditions)}] {cid}: {describe(condition)} ===")
+            journal.start(cid, [runner.csv_path, runner.stopping_csv_path, runner.shaping_csv_path])
+            latency_label = f"{condition['delay']}ms"
+            if shaper is not None:
+                applied = await asyncio.to_thread(shaper.apply, condition['bandwidth'], condition['delay'],
+                                                  f"{condition['loss']}%", condition['jitter'],
+                                                  f"{condition['reorder']}%")
+                runner.log_shaping(latency_label, applied)
+
+            runner.url = payload_url(base_url, condition['payload'])
+            runner.expected_bytes = condition['payload']
+            runner.extra_fields = dimension_fields(condition)
+            if runner.timeline_bin:
+                # 同じ遅延の条件が複数あるため時系列は条件ごとのディレクトリに分ける
+                runner.timeline_dir = os.path.join(runner.log_dir, 'timelines', cid)
+            if runner.stopping:
+                times = await runner.run_latency_adaptive(writer, summary_writer, latency_label)
+            else:
+                times = await runner.run_latency(writer, latency_label)
+
+            f.flush()
+            if summary_f is not None:
+                summary_f.flush()
+            journal.finish(cid, {label: statistics.fmean(t) if t else None for label, t in times.items()})
+    finally:
+        f.close()
+        if summary_f is not None:
+            summary_f.close()
+
+
+def write_summary(csv_path, output_path):
+    """条件×プロトコルごとの標本数・平均・標準偏差・中央値を保存する（性能曲面の表）"""
+    groups = {}
+    with open(csv_path, newline='') as f:
+        for row in csv.DictReader(f):
+            if row['success'] != '1':
+                continue
+            key = tuple(row[k] for k in MATRIX_DIMENSION_FIELDS) + (row['protocol'],)
+            groups.setdefault(key, []).append(float(row['time_total']))
+
+    fields = MATRIX_DIMENSION_FIELDS + ['protocol', 'samples', 'mean', 'std', 'median']
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for key, times in sorted(groups.items()):
+            writer.writerow(dict(zip(MATRIX_DIMENSION_FIELDS + ['protocol'], key), samples=len(times),
+                                 mean=f"{statistics.fmean(times):.6f}",
+                                 std=f"{statistics.stdev(times):.6f}" if len(times) > 1 else '',
+                                 median=f"{statistics.median(times):.6f}"))
+    return len(groups)
+
+
+def main():
+    defaults = env_config()
+    parser = argparse.ArgumentParser(description='Run a multi-dimensional experiment matrix')
+    parser.add_argument('spec', help='実験仕様（.toml / .yaml）')
+    parser.add_argument('--url', default=TARGET_URL, help='計測対象のURL（パスは /bytes/<ペイロード> に置き換える）')
+    parser.add_argument('--iterations', type=int, help='各条件の反復回数（既定: 仕様の iterations, 無ければ ITERATIONS）')
+    parser.add_argument('--sleep', type=float, default=defaults['sleep'], help='反復間の待機時間（秒）')
+    parser.add_argument('--log-dir', help='出力先（既定: logs/matrix_<日時>）')
+    parser.add_argument('--timeline', action='store_true', default=defaults['timeline'],
+                        help='受信スループットの時系列を <ログ>/timelines/<条件ID> に保存')
+    parser.add_argument('--timeline-bin', type=float, default=defaults['timeline_bin'], help='時系列のビン幅（ミリ秒）')
+    parser.add_argument('--ci-width', type=float, default=defaults['ci_width'],
+                        help='逐次停止規則: 信頼区間の相対全幅の目標（docker_benchmark.py と同じ）')
+    parser.add_argument('--ci-target', choices=CRITERIA, default=defaults['ci_target'],
+                        help='逐次停止規則: mean / diff')
+    parser.add_argument('--min-iterations', type=int, default=defaults['min_iterations'], help='逐次停止規則: 最小反復回数')
+    parser.add_argument('--max-iterations', type=int, default=defaults['max_iterations'], help='逐次停止規則: 最大反復回数')
+    parser.add_argument('--no-docker', action='store_true',
+                        help='docker-compose の起動・停止とtc設定を行わない（既存の環境をそのまま計測）')
+    parser.add_argument('--tc-netns', help='tcをこのネットワーク名前空間内で設定する（--no-docker を含意）')
+    parser.add_argument('--tc-dev', default='eth0', help='--tc-netns で設定するインターフェース')
+    parser.add_argument('--resume', action='store_true', default=defaults['resume'],
+                        help='--log-dir に保存した計画とジャーナルから再開する')
+
+    args = parser.parse_args()
+    if args.resume and not args.log_dir:
+        parser.error('--resume には --log-dir が必要です')
+
+    log_dir = args.log_dir or os.path.join('logs', f"matrix_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(log_dir, exist_ok=True)
+    design_path = os.path.join(log_dir, DESIGN_NAME)
+    if args.resume and os.path.exists(design_path):
+        with open(design_path) as f:
+            saved = json.load(f)
+        spec, conditions = saved['spec'], saved['conditions']
+    else:
+        try:
+            spec = load_spec(args.spec)
+        except (OSError, ValueError, tomllib.TOMLDecodeError) as e:
+            parser.error(f"実験仕様を読み込めません: {e}")
+        conditions, invalid = expand(spec)
+        for condition, reason in invalid:
+            print(f"無効な条件を除外: {condition['condition']}: {describe(condition)} ({reason})", file=sys.stderr)
+        if not conditions:
+            parser.error('計測できる条件がありません')
+        with open(design_path, 'w') as f:
+            json.dump({'spec': spec, 'conditions': conditions,
+                       'invalid': [dict(condition, reason=reason) for condition, reason in invalid]},
+                      f, ensure_ascii=False, indent=2)
+
+    schedule = (args.resume and Schedule.load(log_dir)) or Schedule(spec['schedule'], spec['seed'])
+    schedule.save(log_dir)
+    conditions = schedule.shuffle(conditions, 'conditions')
+
+    iterations = args.iterations or spec['iterations'] or defaults['iterations']
+    stopping = None
+    if args.ci_width is not None:
+        stopping = {'target_width': args.ci_width, 'criterion': args.ci_target,
+                    'min_iterations': args.min_iterations, 'max_iterations': args.max_iterations}
+    journal = Journal(log_dir, 'matrix', resume=args.resume)
+    runner = BenchmarkRunner(args.url, log_dir, iterations, args.sleep,
+                             args.timeline_bin / 1000 if args.timeline else None, stopping, journal, schedule)
+
+    print("=========================================")
+    print("実験マトリクス開始")
+    print("=========================================")
+    print(f"計画: {spec['design']} ({len(conditions)}条件)")
+    for name, values in spec['dimensions'].items():
+        print(f"  {name}: {values}")
+    print(f"反復回数: {iterations}回" if not stopping else f"反復回数: 逐次停止 ({args.ci_target}, 相対幅≤{args.ci_width})")
+    print(f"計測順: {schedule.kind}" + (f" (シード: {schedule.seed})" if schedule.paired else ""))
+    print(f"出力先: {log_dir}")
+    if journal.done:
+        print(f"再開: 完了済み {len(journal.done)}条件")
+
+    pending = [c for c in conditions if not journal.is_done(c['condition'])]
+    if pending:
+        shaper = None
+        if args.tc_netns:
+            args.no_docker = True
+            shaper = open_shaper(args.tc_dev, netns=args.tc_netns)
+        elif not args.no_docker:
+            print("Docker環境を起動中...")
+            compose(pending[0]['bandwidth'], 'up', '-d')
+            print("サービス起動を待機中...")
+            time.sleep(STARTUP_WAIT_SEC)
+            shaper = open_shaper('eth0', container=SERVER_CONTAINER)
+        if shaper is None:
+            print("警告: tcを設定しないため、帯域・遅延・損失・ジッター・並べ替えの列は設定値のみを表します",
+                  file=sys.stderr)
+        else:
+            print(f"tc設定方法: {shaper.name}")
+
+        try:
+            asyncio.run(run_matrix(runner, conditions, shaper, args.url))
+        finally:
+            if shaper is not None:
+                shaper.close()
+            if not args.no_docker:
+                print("Docker環境を停止中...")
+                compose(pending[0]['bandwidth'], 'down', check=False)
+    else:
+        print("全ての条件が完了済みのため計測をスキップします")
+
+    summary_path = os.path.join(log_dir, SUMMARY_NAME)
+    groups = write_summary(runner.csv_path, summary_path)
+    print("")
+    print("=========================================")
+    print("実験マトリクス完了")
+    print("=========================================")
+    print(f"結果ファイル: {runner.csv_path}")
+    print(f"条件別サマリー: {summary_path} ({groups}行)")
+    print(f"完了: {log_dir}")
+
+
+if __name__ == "__main__":
+    main()
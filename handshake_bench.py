@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+接続確立レートのベンチマーク（1秒あたりのハンドシェイク数）
+多数の asyncio タスクがそれぞれ「接続 → ハンドシェイク完了 → 切断」を一定時間繰り返し、
+達成したレート、ハンドシェイク時間のパーセンタイル、クライアントの1ハンドシェイクあたりのCPU時間を求める。
+エッジでは大きな転送よりも接続の張り替え（コネクションチャーン）のコストが効くため、
+転送時間ではなく接続の確立そのものを比較する。
+
+接続の種類（--kinds）:
+  1rtt  HTTP/3 の新規接続（HTTP3Client の cold と同じ接続経路, 証明書を含むフルハンドシェイク）
+  0rtt  HTTP/3 のセッション再開（タスクごとに直前の接続で受け取ったチケットを使う。
+        --request ではリクエストをハンドシェイク完了を待たずに 0-RTT で送る）
+  tcp   TCP + TLS 1.3（ALPN h2）の新規接続
+
+計測する時間（接続開始からの秒）:
+  connect    UDPソケットの接続 / TCPの3ウェイハンドシェイク完了
+  handshake  QUIC / TLS ハンドシェイク完了
+  request    --request 指定時、1回のGETのレスポンス終端まで（TCP は HTTP/2）
+
+各タスクの最初の1接続は計測しない（0rtt はここで最初のチケットを受け取る）。0rtt で接続に
+失敗するとチケットは使われたまま次のチケットが届かないため、次の接続はフルハンドシェイクになる。
+再開できなかった接続は 0-RTT の時間・レートに含めず not_resumed として別に数え、その接続で
+受け取ったチケットで再開を続ける。切断は
+バックグラウンドで行い、タスクはすぐ次の接続を開く。CPU時間は計測区間の process_time で、
+切断処理やサーバーからの受信も含む（クライアント側のみ。サーバー側のCPUは計測しない）。
+純Pythonのクライアントは1コアで頭打ちになるため、--workers で http3_load.py と同じく
+ワーカープロセスに分割してヒストグラムをマージできる。
+
+RTT を固定するには --emulator（netem_proxy.py を経由し、--delay を下り方向に与える）か、
+tc で遅延を設定したサーバーを対象にする。netem_proxy.py は TCP をプロキシで終端して中継するため、
+--emulator では TCP の connect に遅延が入らない（TLS ハンドシェイク以降には入る）。
+
+  python3 handshake_bench.py --standin --emulator --delay 20ms --duration 10 --concurrency 32 --csv handshakes.csv
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+from h2.events import DataReceived, ResponseReceived, StreamEnded, StreamReset
+
+from benchmark_csv import HANDSHAKE_CSV_FIELDS, open_result_csv
+from docker_benchmark import EMULATOR_PORT
+from http3_client import HTTP3Client, REQUEST_TIMEOUT_SEC
+from http3_load import CPU_SATURATION_THRESHOLD, PERCENTILES, LatencyHistogram, StartBarrier
+import netem_proxy
+import standin_server
+
+# 接続の種類と結果に記録するプロトコル名
+KINDS = ('1rtt', '0rtt', 'tcp')
+KIND_LABELS = {'1rtt': 'HTTP/3 1-RTT', '0rtt': 'HTTP/3 0-RTT', 'tcp': 'TCP+TLS'}
+
+# 記録する時間（接続開始からの秒）
+STAGES = ('connect', 'handshake', 'request')
+
+DEFAULT_URL = 'https://localhost:8443/'
+
+# 計測終了後、バックグラウンドの切断を待つ上限（秒）
+CLOSE_WAIT_SEC = 5.0
+
+
+class TicketSlot:
+    """直前の接続で受け取ったセッションチケットを1枚だけ保持する（SessionTicketCache と同じ load/store）
+
+    チケットは1回使ったら捨てる（サーバーは使用済みのチケットを受け付けないことがあるため）。
+    """
+
+    def __init__(self):
+        self.ticket = None
+        self.waiter = None
+
+    def load(self, key):
+        ticket, self.ticket = self.ticket, None
+        return ticket
+
+    def store(self, key, ticket):
+        self.ticket = ticket
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(ticket)
+
+
+class Target:
+    """接続先と接続ごとに共有する設定"""
+
+    def __init__(self, url, request=False):
+        parsed = urlparse(url)
+        self.url = url
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 443
+        self.path = parsed.path or '/'
+        self.authority = f'{self.host}:{self.port}'
+        self.request = request
+        # TCP+TLS（証明書検証は HTTP3Client と同じく無効）
+        self.tls = ssl.create_default_context()
+        self.tls.check_hostname = False
+        self.tls.verify_mode = ssl.CERT_NONE
+        self.tls.set_alpn_protocols(['h2'])
+
+
+def _elapsed(start_ns, ns):
+    return None if ns is None else max(ns - start_ns, 0) / 1e9
+
+
+async def quic_connection(target, ticket_slot=None):
+    """HTTP/3 接続を1本確立し、(計測結果, 切断用のクライアント) を返す"""
+    mode = 'cold' if ticket_slot is None else 'resume'
+    start_ns = time.perf_counter_ns()
+    client = HTTP3Client(target.url, mode=mode, ticket_cache=ticket_slot)
+    if ticket_slot is not None:
+        ticket_slot.waiter = asyncio.get_running_loop().create_future()
+    try:
+        protocol = await client.open()
+        request_ns = None
+        if target.request:
+            # resume でチケットがあれば、ハンドシェイク完了を待たずに 0-RTT で送られる
+            response = await protocol.get(client.authority, client.path)
+            if response['status'] != 200:
+                raise ConnectionError(f"HTTP status {response['status']}")
+            request_ns = response['last_byte_ns']
+        # 0-RTT で送るデータが無くてもハンドシェイクを始める（resume では open() が送信を保留する）
+        protocol.transmit()
+        # 完了済みの接続で wait_connected() を呼ぶと戻らない（aioquic は待機中の場合のみ接続済みにする）
+        if protocol.handshake_ns is None:
+            await protocol.wait_connected()
+        result = {
+            'connect': _elapsed(start_ns, protocol.connected_ns),
+            'handshake': _elapsed(start_ns, protocol.handshake_ns),
+            'request': _elapsed(start_ns, request_ns),
+            'resumed': protocol.session_resumed,
+            'early_data': protocol.early_data_accepted,
+        }
+        if ticket_slot is not None:
+            # 次の接続のチケット（ハンドシェイク後にサーバーから届く）を受け取ってから切断する
+            await ticket_slot.waiter
+    except BaseException:
+        await client.close()
+        raise
+    return result, client
+
+
+async def h2_get(reader, writer, target):
+    """確立済みのTLS接続上で HTTP/2 の GET を1回行い、ステータスを返す"""
+    conn = H2Connection(config=H2Configuration(client_side=True, header_encoding=None))
+    conn.initiate_connection()
+    stream_id = conn.get_next_available_stream_id()
+    conn.send_headers(stream_id, [
+        (b':method', b'GET'),
+        (b':path', target.path.encode()),
+        (b':scheme', b'https'),
+        (b':authority', target.authority.encode()),
+    ], end_stream=True)
+    writer.write(conn.data_to_send())
+
+    status = None
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            raise ConnectionError('connection closed before response end')
+        ended = False
+        for event in conn.receive_data(data):
+            if isinstance(event, ResponseReceived) and event.stream_id == stream_id:
+                status = int(dict(event.headers)[b':status'])
+            elif isinstance(event, DataReceived):
+                conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, StreamReset) and event.stream_id == stream_id:
+                raise ConnectionError(f"stream reset (error code {event.error_code})")
+            elif isinstance(event, StreamEnded) and event.stream_id == stream_id:
+                ended = True
+        writer.write(conn.data_to_send())
+        if ended:
+            return status
+
+
+async def tcp_connection(target):
+    """TCP + TLS 接続を1本確立し、(計測結果, 切断用の StreamWriter) を返す"""
+    start_ns = time.perf_counter_ns()
+    reader, writer = await asyncio.open_connection(target.host, target.port)
+    try:
+        connect_ns = time.perf_counter_ns()
+        await writer.start_tls(target.tls, server_hostname=target.host)
+        handshake_ns = time.perf_counter_ns()
+        request_ns = None
+        if target.request:
+            status = await h2_get(reader, writer, target)
+            if status != 200:
+                raise ConnectionError(f"HTTP status {status}")
+            request_ns = time.perf_counter_ns()
+    except BaseException:
+        writer.close()
+        raise
+    return {
+        'connect': _elapsed(start_ns, connect_ns),
+        'handshake': _elapsed(start_ns, handshake_ns),
+        'request': _elapsed(start_ns, request_ns),
+        'resumed': False,
+        'early_data': False,
+    }, writer
+
+
+async def _close(handle):
+    """切断する（切断時のエラーは計測結果に影響しないため無視する）"""
+    try:
+        if isinstance(handle, HTTP3Client):
+            await handle.close()
+        else:
+            handle.close()
+            await handle.wait_closed()
+    except (OSError, ConnectionError):
+        pass
+
+
+async def run_handshakes(url, kind, duration, concurrency=1, request=False, histograms=None, barrier=None):
+    """concurrency 本のタスクで duration 秒間接続を確立し続け、結果のサマリーを辞書で返す
+
+    histograms（STAGES → LatencyHistogram）を渡すと時間をそこに記録する。barrier（StartBarrier）を
+    渡すと、各タスクの最初の接続の後に準備完了を伝え、配られた開始時刻まで待ってから計測を開始する。
+    """
+    if kind not in KINDS:
+        raise ValueError(f"unknown kind: {kind}")
+    target = Target(url, request)
+    histograms = histograms if histograms is not None else {stage: LatencyHistogram() for stage in STAGES}
+    counts = {'handshakes': 0, 'errors': 0, 'resumed': 0, 'not_resumed': 0, 'early_data': 0}
+    closing = set()
+
+    async def connection(ticket_slot):
+        if kind == 'tcp':
+            coro = tcp_connection(target)
+        else:
+            coro = quic_connection(target, ticket_slot)
+        result, handle = await asyncio.wait_for(coro, timeout=REQUEST_TIMEOUT_SEC)
+        # 切断（QUIC のドレイン期間を含む）は待たずに次の接続へ進む
+        task = asyncio.create_task(_close(handle))
+        closing.add(task)
+        task.add_done_callback(closing.discard)
+        return result
+
+    async def churn(ticket_slot, deadline):
+        while time.perf_counter() < deadline:
+            try:
+                result = await connection(ticket_slot)
+            except Exception as e:
+                print(f"{KIND_LABELS[kind]} connection failed: {e!r}", file=sys.stderr)
+                counts['errors'] += 1
+                continue
+            if kind == '0rtt' and not result['resumed']:
+                # 失敗した接続がチケットを使ってしまった後のフルハンドシェイク（次のチケットの取り直し）
+                counts['not_resumed'] += 1
+                continue
+            counts['handshakes'] += 1
+            counts['resumed'] += result['resumed']
+            counts['early_data'] += result['early_data']
+            for stage in STAGES:
+                if result[stage] is not None:
+                    histograms[stage].record(result[stage])
+
+    # 各タスクの最初の接続（計測しない。0rtt はチケットを受け取る）
+    slots = [TicketSlot() if kind == '0rtt' else None for _ in range(concurrency)]
+    primed = await asyncio.gather(*(connection(slot) for slot in slots), return_exceptions=True)
+    for error in (r for r in primed if isinstance(r, BaseException)):
+        print(f"{KIND_LABELS[kind]} priming connection failed: {error!r}", file=sys.stderr)
+    if barrier is not None:
+        start_at = await asyncio.to_thread(barrier.wait)
+        await asyncio.sleep(max(start_at - time.time(), 0))
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(churn(slot, start + duration) for slot in slots))
+        elapsed = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+    finally:
+        if closing:
+            await asyncio.wait(list(closing), timeout=CLOSE_WAIT_SEC)
+
+    handshakes = counts['handshakes']
+    return {
+        'kind': kind,
+        'protocol': KIND_LABELS[kind],
+        'concurrency': concurrency,
+        'duration': duration,
+        'request': request,
+        'elapsed': elapsed,
+        **counts,
+        'rate': handshakes / elapsed if elapsed > 0 else 0,
+        'latency': {stage: histograms[stage].summary() for stage in STAGES if histograms[stage].total},
+        'cpu_seconds': cpu_seconds,
+        'cpu_per_handshake': cpu_seconds / handshakes if handshakes else None,
+        'cpu_utilization': cpu_seconds / elapsed if elapsed > 0 else 0,
+    }
+
+
+def _worker_main(url, kind, duration, concurrency, request, barrier):
+    """ワーカープロセス: 独自のイベントループで接続を確立し続け、サマリーとヒストグラムを返す"""
+    histograms = {stage: LatencyHistogram() for stage in STAGES}
+    try:
+        summary = asyncio.run(run_handshakes(url, kind, duration, concurrency, request, histograms, barrier))
+    except BaseException:
+        barrier.abort()
+        raise
+    return summary, histograms
+
+
+def run_multiprocess(url, kind, duration, concurrency=1, request=False, workers=None):
+    """タスクをワーカープロセスに分割して接続を確立し続け、結果をマージして返す"""
+    workers = workers or os.cpu_count() or 1
+    concurrency = max(concurrency, workers)
+
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+        barrier = StartBarrier(manager, workers)
+        futures = []
+        for w in range(workers):
+            # タスクの端数は先頭のワーカーに割り当てる
+            worker_concurrency = concurrency // workers + (1 if w < concurrency % workers else 0)
+            futures.append(executor.submit(_worker_main, url, kind, duration, worker_concurrency, request, barrier))
+        try:
+            barrier.release()
+        except threading.BrokenBarrierError:
+            # 準備の前に失敗したワーカーがいる（その例外は result() で送出される）
+            pass
+        results = [future.result() for future in futures]
+
+    merged = {stage: LatencyHistogram() for stage in STAGES}
+    for _, histograms in results:
+        for stage in STAGES:
+            merged[stage].merge(histograms[stage])
+    summaries = [summary for summary, _ in results]
+    elapsed = max(summary['elapsed'] for summary in summaries)
+    handshakes = sum(summary['handshakes'] for summary in summaries)
+    cpu_seconds = sum(summary['cpu_seconds'] for summary in summaries)
+    return {
+        'kind': kind,
+        'protocol': KIND_LABELS[kind],
+        'concurrency': concurrency,
+        'duration': duration,
+        'request': request,
+        'elapsed': elapsed,
+        **{key: sum(summary[key] for summary in summaries)
+           for key in ('handshakes', 'errors', 'resumed', 'not_resumed', 'early_data')},
+        'rate': handshakes / elapsed if elapsed > 0 else 0,
+        'latency': {stage: merged[stage].summary() for stage in STAGES if merged[stage].total},
+        'cpu_seconds': cpu_seconds,
+        'cpu_per_handshake': cpu_seconds / handshakes if handshakes else None,
+        'cpu_utilization': cpu_seconds / elapsed if elapsed > 0 else 0,
+        'workers': [{'worker': w, 'concurrency': s['concurrency'], 'handshakes': s['handshakes'],
+                     'errors': s['errors'], 'rate': s['rate'], 'cpu_seconds': s['cpu_seconds'],
+                     'cpu_utilization': s['cpu_utilization']} for w, s in enumerate(summaries)],
+        'client_saturated': any(s['cpu_utilization'] >= CPU_SATURATION_THRESHOLD for s in summaries),
+    }
+
+
+def _ms(seconds):
+    return '' if seconds is None else f"{seconds * 1000:.3f}"
+
+
+def csv_row(summary, latency_label, workers):
+    """サマリーを HANDSHAKE_CSV_FIELDS の1行にする（時間はミリ秒）"""
+    row = {
+        'timestamp': int(time.time()),
+        'protocol': summary['protocol'],
+        'latency': latency_label,
+        'concurrency': summary['concurrency'],
+        'workers': workers,
+        'duration': f"{summary['elapsed']:.3f}",
+        'request': int(summary['request']),
+        'handshakes': summary['handshakes'],
+        'errors': summary['errors'],
+        'resumed': summary['resumed'],
+        'not_resumed': summary['not_resumed'],
+        'early_data': summary['early_data'],
+        'rate': f"{summary['rate']:.2f}",
+        'cpu_per_handshake_ms': _ms(summary['cpu_per_handshake']),
+        'cpu_utilization': f"{summary['cpu_utilization']:.3f}",
+        'client_saturated': int(summary.get('client_saturated', summary['cpu_utilization'] >= CPU_SATURATION_THRESHOLD)),
+    }
+    for stage in STAGES:
+        stats = summary['latency'].get(stage, {})
+        for key in [f'p{p:g}' for p in PERCENTILES] + ['mean', 'max']:
+            row[f'{stage}_{key}_ms'] = _ms(stats.get(key))
+    return row
+
+
+def describe(summary):
+    """サマリーを1行の説明にする"""
+    handshake = summary['latency'].get('handshake', {})
+    parts = [f"{summary['protocol']:<13} {summary['rate']:8.1f} 接続/秒",
+             f"ハンドシェイク p50 {_ms(handshake.get('p50')) or '-'}ms / p99 {_ms(handshake.get('p99')) or '-'}ms"]
+    request = summary['latency'].get('request')
+    if request:
+        parts.append(f"リクエスト完了 p50 {_ms(request.get('p50'))}ms")
+    parts.append(f"CPU {_ms(summary['cpu_per_handshake']) or '-'}ms/接続 (使用率 {summary['cpu_utilization']:.0%})")
+    parts.append(f"成功 {summary['handshakes']} / 失敗 {summary['errors']}")
+    if summary['kind'] == '0rtt':
+        parts.append(f"再開 {summary['resumed']} / 再開できず {summary['not_resumed']} / 0-RTT受理 {summary['early_data']}")
+    return ', '.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Connection-establishment rate benchmark (1-RTT vs 0-RTT vs TCP+TLS)')
+    parser.add_argument('--url', default=DEFAULT_URL, help='接続先（--request ではこのパスをGETする）')
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=list(KINDS), help='計測する接続の種類（指定順に計測）')
+    parser.add_argument('--duration', type=float, default=10.0, help='種類ごとの計測時間（秒）')
+    parser.add_argument('--concurrency', type=int, default=16, help='接続を確立し続ける asyncio タスクの数')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='ワーカープロセス数（0でCPUコア数, 2以上でヒストグラムをマージ）')
+    parser.add_argument('--request', action='store_true', help='接続ごとにGETを1回行い、レスポンス完了までの時間も記録する')
+    parser.add_argument('--latency', help='CSVに記録する遅延ラベル（既定: --emulator では --delay, それ以外は 0ms）')
+    parser.add_argument('--csv', help='サマリーの追記先CSV（1行 = 1種類）')
+    parser.add_argument('--json', action='store_true', help='サマリーをJSONで出力する（1行 = 1種類）')
+    parser.add_argument('--standin', action='store_true', help='standin_server.py をローカルで起動して計測する')
+    parser.add_argument('--emulator', action='store_true', help='netem_proxy.py を経由し、--delay のRTTを与える')
+    parser.add_argument('--delay', default='0ms', help='--emulator: 遅延（下り方向に与える = RTTの増分）')
+    parser.add_argument('--bandwidth', default='1gbit', help='--emulator: 帯域')
+
+    args = parser.parse_args()
+    if args.concurrency < 1:
+        parser.error('--concurrency は1以上を指定してください')
+    latency_label = args.latency or (args.delay if args.emulator else '0ms')
+    target = urlparse(args.url)
+
+    processes = []
+    try:
+        if args.standin:
+            port = target.port or 443
+            print(f"代替サーバーを起動中... (standin_server.py, ポート {port})", file=sys.stderr)
+            # リクエストごとのログ出力がサーバーのCPUを使わないよう破棄する
+            processes.append(standin_server.spawn(port, os.devnull))
+        url = args.url
+        if args.emulator:
+            upstream = (socket.gethostbyname(target.hostname), target.port or 443)
+            print(f"エミュレータを起動中... (netem_proxy.py, ポート {EMULATOR_PORT} → {upstream[0]}:{upstream[1]}, "
+                  f"{args.bandwidth} {args.delay})", file=sys.stderr)
+            processes.append(netem_proxy.spawn(EMULATOR_PORT, upstream, extra_args=[args.bandwidth, args.delay]))
+            url = target._replace(netloc=f"{target.hostname}:{EMULATOR_PORT}").geturl()
+
+        summaries = []
+        for kind in args.kinds:
+            if args.workers == 1:
+                summary = asyncio.run(run_handshakes(url, kind, args.duration, args.concurrency, args.request))
+            else:
+                summary = run_multiprocess(url, kind, args.duration, args.concurrency, args.request,
+                                           args.workers or None)
+            summaries.append(summary)
+            print(json.dumps(summary) if args.json else describe(summary), flush=True)
+    finally:
+        for proc in processes:
+            proc.terminate()
+            proc.wait()
+
+    if args.csv:
+        f, writer = open_result_csv(args.csv, HANDSHAKE_CSV_FIELDS)
+        with f:
+            for summary in summaries:
+                writer.writerow(csv_row(summary, latency_label, args.workers or os.cpu_count() or 1))
+        print(f"結果ファイル: {args.csv}", file=sys.stderr)
+    sys.exit(0 if all(summary['handshakes'] > 0 for summary in summaries) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,111 +3,492 @@
 HTTP/3専用クライアント（curl互換出力形式）
 aioquicライブラリを使用してHTTP/3リクエストを実行
 curl形式: time_total,speed_download,http_version
+
+--iterations を指定するとバッチモードになり、1つのイベントループ内で
+反復計測を行い、docker_benchmark.sh と同じスキーマでCSVに逐次追記する
+
+--mode で接続方式を選択する:
+  cold      毎回新規接続（1-RTTハンドシェイク）
+  keepalive 1本のQUIC接続上で連続GET
+  resume    セッションチケットを保存し、再接続時に0-RTTで送信
+            （--ticket-cache 指定時はチケットをディスクに保存し、プロセス間で共有）
+
+--streams K を指定すると多重化ベンチマークになり、1本のQUIC接続上でK本の
+ストリームを同時に発行して、ストリームごとの完了時間とバッチ全体の完了時間を記録する
+
+--timeline-dir を指定すると、ボディの受信バイト数を --timeline-bin ミリ秒幅の
+時間ビンごとに記録し、1リクエスト1ファイルのサイドカーとして保存する
+（throughput_timeline.py, scripts/visualize_throughput_timeline.py 参照）
+
+--rate を指定すると負荷生成モードになり、http3_load.py のオープンループ
+スケジューラで一定レート/ポアソン到着のリクエストを発行し、結果をJSONで出力する
+（--workers でCPUコアごとのワーカープロセスに分割）
+
+各リクエストは perf_counter_ns で以下のフェーズを記録し、開始からの累積秒
+（curlの time_* と同じ考え方）としてCSVの列に出力する:
+  time_connect       UDPソケット接続
+  time_appconnect    QUICハンドシェイク完了
+  time_starttransfer レスポンスヘッダー受信
+  time_firstbyte     ボディ先頭バイト受信
+  time_lastbyte      ボディ最終バイト受信（ストリーム終端）
 """
 
 import asyncio
+import contextlib
+import json
 import time
 import sys
 import argparse
 from aioquic.asyncio.client import connect
+from aioquic.asyncio.protocol import QuicConnectionProtocol
 from aioquic.h3.connection import H3_ALPN, H3Connection
 from aioquic.h3.events import HeadersReceived, DataReceived
 from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.events import ConnectionTerminated, HandshakeCompleted
 import ssl
 import logging
 from urllib.parse import urlparse
+from session_ticket_cache import SessionTicketCache, cache_key, DEFAULT_CACHE_PATH
+from benchmark_csv import CSV_FIELDS, MULTIPLEX_CSV_FIELDS, PHASE_FIELDS, open_result_csv
+from throughput_timeline import DEFAULT_BIN_SEC, ThroughputTimeline, next_timeline_path, timeline_path
 
 # ログレベルを設定
 logging.basicConfig(level=logging.WARNING)
 
+# レスポンス待機のタイムアウト（秒）
+REQUEST_TIMEOUT_SEC = 30
+
+# 接続方式
+MODES = ('cold', 'keepalive', 'resume')
+
+
+def phase_times(start_ns, connect_ns, appconnect_ns, headers_ns, first_byte_ns, last_byte_ns):
+    """perf_counter_ns のタイムスタンプを開始からの累積秒に変換する（未記録はNone）"""
+    stamps = [connect_ns, appconnect_ns, headers_ns, first_byte_ns, last_byte_ns]
+    return {field: (None if ns is None else max(ns - start_ns, 0) / 1e9)
+            for field, ns in zip(PHASE_FIELDS, stamps)}
+
+
+class HTTP3ClientProtocol(QuicConnectionProtocol):
+    """QUICイベントをH3イベントに変換し、ストリーム単位のFutureで完了を通知する"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = H3Connection(self._quic)
+        self._request_waiter = {}  # stream_id -> Future
+        self._responses = {}       # stream_id -> {'status': ..., 'bytes': ...}
+        self.session_resumed = False
+        self.early_data_accepted = False
+        self.connected_ns = None
+        self.handshake_ns = None
+
+    def connection_made(self, transport):
+        self.connected_ns = time.perf_counter_ns()
+        super().connection_made(transport)
+
+    async def get(self, authority, path, extra_headers=(), timeline=None):
+        """GETを送信し、レスポンスストリームの終端を受信した時点で結果を返す
+
+        timeline（ThroughputTimeline）を渡すとボディの受信バイト数をそこに記録する。
+        """
+        stream_id = self._quic.get_next_available_stream_id()
+        self._http.send_headers(
+            stream_id=stream_id,
+            headers=[
+                (b':method', b'GET'),
+                (b':path', path.encode()),
+                (b':scheme', b'https'),
+                (b':authority', authority.encode()),
+                *extra_headers,
+            ],
+            end_stream=True,
+        )
+        waiter = self._loop.create_future()
+        self._request_waiter[stream_id] = waiter
+        self._responses[stream_id] = {'status': None, 'bytes': 0, 'headers_ns': None,
+                                      'first_byte_ns': None, 'last_byte_ns': None, 'timeline': timeline}
+        self.transmit()
+        return await waiter
+
+    def http_event_received(self, event):
+        response = self._responses.get(event.stream_id)
+        if response is None:
+            return
+
+        now_ns = time.perf_counter_ns()
+        if isinstance(event, HeadersReceived):
+            # ヘッダー受信
+            response['headers_ns'] = now_ns
+            for name, value in event.headers:
+                if name == b':status':
+                    response['status'] = int(value)
+        elif isinstance(event, DataReceived):
+            # データ受信
+            if event.data and response['first_byte_ns'] is None:
+                response['first_byte_ns'] = now_ns
+            response['bytes'] += len(event.data)
+            if event.data and response['timeline'] is not None:
+                response['timeline'].record(now_ns, len(event.data))
+
+        if event.stream_ended:
+            # ストリーム終端でFutureを解決（ポーリング不要）
+            response['last_byte_ns'] = now_ns
+            self._responses.pop(event.stream_id)
+            waiter = self._request_waiter.pop(event.stream_id)
+            if not waiter.done():
+                waiter.set_result(response)
+
+    def quic_event_received(self, event):
+        if isinstance(event, HandshakeCompleted):
+            self.handshake_ns = time.perf_counter_ns()
+            self.session_resumed = event.session_resumed
+            self.early_data_accepted = event.early_data_accepted
+        elif isinstance(event, ConnectionTerminated):
+            # 接続断: 待機中のリクエストを全て失敗させる
+            for waiter in self._request_waiter.values():
+                if not waiter.done():
+                    waiter.set_exception(ConnectionError(event.reason_phrase or 'connection terminated'))
+            self._request_waiter.clear()
+            self._responses.clear()
+
+        for http_event in self._http.handle_event(event):
+            self.http_event_received(http_event)
+
+
 class HTTP3Client:
-    def __init__(self, url):
+    def __init__(self, url, mode='cold', ticket_cache=None, timeline_bin=None):
+        if mode not in MODES:
+            raise ValueError(f"unknown mode: {mode}")
         parsed = urlparse(url)
         self.host = parsed.hostname or 'localhost'
         self.port = parsed.port or 8443
         self.path = parsed.path or '/'
+        self.authority = f'{self.host}:{self.port}'
+        self.mode = mode
+        # 受信スループットの時系列を記録する場合のビン幅（秒）
+        self.timeline_bin = timeline_bin
         self.configuration = QuicConfiguration(
             alpn_protocols=H3_ALPN,
             is_client=True,
         )
-        
+
         # SSL設定
         self.configuration.verify_mode = ssl.CERT_NONE  # 証明書検証を無効化
-        
-    async def request(self):
-        """HTTP/3リクエストを実行してcurl形式で結果を返す"""
-        start_time = time.time()
-        data_received = 0
-        
+
+        # keepalive用の接続
+        self._exit_stack = None
+        self._protocol = None
+
+        # resume用のディスクキャッシュ（別プロセスが保存したチケットで初回から0-RTT）
+        self.ticket_cache = ticket_cache
+        self._ticket_key = cache_key(self.host, self.port, self.configuration.alpn_protocols)
+        if self.mode == 'resume' and self.ticket_cache is not None:
+            self.configuration.session_ticket = self.ticket_cache.load(self._ticket_key)
+
+    def _save_session_ticket(self, ticket):
+        """サーバーから受信したセッションチケットを次回接続用に保持する"""
+        if self.mode == 'resume':
+            self.configuration.session_ticket = ticket
+            if self.ticket_cache is not None:
+                try:
+                    self.ticket_cache.store(self._ticket_key, ticket)
+                except OSError as e:
+                    print(f"session ticket cache write failed: {e}", file=sys.stderr)
+
+    def _connect(self):
+        # resumeモードでチケットがあればハンドシェイク完了を待たずに0-RTTで送信
+        early_data = self.mode == 'resume' and self.configuration.session_ticket is not None
+        return connect(
+            self.host,
+            self.port,
+            configuration=self.configuration,
+            create_protocol=HTTP3ClientProtocol,
+            session_ticket_handler=self._save_session_ticket,
+            wait_connected=not early_data,
+        )
+
+    async def open(self):
+        """接続を確立して保持し、そのプロトコルを返す（確立済みならそれを返す）"""
+        if self._protocol is None:
+            exit_stack = contextlib.AsyncExitStack()
+            self._protocol = await exit_stack.enter_async_context(self._connect())
+            self._exit_stack = exit_stack
+        return self._protocol
+
+    async def close(self):
+        """open()で確立した接続を閉じる"""
+        if self._exit_stack is not None:
+            exit_stack, self._exit_stack, self._protocol = self._exit_stack, None, None
+            await exit_stack.aclose()
+
+    async def _get(self, protocol, timeline=None):
+        # レスポンスストリームの終端まで待機
+        return await asyncio.wait_for(
+            protocol.get(self.authority, self.path, timeline=timeline),
+            timeout=REQUEST_TIMEOUT_SEC,
+        )
+
+    async def fetch(self):
+        """HTTP/3リクエストを1回実行し、計測結果を辞書で返す（失敗時は例外）"""
+        start_ns = time.perf_counter_ns()
+        reused = False
+        timeline = ThroughputTimeline(start_ns, self.timeline_bin) if self.timeline_bin else None
+
+        if self.mode == 'keepalive':
+            # 初回のみ接続を確立し、以降は同じ接続を使い回す
+            reused = self._protocol is not None
+            protocol = await self.open()
+            try:
+                response = await self._get(protocol, timeline)
+            except Exception:
+                await self.close()
+                raise
+            end_ns = time.perf_counter_ns()
+        else:
+            async with self._connect() as protocol:
+                response = await self._get(protocol, timeline)
+                end_ns = time.perf_counter_ns()
+
+        if reused:
+            # 既存接続の再利用では接続・ハンドシェイクのコストは発生しない
+            connect_ns = appconnect_ns = start_ns
+        else:
+            connect_ns, appconnect_ns = protocol.connected_ns, protocol.handshake_ns
+
+        result = {
+            'time_total': (end_ns - start_ns) / 1e9,
+            'size_download': response['bytes'],
+            'status': response['status'],
+            'http_version': 3,  # HTTP/3を使用
+            'mode': self.mode,
+            'reused': reused,
+            'session_resumed': protocol.session_resumed,
+            'early_data_accepted': protocol.early_data_accepted,
+        }
+        result.update(phase_times(start_ns, connect_ns, appconnect_ns, response['headers_ns'],
+                                  response['first_byte_ns'], response['last_byte_ns']))
+        if timeline is not None:
+            result['timeline'] = timeline
+        return result
+
+    def _write_timeline(self, path, result, latency_label):
+        """fetch()の結果に含まれる時系列をサイドカーに保存する"""
         try:
-            async with connect(
-                self.host,
-                self.port,
-                configuration=self.configuration,
-            ) as protocol:
-                # H3Connectionを作成
-                h3 = H3Connection(protocol._quic)
-                
-                # HTTP/3リクエストを送信
-                stream_id = h3.get_next_available_stream_id()
-                h3.send_headers(
-                    stream_id=stream_id,
-                    headers=[
-                        (b':method', b'GET'),
-                        (b':path', self.path.encode()),
-                        (b':scheme', b'https'),
-                        (b':authority', f'{self.host}:{self.port}'.encode()),
-                    ],
+            result['timeline'].write(path, protocol='HTTP/3', latency=latency_label, mode=self.mode,
+                                     time_total=result['time_total'], size_download=result['size_download'])
+        except OSError as e:
+            print(f"timeline write failed: {e}", file=sys.stderr)
+
+    async def fetch_multiplexed(self, streams):
+        """1本の接続上でstreams本のGETを同時に発行し、各ストリームとバッチ全体の完了時間を返す
+
+        計時は接続確立後に開始する（ハンドシェイクを含めず、多重化と
+        ヘッドオブラインブロッキングの影響のみを比較するため）。
+        """
+        async with contextlib.AsyncExitStack() as exit_stack:
+            if self.mode == 'keepalive':
+                protocol = await self.open()
+            else:
+                protocol = await exit_stack.enter_async_context(self._connect())
+
+            start_ns = time.perf_counter_ns()
+            try:
+                responses = await asyncio.wait_for(
+                    asyncio.gather(*(protocol.get(self.authority, self.path) for _ in range(streams))),
+                    timeout=REQUEST_TIMEOUT_SEC,
                 )
-                h3.end_stream(stream_id)
-                
-                # レスポンスを待機
-                response_received = False
-                while True:
-                    # イベント処理
-                    for event in h3.handle_events():
-                        if isinstance(event, HeadersReceived):
-                            # ヘッダー受信
-                            response_received = True
-                        elif isinstance(event, DataReceived):
-                            # データ受信
-                            data_received += len(event.data)
-                            if event.stream_ended:
-                                break
-                    
-                    # タイムアウトチェック
-                    if time.time() - start_time > 30:
-                        break
-                    
-                    # データ受信完了
-                    if response_received and data_received > 0:
-                        # 少し待って追加データを確認
-                        await asyncio.sleep(0.1)
-                        break
-                    
-                    await asyncio.sleep(0.01)
-                
-                end_time = time.time()
-                time_total = end_time - start_time
-                speed_download = (data_received * 8) / time_total if time_total > 0 else 0
-                http_version = 3  # HTTP/3を使用
-                
-                # curl形式: time_total,speed_download,http_version
-                return f"{time_total:.6f},{speed_download:.0f},{http_version}"
-                
+            except Exception:
+                await self.close()
+                raise
+            end_ns = time.perf_counter_ns()
+
+        return {
+            'batch_time': (end_ns - start_ns) / 1e9,
+            'http_version': 3,
+            'streams': [{
+                'stream_time': (response['last_byte_ns'] - start_ns) / 1e9,
+                'bytes': response['bytes'],
+                'status': response['status'],
+            } for response in responses],
+        }
+
+    async def request(self, timeline_dir=None, latency_label='0ms'):
+        """HTTP/3リクエストを実行してcurl形式で結果を返す
+
+        timeline_dir を指定すると受信スループットの時系列をサイドカーに保存する。
+        """
+        try:
+            result = await self.fetch()
         except Exception as e:
             print(f"HTTP/3 request failed: {e}", file=sys.stderr)
             return None
+        finally:
+            await self.close()
+
+        if timeline_dir and 'timeline' in result:
+            self._write_timeline(next_timeline_path(timeline_dir, 'HTTP/3', latency_label), result, latency_label)
+
+        time_total = result['time_total']
+        data_received = result['size_download']
+        speed_download = (data_received * 8) / time_total if time_total > 0 else 0
+
+        # curl形式: time_total,speed_download,http_version
+        return f"{time_total:.6f},{speed_download:.0f},{result['http_version']}"
+
+    async def run_batch(self, iterations, warmup, latency_label, csv_path, sleep_between=0.1, timeline_dir=None):
+        """iterations回の計測を同一イベントループで実行し、CSVに1行ずつ追記する
+
+        先頭warmup回はウォームアップとして実行のみ行い記録しない
+        （iteration番号は bench_once と同じく通し番号）。成功件数を返す。
+        timeline_dir を指定すると、記録した各リクエストの時系列をサイドカーに保存する。
+        """
+        success_count = 0
+        f, writer = open_result_csv(csv_path)
+
+        try:
+            for i in range(1, iterations + 1):
+                row = {'timestamp': int(time.time()), 'protocol': 'HTTP/3', 'latency': latency_label,
+                       'iteration': i, 'mode': self.mode}
+                try:
+                    result = await self.fetch()
+                except Exception as e:
+                    print(f"HTTP/3 request failed (latency={latency_label} iter={i}): {e}", file=sys.stderr)
+                    result = None
+
+                if i > warmup:
+                    if result is not None and result['status'] == 200 and result['time_total'] > 0:
+                        # 速度 = (バイト数 * 8) / 時間（秒） → kbps
+                        speed_kbps = (result['size_download'] * 8) / (result['time_total'] * 1000)
+                        row.update(time_total=f"{result['time_total']:.6f}", speed_kbps=f"{speed_kbps:.2f}",
+                                   success=1, http_version=result['http_version'])
+                        row.update({field: '' if result[field] is None else f"{result[field]:.6f}"
+                                    for field in PHASE_FIELDS})
+                        if timeline_dir and 'timeline' in result:
+                            self._write_timeline(timeline_path(timeline_dir, 'HTTP/3', latency_label, i),
+                                                 result, latency_label)
+                        success_count += 1
+                    else:
+                        row.update(time_total='', speed_kbps='', success=0, http_version='unknown')
+                    writer.writerow(row)
+                    # 中断されても計測済みの行が残るよう逐次フラッシュ
+                    f.flush()
+
+                # short idle to stabilize ACK clock and avoid back-to-back bursts
+                if sleep_between > 0 and i < iterations:
+                    await asyncio.sleep(sleep_between)
+        finally:
+            f.close()
+            await self.close()
+
+        return success_count
+
+    async def run_multiplex_batch(self, iterations, warmup, streams, latency_label, loss_label,
+                                  csv_path, sleep_between=0.1):
+        """多重化ベンチマークをiterations回実行し、1ストリーム1行でCSVに追記する。成功回数を返す"""
+        success_count = 0
+        f, writer = open_result_csv(csv_path, MULTIPLEX_CSV_FIELDS)
+
+        try:
+            for i in range(1, iterations + 1):
+                base = {'timestamp': int(time.time()), 'protocol': 'HTTP/3', 'latency': latency_label,
+                        'loss': loss_label, 'iteration': i, 'streams': streams}
+                try:
+                    result = await self.fetch_multiplexed(streams)
+                except Exception as e:
+                    print(f"HTTP/3 multiplexed request failed (latency={latency_label} iter={i}): {e}", file=sys.stderr)
+                    result = None
+
+                if i > warmup:
+                    if result is not None and all(st['status'] == 200 for st in result['streams']):
+                        for index, st in enumerate(result['streams']):
+                            writer.writerow(dict(base, stream_index=index, stream_time=f"{st['stream_time']:.6f}",
+                                                 batch_time=f"{result['batch_time']:.6f}", bytes=st['bytes'],
+                                                 success=1, http_version=result['http_version']))
+                        success_count += 1
+                    else:
+                        writer.writerow(dict(base, stream_index='', stream_time='', batch_time='', bytes='',
+                                             success=0, http_version='unknown'))
+                    f.flush()
+
+                if sleep_between > 0 and i < iterations:
+                    await asyncio.sleep(sleep_between)
+        finally:
+            f.close()
+            await self.close()
+
+        return success_count
 
 async def main():
     parser = argparse.ArgumentParser(description='HTTP/3 Client (curl compatible)')
     parser.add_argument('url', help='Target URL (e.g., https://http3-server:8443/)')
-    
+    parser.add_argument('--iterations', type=int, help='バッチモード: 反復回数（ウォームアップを含む）')
+    parser.add_argument('--warmup', type=int, default=0, help='バッチモード: 記録しない先頭の回数')
+    parser.add_argument('--latency', default='0ms', help='バッチモード: CSVに記録する遅延ラベル (例: 50ms)')
+    parser.add_argument('--csv', help='バッチモード: 追記先CSVファイル')
+    parser.add_argument('--sleep', type=float, default=0.1, help='バッチモード: 反復間の待機時間（秒）')
+    parser.add_argument('--mode', choices=MODES, default='cold',
+                        help='接続方式: cold=毎回新規接続, keepalive=接続を再利用, resume=0-RTT再接続')
+    parser.add_argument('--ticket-cache', nargs='?', const=DEFAULT_CACHE_PATH,
+                        help=f'resumeモード: セッションチケットのキャッシュファイル (省略時: {DEFAULT_CACHE_PATH})')
+    parser.add_argument('--streams', type=int, default=1,
+                        help='多重化ベンチマーク: 1接続上で同時に発行するストリーム数')
+    parser.add_argument('--loss', default='0%', help='多重化ベンチマーク: CSVに記録する損失率ラベル (例: 1%%)')
+    parser.add_argument('--timeline-dir', help='受信スループットの時系列サイドカーの保存先ディレクトリ')
+    parser.add_argument('--timeline-bin', type=float, default=DEFAULT_BIN_SEC * 1000,
+                        help='時系列のビン幅（ミリ秒）')
+    parser.add_argument('--rate', type=float, help='負荷生成モード: 送信レート (req/s)')
+    parser.add_argument('--duration', type=float, default=10.0, help='負荷生成モード: 実行時間（秒）')
+    parser.add_argument('--connections', type=int, default=1, help='負荷生成モード: QUIC接続プールのサイズ')
+    parser.add_argument('--arrival', choices=['constant', 'poisson'], default='constant',
+                        help='負荷生成モード: 到着過程')
+    parser.add_argument('--seed', type=int, help='負荷生成モード: ポアソン到着の乱数シード')
+    parser.add_argument('--max-inflight', type=int, default=10000,
+                        help='負荷生成モード: 未完了リクエストの上限（超過分はdropped）')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='負荷生成モード: ワーカープロセス数（0でCPUコア数, 2以上でヒストグラムをマージ）')
+
     args = parser.parse_args()
-    
-    client = HTTP3Client(args.url)
-    result = await client.request()
-    
+
+    if args.rate is not None:
+        from http3_load import run_open_loop, run_multiprocess
+        if args.workers == 1:
+            summary = await run_open_loop(args.url, args.rate, args.duration, args.connections,
+                                          args.arrival, args.seed, args.max_inflight)
+        else:
+            # ワーカープロセスはそれぞれ独自のイベントループを持つため、ここではブロックしてよい
+            summary = run_multiprocess(args.url, args.rate, args.duration, args.connections,
+                                       args.arrival, args.seed, args.max_inflight, args.workers or None)
+        print(json.dumps(summary))
+        sys.exit(0 if summary['success'] > 0 else 1)
+
+    ticket_cache = SessionTicketCache(args.ticket_cache) if args.ticket_cache else None
+    timeline_bin = args.timeline_bin / 1000 if args.timeline_dir else None
+    client = HTTP3Client(args.url, mode=args.mode, ticket_cache=ticket_cache, timeline_bin=timeline_bin)
+
+    if args.iterations is not None:
+        if not args.csv:
+            parser.error('--iterations には --csv が必要です')
+        recorded = max(args.iterations - args.warmup, 0)
+        if args.streams > 1:
+            success = await client.run_multiplex_batch(args.iterations, args.warmup, args.streams, args.latency,
+                                                       args.loss, args.csv, args.sleep)
+        else:
+            success = await client.run_batch(args.iterations, args.warmup, args.latency, args.csv, args.sleep,
+                                             args.timeline_dir)
+        print(f"{success}/{recorded}")
+        sys.exit(0 if success == recorded else 1)
+
+    if args.streams > 1:
+        try:
+            result = await client.fetch_multiplexed(args.streams)
+        except Exception as e:
+            print(f"HTTP/3 multiplexed request failed: {e}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(result))
+        sys.exit(0)
+
+    result = await client.request(args.timeline_dir, args.latency)
+
     if result is not None:
         print(result)
         sys.exit(0)
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+HTTP3Client を用いたオープンループ負荷生成
+送信予定時刻を事前に決め（一定間隔またはポアソン到着）、レスポンスを待たずに
+予定どおりリクエストを発行する。レイテンシは「実際の送信時刻」ではなく
+「予定送信時刻」から計測するため、クライアント側の詰まりで待ち行列が隠れる
+（coordinated omission）ことがない。
+
+リクエストは事前に確立した複数のQUIC接続（プール）にラウンドロビンで割り当て、
+同一接続上では並行ストリームとして多重化される。
+
+純Pythonのクライアントは1コアで頭打ちになるため、run_multiprocess() は
+ワーカープロセス（1コア1イベントループ）にレートを分割して負荷をかける。
+各ワーカーはレイテンシを固定サイズの対数線形ヒストグラムに記録し、親プロセスが
+それをマージして全体のパーセンタイルを求める。一定間隔の到着では、ワーカー w の送信予定を
+w / rate だけずらして、全体として指定したレートの等間隔になるようにする（ずらさないと
+N個のワーカーが同時刻にN件ずつ送る）。ずらしが保たれるよう、開始時刻は全ワーカーが接続を確立し終えてから
+親プロセスが決めて配る（StartBarrier）。ワーカーごとのCPU使用率（計測区間のCPU時間 / 経過時間）も
+出力し、クライアント側がボトルネックでなかったことを確認できるようにする。
+"""
+
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from http3_client import HTTP3Client, REQUEST_TIMEOUT_SEC
+
+# 到着過程
+ARRIVALS = ('constant', 'poisson')
+
+# 結果に含めるパーセンタイル
+PERCENTILES = [50, 90, 99, 99.9]
+
+# この使用率を超えたワーカーはクライアント側の飽和とみなす
+CPU_SATURATION_THRESHOLD = 0.9
+
+# 全ワーカーの接続確立後、開始時刻を配ってから一斉に開始するまでの猶予（秒）
+START_BARRIER_SEC = 0.2
+
+# ワーカーの接続確立（と開始時刻の受け取り）を待つ上限（秒）
+READY_TIMEOUT_SEC = 60.0
+
+
+def arrival_offsets(rate, duration, arrival='constant', seed=None, phase=0.0):
+    """開始からの送信予定時刻（秒）を順に返す（constant は phase 秒ずらした k / rate）"""
+    if arrival not in ARRIVALS:
+        raise ValueError(f"unknown arrival process: {arrival}")
+    rng = random.Random(seed)
+    k = 0
+    offset = 0.0
+    while True:
+        if arrival == 'constant':
+            offset = phase + k / rate
+        else:
+            offset += rng.expovariate(rate)
+        if offset >= duration:
+            return
+        yield offset
+        k += 1
+
+
+class LatencyHistogram:
+    """マイクロ秒単位の対数線形ヒストグラム（HdrHistogram風）
+
+    2**sub_bucket_bits 未満は1µs刻み、それ以上は2のべき乗ごとに
+    2**(sub_bucket_bits-1) 個のバケットに分割する（相対誤差 約1/2**(sub_bucket_bits-1)）。
+    カウントは固定長の array('Q') に保持し、要素ごとの加算でマージできる。
+    """
+
+    def __init__(self, sub_bucket_bits=7, max_exponent=36):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.max_exponent = max_exponent
+        self._sub_bucket_count = 1 << sub_bucket_bits
+        self._half_count = self._sub_bucket_count // 2
+        self.counts = array('Q', bytes(8 * (self._sub_bucket_count + max_exponent * self._half_count)))
+        self.total = 0
+        self.sum_us = 0
+        self.max_us = 0
+
+    def _index(self, us):
+        if us < self._sub_bucket_count:
+            return us
+        exponent = min(us.bit_length() - self.sub_bucket_bits, self.max_exponent)
+        mantissa = min(us >> exponent, self._sub_bucket_count - 1)
+        return self._sub_bucket_count + (exponent - 1) * self._half_count + (mantissa - self._half_count)
+
+    def _value(self, index):
+        """バケットの代表値（中央値, µs）"""
+        if index < self._sub_bucket_count:
+            return index
+        exponent, offset = divmod(index - self._sub_bucket_count, self._half_count)
+        exponent += 1
+        mantissa = offset + self._half_count
+        return (mantissa << exponent) + (1 << (exponent - 1))
+
+    def record(self, seconds):
+        us = max(int(seconds * 1e6), 0)
+        self.counts[self._index(us)] += 1
+        self.total += 1
+        self.sum_us += us
+        self.max_us = max(self.max_us, us)
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            if count:
+                self.counts[i] += count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, p):
+        """パーセンタイル（秒）。記録が無ければNone"""
+        if self.total == 0:
+            return None
+        rank = max(int(p / 100 * self.total + 0.5), 1)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self._value(i), self.max_us) / 1e6
+        return self.max_us / 1e6
+
+    def summary(self):
+        summary = {f'p{p:g}': self.percentile(p) for p in PERCENTILES}
+        summary['mean'] = self.sum_us / self.total / 1e6 if self.total else None
+        summary['max'] = self.max_us / 1e6 if self.total else None
+        return summary
+
+    def __getstate__(self):
+        # プロセス間の受け渡しでは空でないバケットのみを送る
+        state = dict(self.__dict__)
+        state['counts'] = {i: c for i, c in enumerate(self.counts) if c}
+        return state
+
+    def __setstate__(self, state):
+        counts = state.pop('counts')
+        self.__init__(state['sub_bucket_bits'], state['max_exponent'])
+        self.__dict__.update(state)
+        for i, c in counts.items():
+            self.counts[i] = c
+
+
+class StartBarrier:
+    """ワーカーが接続を確立し終えたことを親プロセスに伝え、親が決めた開始時刻（エポック秒）を受け取る
+
+    multiprocessing.Manager の Barrier（ワーカー数+1）・Event・dict を使うので、ワーカーへそのまま渡せる。
+    開始時刻を先に決めるとワーカーの起動や aioquic の import に時間がかかった分だけ開始がずれる。
+    """
+
+    def __init__(self, manager, workers):
+        self.ready = manager.Barrier(workers + 1)
+        self.go = manager.Event()
+        self.shared = manager.dict()
+
+    def wait(self, timeout=READY_TIMEOUT_SEC):
+        """ワーカー側: 接続確立後に呼び、開始時刻を返す"""
+        self.ready.wait(timeout)
+        if not self.go.wait(timeout):
+            raise RuntimeError('start time was not announced')
+        return self.shared['start_at']
+
+    def release(self, timeout=READY_TIMEOUT_SEC):
+        """親側: 全ワーカーの準備を待って開始時刻を決め、それを返す（待てなければ BrokenBarrierError）"""
+        self.ready.wait(timeout)
+        start_at = time.time() + START_BARRIER_SEC
+        self.shared['start_at'] = start_at
+        self.go.set()
+        return start_at
+
+    def abort(self):
+        """準備の前に失敗したワーカーが、待っている親と他のワーカーを解放する"""
+        self.ready.abort()
+
+
+async def run_open_loop(url, rate, duration, connections=1, arrival='constant', seed=None,
+                        max_inflight=10000, histogram=None, barrier=None, phase=0.0):
+    """オープンループで負荷をかけ、結果のサマリーを辞書で返す
+
+    max_inflight を超える未完了リクエストがある場合、その予定分は送信せず
+    dropped として数える（予定時刻からの遅れを隠さないため成功扱いにしない）。
+    histogram を渡すとレイテンシをそこに記録する。barrier（StartBarrier）を
+    渡すと、接続確立後に準備完了を伝え、配られた開始時刻まで待ってからスケジュールを開始する。phase は一定間隔の
+    到着の送信予定をずらす秒数。CPU時間はスケジュールの開始から終了まで（接続確立を含まない）。
+    """
+    clients = [HTTP3Client(url, mode='keepalive') for _ in range(connections)]
+    protocols = await asyncio.gather(*(client.open() for client in clients))
+    if barrier is not None:
+        start_at = await asyncio.to_thread(barrier.wait)
+        await asyncio.sleep(max(start_at - time.time(), 0))
+
+    # 予定送信時刻からレスポンス完了まで
+    latencies = histogram if histogram is not None else LatencyHistogram()
+    send_lag_max = 0.0  # 予定送信時刻からの実際の送信の遅れ
+    counts = {'success': 0, 'errors': 0, 'dropped': 0}
+    inflight = set()
+
+    async def issue(protocol, authority, path, scheduled):
+        nonlocal send_lag_max
+        send_lag_max = max(send_lag_max, time.perf_counter() - scheduled)
+        try:
+            response = await asyncio.wait_for(protocol.get(authority, path), timeout=REQUEST_TIMEOUT_SEC)
+            ok = response['status'] == 200
+        except Exception as e:
+            print(f"HTTP/3 request failed: {e}", file=sys.stderr)
+            ok = False
+        if ok:
+            latencies.record(time.perf_counter() - scheduled)
+            counts['success'] += 1
+        else:
+            counts['errors'] += 1
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    try:
+        for k, offset in enumerate(arrival_offsets(rate, duration, arrival, seed, phase)):
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            if len(inflight) >= max_inflight:
+                counts['dropped'] += 1
+                continue
+
+            client = clients[k % connections]
+            task = asyncio.create_task(issue(protocols[k % connections], client.authority, client.path, scheduled))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+
+        if inflight:
+            await asyncio.wait(inflight, timeout=REQUEST_TIMEOUT_SEC)
+        elapsed = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+        # タイムアウトまでに完了しなかったものは失敗扱い
+        counts['errors'] += len(inflight)
+        for task in list(inflight):
+            task.cancel()
+    finally:
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+    issued = counts['success'] + counts['errors']
+    return {
+        'arrival': arrival,
+        'offered_rate': rate,
+        'connections': connections,
+        'duration': duration,
+        'elapsed': elapsed,
+        'requests': issued + counts['dropped'],
+        'success': counts['success'],
+        'errors': counts['errors'],
+        'dropped': counts['dropped'],
+        'achieved_rate': counts['success'] / elapsed if elapsed > 0 else 0,
+        'latency': latencies.summary(),
+        'send_lag_max': send_lag_max,
+        'cpu_seconds': cpu_seconds,
+        'cpu_utilization': cpu_seconds / elapsed if elapsed > 0 else 0,
+    }
+
+
+def _worker_main(url, rate, duration, connections, arrival, seed, max_inflight, barrier, phase):
+    """ワーカープロセス: 独自のイベントループで負荷をかけ、サマリー（CPU時間を含む）とヒストグラムを返す"""
+    histogram = LatencyHistogram()
+    try:
+        summary = asyncio.run(run_open_loop(url, rate, duration, connections, arrival, seed,
+                                            max_inflight, histogram, barrier, phase))
+    except BaseException:
+        barrier.abort()
+        raise
+    return summary, histogram
+
+
+def run_multiprocess(url, rate, duration, connections=1, arrival='constant', seed=None,
+                     max_inflight=10000, workers=None):
+    """レートと接続数をワーカープロセスに分割して負荷をかけ、結果をマージして返す"""
+    workers = workers or os.cpu_count() or 1
+    connections = max(connections, workers)
+
+    with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as executor:
+        barrier = StartBarrier(manager, workers)
+        futures = []
+        for w in range(workers):
+            # 接続は端数を先頭のワーカーに割り当て、シードはワーカーごとにずらす
+            worker_connections = connections // workers + (1 if w < connections % workers else 0)
+            worker_seed = None if seed is None else seed + w
+            # 一定間隔の到着はワーカーごとに全体の間隔1つ分ずつずらす
+            futures.append(executor.submit(_worker_main, url, rate / workers, duration, worker_connections,
+                                           arrival, worker_seed, max_inflight, barrier, w / rate))
+        try:
+            barrier.release()
+        except threading.BrokenBarrierError:
+            # 準備の前に失敗したワーカーがいる（その例外は result() で送出される）
+            pass
+        results = [future.result() for future in futures]
+
+    merged = LatencyHistogram()
+    worker_summaries = []
+    for w, (summary, histogram) in enumerate(results):
+        merged.merge(histogram)
+        worker_summaries.append({
+            'worker': w,
+            'offered_rate': summary['offered_rate'],
+            'achieved_rate': summary['achieved_rate'],
+            'connections': summary['connections'],
+            'success': summary['success'],
+            'errors': summary['errors'],
+            'dropped': summary['dropped'],
+            'send_lag_max': summary['send_lag_max'],
+            'cpu_seconds': summary['cpu_seconds'],
+            'cpu_utilization': summary['cpu_utilization'],
+        })
+
+    summaries = [summary for summary, _ in results]
+    elapsed = max(summary['elapsed'] for summary in summaries)
+    success = sum(summary['success'] for summary in summaries)
+    return {
+        'arrival': arrival,
+        'offered_rate': rate,
+        'connections': connections,
+        'duration': duration,
+        'elapsed': elapsed,
+        'requests': sum(summary['requests'] for summary in summaries),
+        'success': success,
+        'errors': sum(summary['errors'] for summary in summaries),
+        'dropped': sum(summary['dropped'] for summary in summaries),
+        'achieved_rate': success / elapsed if elapsed > 0 else 0,
+        'latency': merged.summary(),
+        'send_lag_max': max(summary['send_lag_max'] for summary in summaries),
+        'workers': worker_summaries,
+        'client_saturated': any(w['cpu_utilization'] >= CPU_SATURATION_THRESHOLD for w in worker_summaries),
+    }
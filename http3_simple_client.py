@@ -2,49 +2,271 @@
 """
 シンプルなHTTP/3クライアント
 httpxライブラリを使用してHTTP/3リクエストを実行
+
+json出力ではhttpxのtraceフックとボディのストリーム受信から
+perf_counter_ns でフェーズ別タイミングを記録する（http3_client.py と同じ列名）
+
+--streams K を指定すると、1本のHTTP/2接続上でK本のストリームを同時に発行する
+多重化ベンチマークになる（http3_client.py --streams と同じCSVスキーマ）
+
+--requests N を指定すると、温まったHTTP/2接続（httpx.AsyncClientのプール）上で
+N回のGETを順に（--concurrent なら同時に）発行し、リクエストごとの時間を出力する
+（ハンドシェイクを含まない、接続再利用時のベースライン）
+
+--timeline-dir を指定すると受信スループットの時系列をサイドカーに保存する
+（http3_client.py --timeline-dir と同じ形式）
 """
 
+import asyncio
 import httpx
+import json
 import time
 import sys
 import argparse
 
-def make_request(host, port, path="/"):
-    """HTTP/3リクエストを実行"""
+from benchmark_csv import MULTIPLEX_CSV_FIELDS, PHASE_FIELDS, open_result_csv
+from throughput_timeline import DEFAULT_BIN_SEC, ThroughputTimeline, next_timeline_path
+
+# httpcoreのtraceイベント → フェーズ
+TRACE_PHASES = {
+    'connection.connect_tcp.complete': 'time_connect',
+    'connection.start_tls.complete': 'time_appconnect',
+    'http2.receive_response_headers.complete': 'time_starttransfer',
+    'http11.receive_response_headers.complete': 'time_starttransfer',
+}
+
+def make_request_timed(host, port, path="/", timeline_bin=None):
+    """リクエストを実行し、time_totalとフェーズ別タイミングを辞書で返す（失敗時はNone）
+
+    timeline_bin（秒）を指定すると受信スループットの時系列を 'timeline' に含める。
+    """
     url = f"https://{host}:{port}{path}"
-    
-    start_time = time.time()
-    
+    stamps = {}
+
+    def trace(event_name, info):
+        phase = TRACE_PHASES.get(event_name)
+        if phase is not None:
+            stamps[phase] = time.perf_counter_ns()
+
     try:
-        with httpx.Client(http2=True) as client:
-            response = client.get(url, verify=False, timeout=30.0)
-            end_time = time.time()
-            
-            if response.status_code == 200:
-                return end_time - start_time
-            else:
+        with httpx.Client(http2=True, verify=False) as client:
+            # クライアント生成（SSLコンテキスト構築）は計測に含めない
+            start_ns = time.perf_counter_ns()
+            timeline = ThroughputTimeline(start_ns, timeline_bin) if timeline_bin else None
+            with client.stream('GET', url, timeout=30.0, extensions={'trace': trace}) as response:
+                size_download = 0
+                for chunk in response.iter_raw():
+                    if chunk:
+                        now_ns = time.perf_counter_ns()
+                        stamps.setdefault('time_firstbyte', now_ns)
+                        if timeline is not None:
+                            timeline.record(now_ns, len(chunk))
+                    size_download += len(chunk)
+                stamps['time_lastbyte'] = end_ns = time.perf_counter_ns()
+
+            if response.status_code != 200:
                 return None
-                
+
+            result = {
+                'time_total': (end_ns - start_ns) / 1e9,
+                'size_download': size_download,
+                'http_version': response.http_version,
+            }
+            for field in PHASE_FIELDS:
+                ns = stamps.get(field)
+                result[field] = None if ns is None else (ns - start_ns) / 1e9
+            if timeline is not None:
+                result['timeline'] = timeline
+            return result
+
     except Exception as e:
         print(f"HTTP/3 request failed: {e}", file=sys.stderr)
         return None
 
+def make_request(host, port, path="/"):
+    """HTTP/3リクエストを実行"""
+    result = make_request_timed(host, port, path)
+    return None if result is None else result['time_total']
+
+async def _timed_get(client, url):
+    """プール済みクライアントで1回GETし、リクエスト単位の計測結果を返す（失敗時はNone）"""
+    try:
+        start_ns = time.perf_counter_ns()
+        async with client.stream('GET', url) as response:
+            size_download = 0
+            async for chunk in response.aiter_raw():
+                size_download += len(chunk)
+        end_ns = time.perf_counter_ns()
+    except Exception as e:
+        print(f"HTTP/2 pooled request failed: {e}", file=sys.stderr)
+        return None
+
+    if response.status_code != 200:
+        return None
+    return {
+        'time_total': (end_ns - start_ns) / 1e9,
+        'size_download': size_download,
+        'http_version': response.http_version,
+    }
+
+async def make_request_pooled(host, port, path="/", count=1, concurrent=False):
+    """温まったHTTP/2接続上でcount回GETし、リクエストごとの結果（失敗はNone）のリストを返す
+
+    接続確立（TCP+TLS）とクライアント生成は "/" への事前リクエストで済ませ、計測に含めない。
+    concurrent=True なら全リクエストを同時に発行し、同一接続上に多重化する。
+    接続確立自体に失敗した場合はNone。
+    """
+    url = f"https://{host}:{port}{path}"
+
+    try:
+        async with httpx.AsyncClient(http2=True, verify=False, timeout=30.0) as client:
+            await client.get(f"https://{host}:{port}/")
+
+            if concurrent:
+                return list(await asyncio.gather(*(_timed_get(client, url) for _ in range(count))))
+            return [await _timed_get(client, url) for _ in range(count)]
+
+    except Exception as e:
+        print(f"HTTP/2 pooled connection failed: {e}", file=sys.stderr)
+        return None
+
+async def _get_stream_time(client, url, start_ns):
+    """ボディを最後まで受信し、バッチ開始からの完了時間とサイズを返す"""
+    async with client.stream('GET', url) as response:
+        size = 0
+        async for chunk in response.aiter_raw():
+            size += len(chunk)
+        return {
+            'stream_time': (time.perf_counter_ns() - start_ns) / 1e9,
+            'bytes': size,
+            'status': response.status_code,
+            'http_version': response.http_version,
+        }
+
+async def make_multiplexed_request(host, port, path="/", streams=2):
+    """1本のHTTP/2接続上でstreams本のGETを同時に発行し、各ストリームとバッチ全体の完了時間を返す
+
+    http3_client.py と揃えるため、計時は接続確立後に開始する
+    （接続確立は "/" への小さなリクエストで行う）。失敗時はNone。
+    """
+    url = f"https://{host}:{port}{path}"
+    # max_connections=1 で全ストリームを同一接続に多重化させる
+    limits = httpx.Limits(max_connections=1)
+
+    try:
+        async with httpx.AsyncClient(http2=True, verify=False, limits=limits, timeout=30.0) as client:
+            await client.get(f"https://{host}:{port}/")
+
+            start_ns = time.perf_counter_ns()
+            results = await asyncio.gather(*(_get_stream_time(client, url, start_ns) for _ in range(streams)))
+            end_ns = time.perf_counter_ns()
+
+        return {
+            'batch_time': (end_ns - start_ns) / 1e9,
+            'http_version': results[0]['http_version'],
+            'streams': [{k: r[k] for k in ('stream_time', 'bytes', 'status')} for r in results],
+        }
+
+    except Exception as e:
+        print(f"HTTP/2 multiplexed request failed: {e}", file=sys.stderr)
+        return None
+
+async def run_multiplex_batch(host, port, path, iterations, warmup, streams, latency_label, loss_label,
+                              csv_path, sleep_between=0.1):
+    """多重化ベンチマークをiterations回実行し、1ストリーム1行でCSVに追記する。成功回数を返す"""
+    success_count = 0
+    f, writer = open_result_csv(csv_path, MULTIPLEX_CSV_FIELDS)
+
+    with f:
+        for i in range(1, iterations + 1):
+            base = {'timestamp': int(time.time()), 'protocol': 'HTTP/2', 'latency': latency_label,
+                    'loss': loss_label, 'iteration': i, 'streams': streams}
+            result = await make_multiplexed_request(host, port, path, streams)
+
+            if i > warmup:
+                if result is not None and all(st['status'] == 200 for st in result['streams']):
+                    http_version = result['http_version'].replace('HTTP/', '')
+                    for index, st in enumerate(result['streams']):
+                        writer.writerow(dict(base, stream_index=index, stream_time=f"{st['stream_time']:.6f}",
+                                             batch_time=f"{result['batch_time']:.6f}", bytes=st['bytes'],
+                                             success=1, http_version=http_version))
+                    success_count += 1
+                else:
+                    writer.writerow(dict(base, stream_index='', stream_time='', batch_time='', bytes='',
+                                         success=0, http_version='unknown'))
+                f.flush()
+
+            if sleep_between > 0 and i < iterations:
+                await asyncio.sleep(sleep_between)
+
+    return success_count
+
 def main():
     parser = argparse.ArgumentParser(description='HTTP/3 Client')
     parser.add_argument('--host', default='localhost', help='Target host')
     parser.add_argument('--port', type=int, default=8444, help='Target port')
     parser.add_argument('--path', default='/', help='Request path')
     parser.add_argument('--output', choices=['time', 'json'], default='time', help='Output format')
-    
+    parser.add_argument('--requests', type=int, default=1,
+                        help='接続再利用: 温まった接続上で発行するリクエスト数（2以上で有効）')
+    parser.add_argument('--concurrent', action='store_true', help='接続再利用: リクエストを同時に発行する')
+    parser.add_argument('--streams', type=int, default=1, help='多重化ベンチマーク: 1接続上の同時ストリーム数')
+    parser.add_argument('--iterations', type=int, help='多重化ベンチマーク: 反復回数（ウォームアップを含む）')
+    parser.add_argument('--warmup', type=int, default=0, help='多重化ベンチマーク: 記録しない先頭の回数')
+    parser.add_argument('--latency', default='0ms', help='CSV・時系列サイドカーに記録する遅延ラベル')
+    parser.add_argument('--loss', default='0%', help='多重化ベンチマーク: CSVに記録する損失率ラベル')
+    parser.add_argument('--csv', help='多重化ベンチマーク: 追記先CSVファイル')
+    parser.add_argument('--sleep', type=float, default=0.1, help='多重化ベンチマーク: 反復間の待機時間（秒）')
+    parser.add_argument('--timeline-dir', help='受信スループットの時系列サイドカーの保存先ディレクトリ')
+    parser.add_argument('--timeline-bin', type=float, default=DEFAULT_BIN_SEC * 1000,
+                        help='時系列のビン幅（ミリ秒）')
+
     args = parser.parse_args()
-    
-    response_time = make_request(args.host, args.port, args.path)
-    
-    if response_time is not None:
+
+    if args.streams > 1:
+        if args.iterations is not None:
+            if not args.csv:
+                parser.error('--iterations には --csv が必要です')
+            recorded = max(args.iterations - args.warmup, 0)
+            success = asyncio.run(run_multiplex_batch(args.host, args.port, args.path, args.iterations,
+                                                      args.warmup, args.streams, args.latency, args.loss,
+                                                      args.csv, args.sleep))
+            print(f"{success}/{recorded}")
+            sys.exit(0 if success == recorded else 1)
+
+        result = asyncio.run(make_multiplexed_request(args.host, args.port, args.path, args.streams))
+        print(json.dumps(result if result is not None else {'success': False}))
+        sys.exit(0 if result is not None else 1)
+
+    if args.requests > 1:
+        results = asyncio.run(make_request_pooled(args.host, args.port, args.path, args.requests, args.concurrent))
+        results = results if results is not None else [None] * args.requests
+        # 1リクエスト1行（time: 秒, json: 1行1オブジェクト）
+        for index, result in enumerate(results):
+            if args.output == 'time':
+                print(f"{result['time_total']:.6f}" if result is not None else "0.000000")
+            elif result is not None:
+                print(json.dumps(dict(result, index=index, success=True)))
+            else:
+                print(json.dumps({'index': index, 'time_total': 0.0, 'success': False}))
+        sys.exit(0 if all(result is not None for result in results) else 1)
+
+    timeline_bin = args.timeline_bin / 1000 if args.timeline_dir else None
+    result = make_request_timed(args.host, args.port, args.path, timeline_bin)
+
+    if result is not None:
+        timeline = result.pop('timeline', None)
+        if timeline is not None:
+            try:
+                timeline.write(next_timeline_path(args.timeline_dir, 'HTTP/2', args.latency), protocol='HTTP/2',
+                               latency=args.latency, time_total=result['time_total'],
+                               size_download=result['size_download'])
+            except OSError as e:
+                print(f"timeline write failed: {e}", file=sys.stderr)
         if args.output == 'time':
-            print(f"{response_time:.6f}")
+            print(f"{result['time_total']:.6f}")
         else:
-            print(f'{{"time_total": {response_time:.6f}, "success": true}}')
+            print(json.dumps(dict(result, success=True)))
     else:
         if args.output == 'time':
             print("0.000000")
@@ -53,4 +275,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
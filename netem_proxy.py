@@ -0,0 +1,725 @@
+#!/usr/bin/env python3
+"""
+ユーザー空間のネットワークエミュレータ（tc/netem を使わない UDP+TCP 転送プロキシ）
+NET_ADMIN 権限なしで tc_setup.sh と同じ条件（帯域・遅延・損失）を与える。待ち受けポートに来た
+UDP（HTTP/3）とTCP（HTTP/2）を上流のサーバーに転送し、tc_setup.sh がサーバーの送信側に設定するのと
+同じく上流→クライアント方向（--direction で変更可）に以下を適用する:
+
+  帯域    トークンバケット（htb の rate / burst に相当, 待ち行列の上限 --limit パケット）
+  遅延    一定遅延 + ジッター（netem と同じく [delay-jitter, delay+jitter] の一様分布, 並べ替えが起きる）
+  損失    ベルヌーイ（'1%'）またはギルバート・エリオット（netem と同じ 'gemodel p r 1-h 1-k'）
+  並べ替え netem と同じく指定した割合のパケットを遅延なしで送る
+
+送出時刻の管理はタイマーホイール（TimerWheel）で行い、イベントループに登録するタイマーは常に
+1つだけにする。epoll の待ち時間はミリ秒単位に切り上げられるため、送出時刻の SPIN_SEC 前に起床して
+残りはイベントループを回しながら待つ（--spin-us 0 で無効）。プロキシ自身の遅れ（予定時刻からの
+送出の遅れ）と待ち行列の統計は方向ごとに集計し、制御ポートの stats で取得できる。
+
+TCPはバイト列として中継するので損失は適用しない（パケットの損失と再送はクライアント・プロキシ間で
+起きない）。HTTP/3 だけが損失を受けて比較が成り立たなくなるため、TCPを中継している間は損失の
+設定を拒否する（--udp-only でTCPを待ち受けなければ損失を設定できる）。セグメント（TCP_SEGMENT_BYTES）単位で帯域と遅延を適用し、転送中のデータが
+帯域遅延積＋待ち行列の上限を超えたら送信元の読み込みを止める。バイト列の順序を保つため、
+TCPにはジッターと並べ替えを適用せず、遅延が減っても先に送出予定のセグメントを追い越さない。
+
+  python3 netem_proxy.py --listen 0.0.0.0:9443 --upstream 127.0.0.1:8443 5mbit 50ms 0%
+  python3 docker_benchmark.py --emulator --standin --delays 0 50 100   # 起動・条件変更までランナーが行う
+
+条件は制御ポート（既定: 待ち受けポート+1, 127.0.0.1）に1行1つのJSONで変更する:
+
+  {"cmd": "set", "bandwidth": "5mbit", "delay": "50ms", "loss": "0%", "jitter": "0ms", "reorder": "0%"}
+  {"cmd": "get"}
+  {"cmd": "stats", "reset": false}
+
+set は統計をリセットする。EmulatorBackend は netshape.Shaper のバックエンドとして制御ポートを使う。
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import random
+import signal
+import socket
+import subprocess
+import sys
+import time
+from collections import deque
+
+from netshape import Shaping, ShapingError, parse_loss, parse_rate, parse_time
+
+DEFAULT_LIMIT = 1000                 # netem の既定の待ち行列長（パケット）
+DEFAULT_BURST_BYTES = 15140          # htb の既定と同程度（MTU 10個分）
+TCP_SEGMENT_BYTES = 1448             # TCPを分割して帯域・遅延を適用する単位
+WHEEL_TICK_SEC = 0.0005              # タイマーホイールの1スロットの幅
+WHEEL_SLOTS = 4096                   # 約2秒分（超える送出時刻は overflow のヒープに置く）
+SPIN_SEC = 0.001                     # epoll の切り上げ分だけ早く起床する
+UDP_IDLE_SEC = 60                    # UDPの対応（クライアント → 上流ソケット）を破棄するまでの無通信時間
+LATENESS_SAMPLES = 100000            # 遅れのパーセンタイルに使う直近の標本数
+DIRECTIONS = ('down', 'up', 'both')
+STARTUP_TIMEOUT_SEC = 10.0           # spawn() で制御ポートの待ち受けを待つ上限
+
+
+class LossModel:
+    """netem の loss 引数（'1%' / 'gemodel p r 1-h 1-k'）"""
+
+    def __init__(self, text='0%'):
+        self.text = str(text).strip()
+        fields = self.text.split()
+        if fields and fields[0] == 'gemodel':
+            if not 2 <= len(fields) <= 5:
+                raise ValueError(f"invalid gemodel: {text}")
+            p = parse_loss(fields[1]) / 100
+            # 省略時は netem と同じ（r = 1-p, 1-h = 100%, 1-k = 0%）
+            r = parse_loss(fields[2]) / 100 if len(fields) > 2 else 1 - p
+            bad = parse_loss(fields[3]) / 100 if len(fields) > 3 else 1.0
+            good = parse_loss(fields[4]) / 100 if len(fields) > 4 else 0.0
+            self.gemodel = (p, r, bad, good)
+            self.probability = None
+        else:
+            self.gemodel = None
+            self.probability = parse_loss(self.text or '0') / 100
+        self.bad_state = False
+
+    @property
+    def mean_pct(self):
+        """定常状態の損失率（%）"""
+        if self.gemodel is None:
+            return self.probability * 100
+        p, r, bad, good = self.gemodel
+        pi_bad = p / (p + r) if p + r else 0.0
+        return ((1 - pi_bad) * good + pi_bad * bad) * 100
+
+    def drop(self, rng):
+        if self.gemodel is None:
+            return self.probability > 0 and rng.random() < self.probability
+        p, r, bad, good = self.gemodel
+        # 状態遷移してからその状態の損失確率で判定する（netem の loss_gilb_ell と同じ順序）
+        if self.bad_state:
+            self.bad_state = rng.random() >= r
+        else:
+            self.bad_state = rng.random() < p
+        return rng.random() < (bad if self.bad_state else good)
+
+
+class TokenBucket:
+    """htb の rate / burst に相当するトークンバケット（送出可能になる時刻を計算する）"""
+
+    def __init__(self, rate_bps, burst_bytes=DEFAULT_BURST_BYTES):
+        self.rate = rate_bps / 8
+        self.burst = burst_bytes
+        self.tokens = burst_bytes
+        self.last = 0.0
+
+    def departure(self, now, size):
+        # 待ち行列があれば直前のパケットが出た時刻からトークンを積む
+        t = max(now, self.last)
+        self.tokens = min(self.burst, self.tokens + (t - self.last) * self.rate)
+        if self.tokens >= size:
+            self.tokens -= size
+        else:
+            t += (size - self.tokens) / self.rate
+            self.tokens = 0.0
+        self.last = t
+        return t
+
+
+class TimerWheel:
+    """送出予定のコールバックをスロットに分けて保持し、イベントループには最も早い1つだけを登録する"""
+
+    def __init__(self, loop, tick=WHEEL_TICK_SEC, size=WHEEL_SLOTS, spin=SPIN_SEC):
+        self.loop = loop
+        self.tick = tick
+        self.size = size
+        self.spin = spin
+        self.slots = [[] for _ in range(size)]
+        self.overflow = []
+        self.origin = loop.time()
+        self.cursor = 0
+        self.pending = 0
+        self.seq = 0
+        self.handle = None
+        self.armed_at = None
+
+    def _index(self, t):
+        return int((t - self.origin) / self.tick)
+
+    def schedule(self, when, callback, *args):
+        if not self.pending:
+            # 空の間に進んだ分のスロットを _fire で1つずつ辿らない
+            self.cursor = max(self.cursor, self._index(self.loop.time()))
+        index = max(self._index(when), self.cursor)
+        if index - self.cursor < self.size:
+            self.slots[index % self.size].append((when, callback, args))
+        else:
+            self.seq += 1
+            heapq.heappush(self.overflow, (when, self.seq, callback, args))
+        self.pending += 1
+        self._arm(when)
+
+    def _arm(self, when):
+        when -= self.spin
+        if self.handle is not None:
+            if self.armed_at <= when:
+                return
+            self.handle.cancel()
+        self.armed_at = when
+        self.handle = self.loop.call_at(when, self._fire)
+
+    def _fire(self):
+        self.handle = None
+        now = self.loop.time()
+        current = self._index(now)
+        while self.pending and self.cursor <= current:
+            slot = self.slots[self.cursor % self.size]
+            if slot:
+                if self.cursor < current:
+                    due, rest = slot, []
+                else:
+                    due = [entry for entry in slot if entry[0] <= now]
+                    rest = [entry for entry in slot if entry[0] > now] if len(due) < len(slot) else []
+                self.slots[self.cursor % self.size] = rest
+                self.pending -= len(due)
+                due.sort(key=lambda entry: entry[0])
+                for when, callback, args in due:
+                    callback(when, *args)
+            if self.cursor == current:
+                break
+            self.cursor += 1
+        # 範囲に入ったものをホイールに移す
+        while self.overflow and self._index(self.overflow[0][0]) - self.cursor < self.size:
+            when, _, callback, args = heapq.heappop(self.overflow)
+            self.slots[max(self._index(when), self.cursor) % self.size].append((when, callback, args))
+        if self.pending:
+            self._arm_next(now)
+
+    def _arm_next(self, now):
+        for offset in range(self.size):
+            slot = self.slots[(self.cursor + offset) % self.size]
+            if slot:
+                when = min(entry[0] for entry in slot)
+                break
+        else:
+            when = self.overflow[0][0]
+        if when - now < self.spin:
+            # 残りは epoll の分解能より短いのでループを回しながら待つ
+            self.handle = self.loop.call_soon(self._fire)
+            self.armed_at = now - self.spin
+        else:
+            self._arm(when)
+
+
+class LinkStats:
+    """1方向の統計（set または stats reset でリセット）"""
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.lost = 0
+        self.dropped = 0
+        self.queue_delay_sum = 0.0
+        self.queue_delay_max = 0.0
+        self.backlog_max = 0
+        self.lateness = deque(maxlen=LATENESS_SAMPLES)
+        self.lateness_max = 0.0
+
+    def summary(self):
+        lateness = sorted(self.lateness)
+        delivered = len(self.lateness)
+        return {
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'lost': self.lost,
+            'dropped': self.dropped,
+            'queue_delay_mean_ms': self.queue_delay_sum / self.packets * 1000 if self.packets else 0.0,
+            'queue_delay_max_ms': self.queue_delay_max * 1000,
+            'backlog_max': self.backlog_max,
+            'lateness_mean_ms': sum(lateness) / delivered * 1000 if delivered else 0.0,
+            'lateness_p99_ms': lateness[min(int(delivered * 0.99), delivered - 1)] * 1000 if delivered else 0.0,
+            'lateness_max_ms': self.lateness_max * 1000,
+        }
+
+
+class Link:
+    """1方向のリンク（損失 → トークンバケット → 遅延・ジッター → 送出）"""
+
+    def __init__(self, wheel, rng, shaped=True):
+        self.wheel = wheel
+        self.rng = rng
+        self.shaped = shaped
+        self.stats = LinkStats()
+        self.bucket = None
+        self.departures = deque()
+        # 直前のTCPセグメントの送出予定時刻と、送出待ちのTCPセグメント数（バイト列は送出順を入れ替えない）
+        self.stream_last = 0.0
+        self.stream_pending = 0
+        self.configure(Shaping(0, 0.0, 0.0), LossModel(), DEFAULT_LIMIT, DEFAULT_BURST_BYTES)
+
+    def configure(self, shaping, loss, limit, burst):
+        """条件を変える（待ち行列はそのまま引き継ぎ、送出予定のパケットを後続が追い越さないようにする）"""
+        self.shaping = shaping
+        self.loss = loss
+        self.limit = limit
+        previous, self.bucket = self.bucket, TokenBucket(shaping.rate_bps, burst) if shaping.rate_bps else None
+        if previous is not None and self.bucket is not None:
+            self.bucket.last = previous.last
+            self.bucket.tokens = min(previous.tokens, burst)
+        self.stats = LinkStats()
+
+    @property
+    def window_bytes(self):
+        """TCPの中継で送信元を止める転送中のバイト数（帯域遅延積 + 待ち行列の上限）"""
+        rate = self.shaping.rate_bps / 8 if self.shaping.rate_bps else 125e6
+        return int(rate * (self.shaping.delay_us + self.shaping.jitter_us) / 1e6) + self.limit * TCP_SEGMENT_BYTES
+
+    def submit(self, data, send, droppable=True, done=None):
+        """data を送出予定に入れる（損失・待ち行列溢れで捨てたら False）。送出後に done(size) を呼ぶ"""
+        size = len(data)
+        stats = self.stats
+        if not self.shaped:
+            stats.packets += 1
+            stats.bytes += size
+            send(data)
+            if done is not None:
+                done(size)
+            return True
+        if droppable and self.loss.drop(self.rng):
+            stats.lost += 1
+            return False
+        now = self.wheel.loop.time()
+        departures = self.departures
+        while departures and departures[0] <= now:
+            departures.popleft()
+        if droppable and len(departures) >= self.limit:
+            stats.dropped += 1
+            return False
+
+        t = now
+        if self.bucket is not None:
+            t = self.bucket.departure(now, size)
+            departures.append(t)
+            stats.backlog_max = max(stats.backlog_max, len(departures))
+        queue_delay = t - now
+        stats.queue_delay_sum += queue_delay
+        stats.queue_delay_max = max(stats.queue_delay_max, queue_delay)
+        stats.packets += 1
+        stats.bytes += size
+
+        shaping = self.shaping
+        if not droppable:
+            # TCPのバイト列: ジッター・並べ替えを適用せず、遅延が減っても先行のセグメントより前に出さない
+            t = max(t + shaping.delay_us / 1e6, self.stream_last)
+            self.stream_last = t
+        elif not (shaping.reorder_pct and self.rng.random() * 100 < shaping.reorder_pct):
+            delay = shaping.delay_us
+            if shaping.jitter_us:
+                delay = max(0.0, delay + self.rng.uniform(-shaping.jitter_us, shaping.jitter_us))
+            t += delay / 1e6
+        if t <= now and (droppable or not self.stream_pending):
+            send(data)
+            stats.lateness.append(0.0)
+            if done is not None:
+                done(size)
+        else:
+            # 送出待ちのTCPセグメントがあれば、予定時刻を過ぎていてもその後ろに並べる
+            self.stream_pending += not droppable
+            self.wheel.schedule(t, self._deliver, data, send, done, not droppable)
+        return True
+
+    def _deliver(self, when, data, send, done, stream):
+        self.stream_pending -= stream
+        late = self.wheel.loop.time() - when
+        self.stats.lateness.append(late)
+        if late > self.stats.lateness_max:
+            self.stats.lateness_max = late
+        send(data)
+        if done is not None:
+            done(len(data))
+
+
+class Emulator:
+    """両方向のリンクと現在の設定"""
+
+    def __init__(self, loop, direction='down', limit=DEFAULT_LIMIT, burst=DEFAULT_BURST_BYTES, seed=None, spin=SPIN_SEC,
+                 tcp=True):
+        if direction not in DIRECTIONS:
+            raise ValueError(f"unknown direction: {direction}")
+        # TCPを中継するか（中継する間は損失を設定できない）
+        self.tcp = tcp
+        self.limit = limit
+        self.burst = burst
+        self.wheel = TimerWheel(loop, spin=spin)
+        rng = random.Random(seed)
+        self.down = Link(self.wheel, rng, shaped=direction in ('down', 'both'))
+        self.up = Link(self.wheel, rng, shaped=direction in ('up', 'both'))
+        self.direction = direction
+        self.set('1mbit', '0ms', '0%')
+
+    def set(self, bandwidth, delay, loss='0%', jitter='0ms', reorder='0%'):
+        """tc_setup.sh と同じ形式の値で条件を変える（統計はリセットする）"""
+        loss_model = LossModel(loss)
+        if self.tcp and loss_model.mean_pct > 0:
+            raise ValueError(f"loss {loss_model.text} would apply to UDP only while TCP is relayed (use --udp-only)")
+        shaping = Shaping(parse_rate(bandwidth), parse_time(delay), loss_model.mean_pct,
+                          parse_time(jitter), parse_loss(reorder))
+        for link in (self.down, self.up):
+            # ギルバート・エリオットの状態は方向ごとに持つ
+            link.configure(shaping, LossModel(loss), self.limit, self.burst)
+        self.loss_text = loss_model.text
+        return self.get()
+
+    def get(self):
+        shaping = self.down.shaping
+        return {'rate_bps': shaping.rate_bps, 'delay_us': shaping.delay_us, 'jitter_us': shaping.jitter_us,
+                'loss_pct': shaping.loss_pct, 'loss': self.loss_text, 'reorder_pct': shaping.reorder_pct,
+                'direction': self.direction, 'limit': self.limit, 'tcp': self.tcp}
+
+    def stats(self, reset=False):
+        summary = {'down': self.down.stats.summary(), 'up': self.up.stats.summary()}
+        if reset:
+            self.down.stats = LinkStats()
+            self.up.stats = LinkStats()
+        return summary
+
+
+class UpstreamDatagram(asyncio.DatagramProtocol):
+    """1クライアント分の上流UDPソケット"""
+
+    def __init__(self, relay, client_addr):
+        self.relay = relay
+        self.client_addr = client_addr
+        self.transport = None
+        # 上流ソケットの作成中に届いたデータ
+        self.backlog = []
+        self.last_seen = time.monotonic()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.last_seen = time.monotonic()
+        self.relay.emulator.down.submit(data, self.relay.reply_sender(self.client_addr))
+
+    def error_received(self, exc):
+        pass
+
+
+class UdpRelay(asyncio.DatagramProtocol):
+    """待ち受けUDPソケット（クライアントごとに上流ソケットを作る）"""
+
+    def __init__(self, emulator, upstream):
+        self.emulator = emulator
+        self.upstream = upstream
+        self.transport = None
+        self.sessions = {}
+        self.senders = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def reply_sender(self, client_addr):
+        sender = self.senders.get(client_addr)
+        if sender is None:
+            sender = self.senders[client_addr] = lambda data: self.transport.sendto(data, client_addr)
+        return sender
+
+    def datagram_received(self, data, addr):
+        session = self.sessions.get(addr)
+        if session is None:
+            session = self.sessions[addr] = UpstreamDatagram(self, addr)
+            asyncio.ensure_future(self._open(session))
+        session.last_seen = time.monotonic()
+        if session.transport is None:
+            session.backlog.append(data)
+        else:
+            self.emulator.up.submit(data, session.transport.sendto)
+
+    async def _open(self, session):
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.create_datagram_endpoint(lambda: session, remote_addr=self.upstream)
+        except OSError:
+            self.sessions.pop(session.client_addr, None)
+            return
+        # 作成中に届いたデータは捨てずに送る
+        for data in session.backlog:
+            self.emulator.up.submit(data, session.transport.sendto)
+        session.backlog = []
+
+    def expire(self):
+        deadline = time.monotonic() - UDP_IDLE_SEC
+        for addr, session in list(self.sessions.items()):
+            if session.last_seen < deadline and session.transport is not None:
+                session.transport.close()
+                del self.sessions[addr]
+                self.senders.pop(addr, None)
+
+
+class TcpPipe(asyncio.Protocol):
+    """TCP中継の片側（受け取ったデータをリンクを通して相手側に書く）"""
+
+    def __init__(self, link):
+        self.link = link
+        self.transport = None
+        self.peer = None
+        self.in_flight = 0
+        self.paused = False
+        self.closed = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def data_received(self, data):
+        view = memoryview(data)
+        for offset in range(0, len(view), TCP_SEGMENT_BYTES):
+            segment = view[offset:offset + TCP_SEGMENT_BYTES]
+            self.in_flight += len(segment)
+            self.link.submit(segment, self.peer.write, droppable=False, done=self._sent)
+        if not self.paused and self.in_flight > self.link.window_bytes:
+            self.paused = True
+            self.transport.pause_reading()
+
+    def _sent(self, size):
+        self.in_flight -= size
+        if self.closed and self.in_flight == 0:
+            self.peer.close()
+        elif self.paused and self.in_flight <= self.link.window_bytes // 2:
+            self.paused = False
+            self.transport.resume_reading()
+
+    def eof_received(self):
+        self.closed = True
+        if self.in_flight == 0:
+            self.peer.close()
+        return False
+
+    def connection_lost(self, exc):
+        self.closed = True
+        if self.in_flight == 0 and self.peer is not None:
+            self.peer.close()
+
+    # 相手側（peer）から呼ばれる書き込み口
+    def write(self, data):
+        if not self.transport.is_closing():
+            self.transport.write(data)
+
+    def close(self):
+        self.transport.close()
+
+
+class ClientPipe(TcpPipe):
+    """クライアント側の接続（上流に接続するまで読み込みを止める）"""
+
+    def __init__(self, emulator, upstream):
+        super().__init__(emulator.up)
+        self.emulator = emulator
+        self.upstream = upstream
+
+    def connection_made(self, transport):
+        super().connection_made(transport)
+        transport.pause_reading()
+        asyncio.ensure_future(self._connect())
+
+    async def _connect(self):
+        loop = asyncio.get_running_loop()
+        upstream_pipe = TcpPipe(self.emulator.down)
+        try:
+            await loop.create_connection(lambda: upstream_pipe, *self.upstream)
+        except OSError:
+            self.close()
+            return
+        upstream_pipe.peer = self
+        self.peer = upstream_pipe
+        if self.closed:
+            upstream_pipe.close()
+        else:
+            self.transport.resume_reading()
+
+
+class ControlProtocol(asyncio.Protocol):
+    """制御ポート（1行1つのJSON要求に1行のJSONで応答する）"""
+
+    def __init__(self, emulator):
+        self.emulator = emulator
+        self.buffer = b''
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        self.buffer += data
+        while b'\n' in self.buffer:
+            line, self.buffer = self.buffer.split(b'\n', 1)
+            self.transport.write(json.dumps(self.handle(line)).encode() + b'\n')
+
+    def handle(self, line):
+        try:
+            request = json.loads(line)
+            cmd = request.get('cmd')
+            if cmd == 'set':
+                config = self.emulator.set(request['bandwidth'], request.get('delay', '0ms'), request.get('loss', '0%'),
+                                           request.get('jitter', '0ms'), request.get('reorder', '0%'))
+                return {'ok': True, 'config': config}
+            if cmd == 'get':
+                return {'ok': True, 'config': self.emulator.get()}
+            if cmd == 'stats':
+                return {'ok': True, 'stats': self.emulator.stats(bool(request.get('reset')))}
+            return {'ok': False, 'error': f"unknown command: {cmd}"}
+        except (ValueError, KeyError, TypeError) as e:
+            return {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+
+
+def parse_address(text, default_host='0.0.0.0'):
+    """'host:port' / 'port' → (host, port)"""
+    host, _, port = text.rpartition(':')
+    return host.strip('[]') or default_host, int(port)
+
+
+async def run_proxy(listen, upstream, control, bandwidth, delay, loss, jitter='0ms', reorder='0%',
+                    direction='down', limit=DEFAULT_LIMIT, burst=DEFAULT_BURST_BYTES, seed=None, spin=SPIN_SEC,
+                    tcp=True):
+    loop = asyncio.get_running_loop()
+    emulator = Emulator(loop, direction, limit, burst, seed, spin, tcp)
+    emulator.set(bandwidth, delay, loss, jitter, reorder)
+
+    udp_transport, udp_relay = await loop.create_datagram_endpoint(
+        lambda: UdpRelay(emulator, upstream), local_addr=listen, reuse_port=True)
+
+    tcp_server = None
+    if tcp:
+        tcp_server = await loop.create_server(lambda: ClientPipe(emulator, upstream), *listen, reuse_address=True)
+    control_server = await loop.create_server(lambda: ControlProtocol(emulator), *control, reuse_address=True)
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    print(f"Emulating {describe(emulator.get())} on {listen[0]}:{listen[1]} -> {upstream[0]}:{upstream[1]} "
+          f"(control {control[0]}:{control[1]})", flush=True)
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), UDP_IDLE_SEC)
+            except asyncio.TimeoutError:
+                udp_relay.expire()
+    finally:
+        print(json.dumps(emulator.stats()), flush=True)
+        control_server.close()
+        if tcp_server is not None:
+            tcp_server.close()
+        udp_transport.close()
+
+
+def describe(config):
+    return (f"rate {config['rate_bps']}bit/s delay {config['delay_us'] / 1000:g}ms "
+            f"jitter {config['jitter_us'] / 1000:g}ms loss {config['loss']} reorder {config['reorder_pct']:g}% "
+            f"({config['direction']}{'' if config['tcp'] else ', UDP only'})")
+
+
+def control(address, request, timeout=5.0):
+    """制御ポートに要求を送り応答を返す（エラー応答は ShapingError）"""
+    with socket.create_connection(address, timeout=timeout) as sock:
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        reply = b''
+        while not reply.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            reply += chunk
+    response = json.loads(reply)
+    if not response.get('ok'):
+        raise ShapingError(response.get('error', 'emulator error'))
+    return response
+
+
+class EmulatorBackend:
+    """netshape.Shaper のバックエンド（tc の代わりにエミュレータの制御ポートで設定・読み戻しする）"""
+    name = 'emulator'
+
+    def __init__(self, address):
+        self.address = address
+
+    def read(self):
+        config = control(self.address, {'cmd': 'get'})['config']
+        return Shaping(config['rate_bps'], config['delay_us'], config['loss_pct'], config['jitter_us'],
+                       config['reorder_pct'])
+
+    def build(self, shaping):
+        self.change(shaping)
+
+    def change(self, shaping):
+        control(self.address, {'cmd': 'set', 'bandwidth': f"{shaping.rate_bps}bit",
+                               'delay': f"{shaping.delay_us:.3f}us", 'loss': f"{shaping.loss_pct:.6f}%",
+                               'jitter': f"{shaping.jitter_us:.3f}us", 'reorder': f"{shaping.reorder_pct:.6f}%"})
+
+    def stats(self):
+        return control(self.address, {'cmd': 'stats'})['stats']
+
+    def close(self):
+        pass
+
+
+def spawn(listen_port, upstream, control_port=None, log_path=None, extra_args=(), timeout=STARTUP_TIMEOUT_SEC):
+    """エミュレータを子プロセスとして起動し、待ち受けを始めるまで待つ（ランナー用, Popen を返す）
+
+    制御ポートは転送用のUDP・TCPの後に待ち受けるので、制御ポートに接続できれば準備できている。
+    """
+    control_port = control_port or listen_port + 1
+    log = open(log_path, 'w') if log_path else subprocess.DEVNULL
+    cmd = [sys.executable, __file__, '--listen', f"0.0.0.0:{listen_port}", '--upstream', f"{upstream[0]}:{upstream[1]}",
+           '--control', f"127.0.0.1:{control_port}", *extra_args]
+    try:
+        proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+    finally:
+        # 子プロセスが複製を持つので親では閉じる
+        if log_path:
+            log.close()
+    where = f" (log: {log_path})" if log_path else ''
+    deadline = time.monotonic() + timeout
+    while True:
+        if proc.poll() is not None:
+            raise RuntimeError(f"emulator exited with {proc.returncode}{where}")
+        try:
+            with socket.create_connection(('127.0.0.1', control_port), timeout=0.5):
+                return proc
+        except OSError:
+            if time.monotonic() > deadline:
+                proc.terminate()
+                proc.wait()
+                raise RuntimeError(f"emulator did not listen on control port {control_port} within {timeout:g}s{where}")
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Userspace UDP+TCP network emulator proxy (tc_setup.sh parameters)')
+    parser.add_argument('bandwidth', nargs='?', default='1mbit', help='帯域（tc_setup.sh の第2引数, 既定: 1mbit）')
+    parser.add_argument('latency', nargs='?', default='0ms', help='遅延（第3引数, 既定: 0ms）')
+    parser.add_argument('loss', nargs='?', default='0%', help="損失（第4引数, '1%%' または 'gemodel p r 1-h 1-k'）")
+    parser.add_argument('--listen', default='0.0.0.0:9443', help='待ち受けアドレス（TCPとUDPの両方）')
+    parser.add_argument('--upstream', default='127.0.0.1:8443', help='転送先のサーバー')
+    parser.add_argument('--control', help='制御ポート（既定: 127.0.0.1:<待ち受けポート+1>）')
+    parser.add_argument('--jitter', default='0ms', help='ジッター')
+    parser.add_argument('--reorder', default='0%', help='遅延なしで送るパケットの割合')
+    parser.add_argument('--direction', choices=DIRECTIONS, default='down',
+                        help='条件を適用する方向（down=上流→クライアント, tc_setup.sh と同じ）')
+    parser.add_argument('--limit', type=int, default=DEFAULT_LIMIT, help='待ち行列の上限（パケット）')
+    parser.add_argument('--burst', type=int, default=DEFAULT_BURST_BYTES, help='トークンバケットの深さ（バイト）')
+    parser.add_argument('--seed', type=int, help='損失・ジッターの乱数シード')
+    parser.add_argument('--udp-only', action='store_true',
+                        help='TCPを待ち受けない（HTTP/3 のみを中継し、損失を設定できるようにする）')
+    parser.add_argument('--spin-us', type=float, default=SPIN_SEC * 1e6,
+                        help='送出時刻の何マイクロ秒前に起床してループを回しながら待つか（0で無効）')
+    args = parser.parse_args()
+
+    listen = parse_address(args.listen)
+    upstream = parse_address(args.upstream, '127.0.0.1')
+    control_address = parse_address(args.control, '127.0.0.1') if args.control else ('127.0.0.1', listen[1] + 1)
+    try:
+        asyncio.run(run_proxy(listen, upstream, control_address, args.bandwidth, args.latency, args.loss,
+                              args.jitter, args.reorder, args.direction, args.limit, args.burst, args.seed,
+                              args.spin_us / 1e6, not args.udp_only))
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    main()
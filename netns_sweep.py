@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+ネットワーク名前空間による遅延・帯域条件の並列掃引
+1つのホスト上に「スロット」を複数作り、スロットごとに
+  サーバー用netns ── veth ── クライアント用netns
+を構成して、サーバーのインスタンスとベンチマークランナー（docker_benchmark.py）を
+それぞれ専用のCPUコアに固定して動かす。tc（htb + netem）はスロットのサーバー側veth
+（docker_benchmark.sh と同じくサーバー側のみ）に設定するため、スロット同士は干渉しない。
+
+条件（帯域 × 遅延）は帯域ごとに遅延をスロット数に振り分けた作業単位に分け、空いた
+スロットから順に実行する。帯域ごとの結果は1つの benchmark_results.csv にまとめ、
+docker_benchmark.py と同じ分析を行う。
+
+root権限（ip netns / tc）と sch_netem が必要。サーバーは既定で server/main
+（Goサーバーのビルド成果物、証明書は certs/ から読む）を --server-cmd で差し替えられる。
+"""
+
+import argparse
+import csv
+import glob
+import os
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from docker_benchmark import PROJECT_ROOT, env_config, run_analysis
+from schedule import SCHEDULES, Schedule
+from stopping_rule import CRITERIA
+
+# 名前空間・vethの名前の接頭辞（インターフェース名は15文字以内）
+NAME_PREFIX = 'h3b'
+
+# スロットkのアドレス: クライアント 10.77.k.1 / サーバー 10.77.k.2
+SUBNET_FORMAT = '10.77.{slot}.{host}'
+
+SERVER_PORT = 8443
+DEFAULT_SERVER_CMD = os.path.join(PROJECT_ROOT, 'server', 'main')
+DEFAULT_SERVER_CWD = os.path.join(PROJECT_ROOT, 'certs')
+
+# サーバー起動後、最初の条件を始めるまでの待機（秒）
+SERVER_STARTUP_SEC = 2
+
+
+def ip(*args, check=True):
+    return subprocess.run(['ip', *args], check=check, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+
+def pinned(cpu):
+    """子プロセスを指定CPUに固定する preexec_fn"""
+    if cpu is None:
+        return None
+    return lambda: os.sched_setaffinity(0, {cpu})
+
+
+class Slot:
+    """1組のnetns（サーバー・クライアント）とサーバープロセス"""
+
+    def __init__(self, index, server_cpu=None, client_cpu=None):
+        self.index = index
+        self.server_ns = f'{NAME_PREFIX}-s{index}'
+        self.client_ns = f'{NAME_PREFIX}-c{index}'
+        self.server_dev = f'{NAME_PREFIX}{index}s'
+        self.client_dev = f'{NAME_PREFIX}{index}c'
+        self.server_addr = SUBNET_FORMAT.format(slot=index, host=2)
+        self.client_addr = SUBNET_FORMAT.format(slot=index, host=1)
+        self.server_cpu = server_cpu
+        self.client_cpu = client_cpu
+        self.server = None
+
+    @property
+    def url(self):
+        return f'https://{self.server_addr}:{SERVER_PORT}/1mb'
+
+    def create(self):
+        """netnsとvethペアを作成し、アドレスを設定する（残骸があれば作り直す）"""
+        self.destroy()
+        ip('netns', 'add', self.server_ns)
+        ip('netns', 'add', self.client_ns)
+        ip('link', 'add', self.client_dev, 'type', 'veth', 'peer', 'name', self.server_dev)
+        ip('link', 'set', self.client_dev, 'netns', self.client_ns)
+        ip('link', 'set', self.server_dev, 'netns', self.server_ns)
+        for ns, dev, addr in [(self.client_ns, self.client_dev, self.client_addr),
+                              (self.server_ns, self.server_dev, self.server_addr)]:
+            ip('-n', ns, 'addr', 'add', f'{addr}/24', 'dev', dev)
+            ip('-n', ns, 'link', 'set', dev, 'up')
+            ip('-n', ns, 'link', 'set', 'lo', 'up')
+
+    def start_server(self, server_cmd, server_cwd, log_path):
+        """サーバー用netns内でサーバーを起動する"""
+        with open(log_path, 'a') as log:
+            self.server = subprocess.Popen(['ip', 'netns', 'exec', self.server_ns, *server_cmd], cwd=server_cwd,
+                                           stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+                                           preexec_fn=pinned(self.server_cpu))
+
+    def run(self, bandwidth, delays, log_dir, runner_args):
+        """クライアント用netns内でランナーを実行し、終了コードを返す"""
+        cmd = ['ip', 'netns', 'exec', self.client_ns, sys.executable, os.path.join(PROJECT_ROOT, 'docker_benchmark.py'),
+               '--url', self.url, '--bandwidth', bandwidth, '--delays', *map(str, delays), '--log-dir', log_dir,
+               '--tc-netns', self.server_ns, '--tc-dev', self.server_dev, '--no-analysis', *runner_args]
+        os.makedirs(log_dir, exist_ok=True)
+        with open(os.path.join(log_dir, 'runner.log'), 'w') as log:
+            return subprocess.run(cmd, stdout=log, stderr=subprocess.STDOUT,
+                                  preexec_fn=pinned(self.client_cpu)).returncode
+
+    def destroy(self):
+        if self.server is not None:
+            # サーバーが子プロセスを起動していても残らないようプロセスグループごと止める
+            os.killpg(self.server.pid, signal.SIGTERM)
+            try:
+                self.server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.server.pid, signal.SIGKILL)
+            self.server = None
+        # netnsを削除するとその中のvethも削除される
+        for ns in (self.server_ns, self.client_ns):
+            ip('netns', 'del', ns, check=False)
+
+
+def allocate_cpus(slots):
+    """スロットごとに (サーバーCPU, クライアントCPU) を割り当てる。コアが足りなければ固定しない"""
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < 2 * slots:
+        print(f"[WARN] CPUコア数 ({len(cpus)}) がスロット数×2 に足りないため、CPU固定を行いません", file=sys.stderr)
+        return [(None, None)] * slots
+    return [(cpus[2 * k], cpus[2 * k + 1]) for k in range(slots)]
+
+
+def work_units(bandwidths, delays, slots):
+    """帯域ごとに遅延をスロット数に振り分ける（交互に配り、高遅延の条件が偏らないようにする）"""
+    units = []
+    for bandwidth in bandwidths:
+        for part in range(min(slots, len(delays))):
+            units.append((bandwidth, part, delays[part::slots]))
+    return units
+
+
+def merge_csv(bandwidth_dir, name, sort_key):
+    """作業単位ごとの同名CSVを帯域のディレクトリに1つにまとめ、そのパスを返す（無ければNone）"""
+    rows, fields = [], None
+    for part_csv in sorted(glob.glob(os.path.join(bandwidth_dir, 'parts', '*', name))):
+        with open(part_csv, newline='') as f:
+            reader = csv.DictReader(f)
+            fields = fields or reader.fieldnames
+            rows.extend(reader)
+
+    if fields is None:
+        return None
+    rows.sort(key=sort_key)
+    csv_path = os.path.join(bandwidth_dir, name)
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    return csv_path
+
+
+def merge_parts(bandwidth_dir):
+    """作業単位ごとのCSV・時系列を帯域のディレクトリにまとめ、結果CSVのパスを返す"""
+    # ペイロードサイズごとのサブディレクトリ（timelines/<N>B/）は作業単位をまたいで共有されるので
+    # ディレクトリごとではなくファイル単位で移す
+    for part_dir in glob.glob(os.path.join(bandwidth_dir, 'parts', '*', 'timelines')):
+        for timeline in glob.glob(os.path.join(part_dir, '**', '*'), recursive=True):
+            if os.path.isdir(timeline):
+                continue
+            dest = os.path.join(bandwidth_dir, 'timelines', os.path.relpath(timeline, part_dir))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.move(timeline, dest)
+
+    latency_ms = lambda r: int(r['latency'].replace('ms', ''))
+    merge_csv(bandwidth_dir, 'stopping_summary.csv', lambda r: (latency_ms(r), r['protocol']))
+    return merge_csv(bandwidth_dir, 'benchmark_results.csv',
+                     lambda r: (latency_ms(r), r['protocol'], int(r['iteration'])))
+
+
+def main():
+    defaults = env_config()
+    parser = argparse.ArgumentParser(description='Parallel latency/bandwidth sweep across network namespaces')
+    parser.add_argument('--bandwidths', nargs='+', default=[defaults['bandwidth']], help='帯域 (例: 10mbit 5mbit)')
+    parser.add_argument('--delays', type=int, nargs='+', default=defaults['delays'], help='遅延条件（ms）')
+    parser.add_argument('--iterations', type=int, default=defaults['iterations'], help='各条件の反復回数')
+    parser.add_argument('--sleep', type=float, default=defaults['sleep'], help='反復間の待機時間（秒）')
+    parser.add_argument('--slots', type=int, default=max(len(os.sched_getaffinity(0)) // 2, 1),
+                        help='並列に動かすスロット数（既定: CPUコア数/2）')
+    parser.add_argument('--server-cmd', default=DEFAULT_SERVER_CMD, help='サーバーの起動コマンド')
+    parser.add_argument('--standin', action='store_true',
+                        help='server/main の代わりに standin_server.py（Python版の代替サーバー）を使う')
+    parser.add_argument('--server-cwd', default=DEFAULT_SERVER_CWD, help='サーバーの作業ディレクトリ（証明書の場所）')
+    parser.add_argument('--log-dir', help='出力先（既定: logs/netns_sweep_<日時>）')
+    parser.add_argument('--payloads', type=int, nargs='+', default=defaults['payloads'],
+                        help='遅延条件ごとに /bytes/<N> をこれらのサイズ（バイト）で計測する')
+    parser.add_argument('--timeline', action='store_true', default=defaults['timeline'],
+                        help='受信スループットの時系列を保存')
+    parser.add_argument('--ci-width', type=float, default=defaults['ci_width'],
+                        help='逐次停止規則: 信頼区間の相対全幅の目標（docker_benchmark.py と同じ）')
+    parser.add_argument('--ci-target', choices=CRITERIA, default=defaults['ci_target'],
+                        help='逐次停止規則: mean / diff')
+    parser.add_argument('--min-iterations', type=int, default=defaults['min_iterations'], help='逐次停止規則: 最小反復回数')
+    parser.add_argument('--max-iterations', type=int, default=defaults['max_iterations'], help='逐次停止規則: 最大反復回数')
+    parser.add_argument('--schedule', choices=SCHEDULES, default=defaults['schedule'],
+                        help='計測順（docker_benchmark.py と同じ, 全スロットで同じシードを使う）')
+    parser.add_argument('--seed', type=int, default=defaults['seed'], help='--schedule randomized の乱数シード')
+    parser.add_argument('--no-analysis', action='store_true', help='終了後のグラフ・レポート生成を行わない')
+
+    args = parser.parse_args()
+    if os.geteuid() != 0:
+        parser.error('ネットワーク名前空間の作成には root 権限が必要です')
+
+    bandwidths = [f'{b}mbit' if b.isdigit() else b for b in args.bandwidths]
+    log_dir = args.log_dir or os.path.join('logs', f"netns_sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(log_dir, exist_ok=True)
+    schedule = Schedule(args.schedule, args.seed)
+    runner_args = ['--iterations', str(args.iterations), '--sleep', str(args.sleep),
+                   '--schedule', schedule.kind, '--seed', str(schedule.seed)]
+    if args.timeline:
+        runner_args.append('--timeline')
+    if args.payloads:
+        runner_args += ['--payloads', *map(str, args.payloads)]
+    if args.ci_width is not None:
+        runner_args += ['--ci-width', str(args.ci_width), '--ci-target', args.ci_target,
+                        '--min-iterations', str(args.min_iterations), '--max-iterations', str(args.max_iterations)]
+
+    slots = [Slot(k, *cpus) for k, cpus in enumerate(allocate_cpus(args.slots))]
+    units = work_units(bandwidths, args.delays, len(slots))
+    print(f"スロット数: {len(slots)}, 作業単位: {len(units)} (帯域 {len(bandwidths)} × 遅延 {len(args.delays)}条件)")
+    print(f"出力先: {log_dir}")
+
+    def bandwidth_dir(bandwidth):
+        return os.path.join(log_dir, f"docker_{bandwidth.replace('mbit', '')}mbit")
+
+    free_slots = list(slots)
+
+    def run_unit(unit):
+        bandwidth, part, delays = unit
+        slot = free_slots.pop()
+        try:
+            print(f"[slot {slot.index}] {bandwidth} 遅延 {delays[0]}ms 他 {len(delays)}条件 開始")
+            returncode = slot.run(bandwidth, delays, os.path.join(bandwidth_dir(bandwidth), 'parts', f'{part:02d}'),
+                                  runner_args)
+            print(f"[slot {slot.index}] {bandwidth} part {part} 終了 (exit {returncode})")
+            return returncode
+        finally:
+            free_slots.append(slot)
+
+    start = time.monotonic()
+    try:
+        server_cmd = shlex.split(args.server_cmd)
+        if args.standin:
+            server_cmd = [sys.executable, os.path.join(PROJECT_ROOT, 'standin_server.py')]
+        for slot in slots:
+            slot.create()
+            slot.start_server(server_cmd, args.server_cwd, os.path.join(log_dir, f'server_{slot.index}.log'))
+        time.sleep(SERVER_STARTUP_SEC)
+
+        # 各スレッドは1スロットを占有し、ランナーのサブプロセスの終了を待つだけ
+        with ThreadPoolExecutor(max_workers=len(slots)) as executor:
+            returncodes = list(executor.map(run_unit, units))
+    finally:
+        for slot in slots:
+            slot.destroy()
+
+    print(f"\n全作業単位が完了しました ({time.monotonic() - start:.0f}秒, 失敗 {sum(1 for r in returncodes if r)}件)")
+
+    for bandwidth in bandwidths:
+        csv_path = merge_parts(bandwidth_dir(bandwidth))
+        if csv_path is None:
+            print(f"{bandwidth}: 結果がありません")
+            continue
+        print(f"{bandwidth}: {csv_path}")
+        schedule.save(bandwidth_dir(bandwidth))
+        if not args.no_analysis:
+            timeline_dir = os.path.join(bandwidth_dir(bandwidth), 'timelines')
+            run_analysis(csv_path, bandwidth_dir(bandwidth), timeline_dir if args.timeline else None)
+
+    print(f"完了: {log_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+帯域・遅延・損失の設定（tc_setup.sh の条件変更の置き換え）
+tc_setup.sh と同じ htb 1: → class 1:10 → netem 10: の木を最初に1度だけ作り、以降の条件変更は
+htbクラスとnetemを change で書き換える（木の削除・再構築をしない）。変更後にqdiscとクラスを
+読み戻し、設定値と一致することを確認してから返すので、固定の待機時間は不要になる。
+
+netlink は pyroute2 があればプロセス内で使い、無ければ tc コマンドにフォールバックする
+（読み戻しはどちらでも行う）。Dockerのサーバーコンテナには /proc/<pid>/ns/net から入り、
+そこに入れない場合（root以外・Docker Desktop）は docker exec で tc を実行する。
+"""
+
+import re
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+
+try:
+    from pyroute2 import IPRoute
+    from pyroute2.netlink import NLM_F_ACK, NLM_F_CREATE, NLM_F_EXCL, NLM_F_REQUEST
+    from pyroute2.netlink.exceptions import NetlinkError
+    from pyroute2.netlink.rtnl import RTM_NEWQDISC, TC_H_ROOT
+    from pyroute2.netlink.rtnl.tcmsg import tcmsg
+    from pyroute2.netlink.rtnl.tcmsg.common import tick_in_usec
+    from pyroute2.netlink.rtnl.tcmsg.sched_netem import get_parameters as netem_parameters
+except ImportError:
+    IPRoute = None
+    NetlinkError = OSError
+
+# tc_setup.sh と同じハンドル（1:, 1:10, 10:）
+HTB_ROOT = 0x10000
+HTB_CLASS = 0x10010
+NETEM = 0x100000
+
+U32_MAX = 2 ** 32 - 1
+
+RATE_UNITS = {'': 1, 'k': 1000, 'm': 1000 ** 2, 'g': 1000 ** 3, 't': 1000 ** 4}
+TIME_UNITS = {'s': 1e6, 'ms': 1e3, 'us': 1, 'usec': 1, 'msec': 1e3, 'sec': 1e6}
+
+
+class ShapingError(RuntimeError):
+    pass
+
+
+def parse_rate(text):
+    """'5mbit' / '5Mbit' / '625000bit' → ビット/秒"""
+    m = re.fullmatch(r'([\d.]+)\s*([kmgt]?)bit', text.strip().lower())
+    if not m:
+        raise ValueError(f"invalid rate: {text}")
+    return round(float(m.group(1)) * RATE_UNITS[m.group(2)])
+
+
+def parse_time(text):
+    """'50ms' / '1s' / '500us' → マイクロ秒"""
+    m = re.fullmatch(r'([\d.]+)\s*(s|ms|us|usec|msec|sec)', text.strip().lower())
+    if not m:
+        raise ValueError(f"invalid time: {text}")
+    return float(m.group(1)) * TIME_UNITS[m.group(2)]
+
+
+def parse_loss(text):
+    """'1%' / '0.5' → パーセント"""
+    return float(str(text).strip().rstrip('%'))
+
+
+@dataclass
+class Shaping:
+    """htbの帯域（ビット/秒）、netemの遅延・ジッター（マイクロ秒）、損失率・並べ替え率（%）"""
+    rate_bps: int
+    delay_us: float
+    loss_pct: float
+    jitter_us: float = 0.0
+    reorder_pct: float = 0.0
+
+    def matches(self, other):
+        # 帯域はカーネル内でバイト/秒、遅延はtick、確率はu32で保持されるため丸め分を許容する
+        return (abs(self.rate_bps - other.rate_bps) <= 8
+                and abs(self.delay_us - other.delay_us) <= 1
+                and abs(self.jitter_us - other.jitter_us) <= 1
+                and abs(self.loss_pct - other.loss_pct) <= 1e-3
+                and abs(self.reorder_pct - other.reorder_pct) <= 1e-3)
+
+
+class NetlinkBackend:
+    """pyroute2 でプロセス内から netlink を直接使う"""
+    name = 'netlink'
+
+    def __init__(self, dev, netns=None):
+        # flags=0: 存在しない名前空間を作らない（netns は名前または /proc/<pid>/ns/net）
+        self.ipr = IPRoute(netns=netns, flags=0) if netns else IPRoute()
+        links = self.ipr.link_lookup(ifname=dev)
+        if not links:
+            self.ipr.close()
+            raise ShapingError(f"device not found: {dev}")
+        self.index = links[0]
+
+    def read(self):
+        netem = next((q for q in self.ipr.get_qdiscs(self.index)
+                      if q['handle'] == NETEM and q.get_attr('TCA_KIND') == 'netem'), None)
+        htb = next((c for c in self.ipr.get_classes(self.index)
+                    if c['handle'] == HTB_CLASS and c.get_attr('TCA_KIND') == 'htb'), None)
+        if netem is None or htb is None:
+            return None
+        netem_opts = netem.get_attr('TCA_OPTIONS')
+        htb_opts = htb.get_attr('TCA_OPTIONS')
+        rate = htb_opts.get_attr('TCA_HTB_RATE64') or htb_opts.get_attr('TCA_HTB_PARMS')['rate']
+        reorder = netem_opts.get_attr('TCA_NETEM_REORDER')
+        return Shaping(rate * 8, netem_opts['delay'] / tick_in_usec, netem_opts['loss'] * 100 / U32_MAX,
+                       netem_opts['jitter'] / tick_in_usec,
+                       reorder['prob_reorder'] * 100 / U32_MAX if reorder else 0.0)
+
+    def _netem_options(self, shaping):
+        """netem の TCA_OPTIONS（並べ替えが0でも TCA_NETEM_REORDER を付ける）
+
+        属性が無いとカーネルは直前の並べ替え率を残す（読み戻しにも残る）が、pyroute2 の netem
+        プラグインは prob_reorder=0 の属性を省くため、ipr.tc ではなくメッセージを組み立てて送る。
+        """
+        opts = netem_parameters({'delay': shaping.delay_us, 'jitter': shaping.jitter_us, 'loss': shaping.loss_pct,
+                                 'prob_reorder': shaping.reorder_pct})
+        if not any(name == 'TCA_NETEM_REORDER' for name, _ in opts['attrs']):
+            opts['attrs'].append(['TCA_NETEM_REORDER', {'prob_reorder': 0, 'corr_reorder': 0}])
+        return opts
+
+    def _netem(self, shaping, flags=0):
+        msg = tcmsg()
+        msg['index'] = self.index
+        msg['handle'] = NETEM
+        msg['parent'] = HTB_CLASS
+        msg['attrs'] = [['TCA_KIND', 'netem'], ['TCA_OPTIONS', self._netem_options(shaping)]]
+        self.ipr.nlm_request(msg, RTM_NEWQDISC, NLM_F_REQUEST | NLM_F_ACK | flags)
+
+    def build(self, shaping):
+        try:
+            self.ipr.tc('del', index=self.index, handle=0, parent=TC_H_ROOT)
+        except NetlinkError:
+            pass
+        self.ipr.tc('add', 'htb', self.index, HTB_ROOT, default=0x10)
+        self.ipr.tc('add-class', 'htb', self.index, HTB_CLASS, parent=HTB_ROOT, rate=f"{shaping.rate_bps}bit")
+        self._netem(shaping, NLM_F_CREATE | NLM_F_EXCL)
+
+    def change(self, shaping):
+        self.ipr.tc('change-class', 'htb', self.index, HTB_CLASS, parent=HTB_ROOT, rate=f"{shaping.rate_bps}bit")
+        self._netem(shaping)
+
+    def close(self):
+        self.ipr.close()
+
+
+class TcBackend:
+    """tc コマンドを実行する（prefix で ip netns exec / docker exec 経由にする）"""
+    name = 'tc'
+
+    def __init__(self, dev, prefix=()):
+        self.dev = dev
+        self.prefix = list(prefix)
+
+    def _tc(self, *args, check=True):
+        proc = subprocess.run([*self.prefix, 'tc', *args], capture_output=True, text=True)
+        if check and proc.returncode != 0:
+            raise ShapingError(f"tc {' '.join(args)}: {proc.stderr.strip()}")
+        return proc.stdout
+
+    def read(self):
+        # tc -j は iproute2 のバージョンによってhtbクラスに対応しないため通常の出力を解析する
+        netem = re.search(r'^qdisc netem 10: parent 1:10 .*$', self._tc('qdisc', 'show', 'dev', self.dev), re.M)
+        rate = re.search(r'\brate (\S+)', self._tc('class', 'show', 'dev', self.dev, 'classid', '1:10'))
+        if netem is None or rate is None:
+            return None
+        # 0の遅延・損失・並べ替えは表示されない（ジッターは遅延の直後に表示される）
+        delay = re.search(r'\bdelay (\S+)(?:\s+([\d.]+(?:s|ms|us)))?', netem.group(0))
+        loss = re.search(r'\bloss (\S+)%', netem.group(0))
+        reorder = re.search(r'\breorder (\S+)%', netem.group(0))
+        return Shaping(parse_rate(rate.group(1)), parse_time(delay.group(1)) if delay else 0.0,
+                       parse_loss(loss.group(1)) if loss else 0.0,
+                       parse_time(delay.group(2)) if delay and delay.group(2) else 0.0,
+                       parse_loss(reorder.group(1)) if reorder else 0.0)
+
+    def _netem_args(self, shaping):
+        # 並べ替えは0でも指定する（省くとカーネルは直前の並べ替え率を残す）
+        return ['netem', 'delay', f"{shaping.delay_us:g}us", f"{shaping.jitter_us:g}us", 'loss', f"{shaping.loss_pct:g}%",
+                'reorder', f"{shaping.reorder_pct:g}%"]
+
+    def build(self, shaping):
+        self._tc('qdisc', 'del', 'dev', self.dev, 'root', check=False)
+        self._tc('qdisc', 'add', 'dev', self.dev, 'root', 'handle', '1:', 'htb', 'default', '10')
+        self._tc('class', 'add', 'dev', self.dev, 'parent', '1:', 'classid', '1:10',
+                 'htb', 'rate', f"{shaping.rate_bps}bit")
+        self._tc('qdisc', 'add', 'dev', self.dev, 'parent', '1:10', 'handle', '10:', *self._netem_args(shaping))
+
+    def change(self, shaping):
+        self._tc('class', 'change', 'dev', self.dev, 'parent', '1:', 'classid', '1:10',
+                 'htb', 'rate', f"{shaping.rate_bps}bit")
+        self._tc('qdisc', 'change', 'dev', self.dev, 'parent', '1:10', 'handle', '10:', *self._netem_args(shaping))
+
+    def close(self):
+        pass
+
+
+class Shaper:
+    def __init__(self, backend):
+        self.backend = backend
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    def apply(self, bandwidth, delay_ms, loss='0%', jitter_ms=0, reorder='0%'):
+        """帯域・遅延・損失（・ジッター・並べ替え）を設定し、読み戻した値を辞書で返す（一致しなければ ShapingError）
+
+        netem は遅延0では並べ替えられない（tc は拒否し、netlink は受け付けても並べ替えない）ため、
+        どちらのバックエンドでも ShapingError にする。
+        """
+        target = Shaping(parse_rate(bandwidth), delay_ms * 1000, parse_loss(loss), jitter_ms * 1000, parse_loss(reorder))
+        if target.reorder_pct and not target.delay_us:
+            raise ShapingError(f"{self.name}: reordering needs a non-zero delay")
+        start = time.perf_counter()
+        try:
+            if self.backend.read() is None:
+                # 初回（または木が別の構成）のみ作り直す
+                self.backend.build(target)
+            else:
+                self.backend.change(target)
+            applied = self.backend.read()
+        except (OSError, ValueError, NetlinkError) as e:
+            raise ShapingError(f"{self.name}: {e}") from e
+        if applied is None or not applied.matches(target):
+            raise ShapingError(f"{self.name}: applied {applied} does not match requested {target}")
+        return {
+            'backend': self.name,
+            'rate_bps': applied.rate_bps,
+            'delay_ms': applied.delay_us / 1000,
+            'loss': applied.loss_pct,
+            'jitter_ms': applied.jitter_us / 1000,
+            'reorder': applied.reorder_pct,
+            'apply_ms': (time.perf_counter() - start) * 1000,
+        }
+
+    def close(self):
+        self.backend.close()
+
+
+def container_pid(container):
+    proc = subprocess.run(['docker', 'inspect', '-f', '{{.State.Pid}}', container], capture_output=True, text=True)
+    return int(proc.stdout.strip()) if proc.returncode == 0 and proc.stdout.strip().isdigit() else None
+
+
+def open_shaper(dev, netns=None, container=None):
+    """使える方法でShaperを作る（netns: ネットワーク名前空間名, container: Dockerコンテナ名）"""
+    target = netns
+    if container is not None:
+        pid = container_pid(container)
+        target = f"/proc/{pid}/ns/net" if pid else None
+    if IPRoute is not None and (container is None or target is not None):
+        try:
+            return Shaper(NetlinkBackend(dev, target))
+        except (OSError, NetlinkError, ShapingError) as e:
+            print(f"netlinkでtcを設定できないためtcコマンドを使用します: {e}", file=sys.stderr)
+
+    if container is not None:
+        prefix = ['docker', 'exec', container]
+    elif netns is not None:
+        prefix = ['ip', 'netns', 'exec', netns]
+    else:
+        prefix = []
+    return Shaper(TcBackend(dev, prefix))
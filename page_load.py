@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+ブラウザ風のページ読み込みワークロードの再生
+JSONで記述したページ（オブジェクトのサイズ・優先度・依存関係）を、1本の接続上で
+依存関係を満たしたものから並行に取得し、ページ全体の読み込み完了までの時間を計測する
+
+ワークロード形式（workloads/sample_page.json 参照）:
+    {"name": "...", "objects": [
+        {"id": "index.html", "size": 45000, "priority": 0},
+        {"id": "main.css", "size": 60000, "priority": 1, "depends_on": ["index.html"]}, ...]}
+
+- path を省略したオブジェクトはサーバーの /bytes/<size> から取得する
+- priority は RFC 9218 の urgency（0が最優先）として priority ヘッダーで送る
+- 同時に取得可能になったオブジェクトは priority 順に発行する
+- 計時は接続確立前から開始する（ページ読み込み時間には接続・ハンドシェイクを含む）
+
+CSVは1行 = 1オブジェクトで、page_load_time 列はそのページ全体の読み込み時間
+（scripts/generate_analysis_report.py はこれをページ単位に集約して分析する）
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+from benchmark_csv import PAGELOAD_CSV_FIELDS, open_result_csv
+from http3_client import HTTP3Client, REQUEST_TIMEOUT_SEC
+
+PROTOCOLS = ('h2', 'h3')
+PROTOCOL_LABELS = {'h2': 'HTTP/2', 'h3': 'HTTP/3'}
+
+# priority を省略したオブジェクトの urgency（RFC 9218 の既定値）
+DEFAULT_PRIORITY = 3
+
+
+def load_workload(path):
+    """ワークロードを読み込み、依存関係を検証して各オブジェクトに path と wave（依存の深さ）を補う"""
+    with open(path) as f:
+        workload = json.load(f)
+
+    objects = workload.get('objects') or []
+    if not objects:
+        raise ValueError(f"{path}: objects が空です")
+
+    by_id = {}
+    for obj in objects:
+        if obj['id'] in by_id:
+            raise ValueError(f"{path}: id が重複しています: {obj['id']}")
+        by_id[obj['id']] = obj
+        obj.setdefault('priority', DEFAULT_PRIORITY)
+        obj.setdefault('depends_on', [])
+        obj.setdefault('path', f"/bytes/{obj['size']}")
+
+    for obj in objects:
+        for dep in obj['depends_on']:
+            if dep not in by_id:
+                raise ValueError(f"{path}: {obj['id']} の依存先が存在しません: {dep}")
+
+    # wave = 依存の深さ（循環していれば検出する）
+    def wave(obj, visiting):
+        if 'wave' not in obj:
+            if obj['id'] in visiting:
+                raise ValueError(f"{path}: 依存関係が循環しています: {obj['id']}")
+            visiting.add(obj['id'])
+            obj['wave'] = max((wave(by_id[dep], visiting) + 1 for dep in obj['depends_on']), default=0)
+            visiting.discard(obj['id'])
+        return obj['wave']
+
+    for obj in objects:
+        wave(obj, set())
+
+    workload.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return workload
+
+
+async def replay(workload, fetch, start):
+    """依存関係に従ってオブジェクトを取得し、オブジェクトごとの結果を返す
+
+    fetch(obj) は {'status', 'bytes'} を返すコルーチン。start は計時の基準（perf_counter）。
+    依存先が失敗したオブジェクトは取得せず失敗として記録する。
+    """
+    tasks = {}
+
+    async def load(obj):
+        deps = await asyncio.gather(*(tasks[dep] for dep in obj['depends_on']))
+        result = {'id': obj['id'], 'start': None, 'end': None, 'bytes': 0, 'success': False}
+        if not all(dep['success'] for dep in deps):
+            return result
+
+        result['start'] = time.perf_counter() - start
+        try:
+            response = await asyncio.wait_for(fetch(obj), timeout=REQUEST_TIMEOUT_SEC)
+            result['bytes'] = response['bytes']
+            result['success'] = response['status'] == 200 and response['bytes'] == obj['size']
+        except Exception as e:
+            print(f"{obj['id']} の取得に失敗しました: {e}", file=sys.stderr)
+        result['end'] = time.perf_counter() - start
+        return result
+
+    # 同時に取得可能になったものは作成順（wave, priority 順）に発行される
+    for obj in sorted(workload['objects'], key=lambda o: (o['wave'], o['priority'])):
+        tasks[obj['id']] = asyncio.ensure_future(load(obj))
+    return await asyncio.gather(*tasks.values())
+
+
+class H3PageLoader:
+    """HTTP3Client の保持接続上でオブジェクトを取得する"""
+
+    http_version = '3'
+
+    def __init__(self, base_url):
+        self.client = HTTP3Client(base_url, mode='keepalive')
+        self._protocol = None
+
+    async def open(self):
+        self._protocol = await self.client.open()
+
+    async def close(self):
+        await self.client.close()
+
+    async def fetch(self, obj):
+        headers = [(b'priority', f"u={obj['priority']}".encode())]
+        return await self._protocol.get(self.client.authority, obj['path'], headers)
+
+
+class H2PageLoader:
+    """httpx の単一HTTP/2接続上でオブジェクトを取得する（接続は最初のリクエストで確立）"""
+
+    http_version = '2'
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.client = None
+
+    async def open(self):
+        # max_connections=1 で全オブジェクトを同一接続に多重化させる
+        self.client = httpx.AsyncClient(http2=True, verify=False, limits=httpx.Limits(max_connections=1),
+                                        timeout=REQUEST_TIMEOUT_SEC)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+
+    async def fetch(self, obj):
+        headers = {'priority': f"u={obj['priority']}"}
+        async with self.client.stream('GET', self.base_url + obj['path'], headers=headers) as response:
+            size = 0
+            async for chunk in response.aiter_raw():
+                size += len(chunk)
+            self.http_version = response.http_version.replace('HTTP/', '')
+            return {'status': response.status_code, 'bytes': size}
+
+
+LOADERS = {'h2': H2PageLoader, 'h3': H3PageLoader}
+
+
+async def load_page(workload, protocol, base_url):
+    """新しい接続でページを1回読み込み、ページ読み込み時間とオブジェクトごとの結果を返す"""
+    loader = LOADERS[protocol](base_url)
+    start = time.perf_counter()
+    try:
+        await loader.open()
+        objects = await replay(workload, loader.fetch, start)
+        page_load_time = time.perf_counter() - start
+    except Exception as e:
+        print(f"{PROTOCOL_LABELS[protocol]} page load failed: {e}", file=sys.stderr)
+        objects, page_load_time = [], None
+    finally:
+        await loader.close()
+
+    success = bool(objects) and all(obj['success'] for obj in objects)
+    return {
+        'workload': workload['name'],
+        'protocol': PROTOCOL_LABELS[protocol],
+        'http_version': loader.http_version,
+        'page_load_time': page_load_time if success else None,
+        'success': success,
+        'objects': objects,
+    }
+
+
+async def run_batch(workload, protocol, base_url, iterations, warmup, latency_label, csv_path,
+                    sleep_between=0.1):
+    """ページ読み込みをiterations回実行し、1オブジェクト1行でCSVに追記する。成功回数を返す"""
+    success_count = 0
+    by_id = {obj['id']: obj for obj in workload['objects']}
+    f, writer = open_result_csv(csv_path, PAGELOAD_CSV_FIELDS)
+
+    with f:
+        for i in range(1, iterations + 1):
+            result = await load_page(workload, protocol, base_url)
+
+            if i > warmup:
+                base = {'timestamp': int(time.time()), 'protocol': result['protocol'], 'latency': latency_label,
+                        'iteration': i, 'workload': result['workload'], 'success': int(result['success']),
+                        'http_version': result['http_version'] if result['success'] else 'unknown',
+                        'page_load_time': (f"{result['page_load_time']:.6f}" if result['success'] else '')}
+                for obj in result['objects']:
+                    spec = by_id[obj['id']]
+                    writer.writerow(dict(base, object_id=obj['id'], wave=spec['wave'], priority=spec['priority'],
+                                         size=spec['size'], bytes=obj['bytes'],
+                                         start='' if obj['start'] is None else f"{obj['start']:.6f}",
+                                         end='' if obj['end'] is None else f"{obj['end']:.6f}"))
+                if not result['objects']:
+                    writer.writerow(dict(base, object_id='', wave='', priority='', size='', bytes='',
+                                         start='', end=''))
+                f.flush()
+                if result['success']:
+                    success_count += 1
+
+            if sleep_between > 0 and i < iterations:
+                await asyncio.sleep(sleep_between)
+
+    return success_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Browser-like page load replay over HTTP/2 or HTTP/3')
+    parser.add_argument('--workload', default='workloads/sample_page.json', help='ワークロードJSON')
+    parser.add_argument('--protocol', choices=PROTOCOLS, default='h3', help='使用するプロトコル')
+    parser.add_argument('--url', default='https://localhost:8443', help='サーバーのベースURL')
+    parser.add_argument('--iterations', type=int, help='反復回数（ウォームアップを含む）')
+    parser.add_argument('--warmup', type=int, default=0, help='記録しない先頭の回数')
+    parser.add_argument('--latency', default='0ms', help='CSVに記録する遅延ラベル')
+    parser.add_argument('--csv', help='追記先CSVファイル')
+    parser.add_argument('--sleep', type=float, default=0.1, help='反復間の待機時間（秒）')
+
+    args = parser.parse_args()
+    workload = load_workload(args.workload)
+
+    if args.iterations is not None:
+        if not args.csv:
+            parser.error('--iterations には --csv が必要です')
+        recorded = max(args.iterations - args.warmup, 0)
+        success = asyncio.run(run_batch(workload, args.protocol, args.url, args.iterations, args.warmup,
+                                        args.latency, args.csv, args.sleep))
+        print(f"{success}/{recorded}")
+        sys.exit(0 if success == recorded else 1)
+
+    result = asyncio.run(load_page(workload, args.protocol, args.url))
+    print(json.dumps(result))
+    sys.exit(0 if result['success'] else 1)
+
+
+if __name__ == "__main__":
+    main()
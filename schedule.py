@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+計測順序のランダム化（乱塊法）
+従来の順序（遅延の昇順、各遅延でHTTP/3を全反復 → HTTP/2を全反復）では、時間とともに変わる
+要因（熱によるクロック低下、バックグラウンド負荷、Dockerネットワークの状態）がプロトコル差や
+遅延の効果に系統的に混入する。randomized では
+
+  - 遅延条件の順序をシャッフルし、
+  - 各遅延で反復ごとに HTTP/3, HTTP/2 を1回ずつ計測する組（ブロック）を作り、組の中の順序を
+    ランダムにする
+
+ので、同じ (latency, iteration) の HTTP/2 と HTTP/3 は時間的に隣接した対応のある標本として扱える
+（scripts/generate_analysis_report.py の対応のある比較）。
+
+順序はすべて記録したシードから決まり、遅延条件ごとの乱数列は (シード, 遅延) から作るので、
+中断からの再開や netns_sweep.py の分割実行でも同じ順序が再現される。
+設定は <ログ>/schedule.json に保存する。
+"""
+
+import json
+import os
+import random
+
+SCHEDULES = ('sequential', 'randomized')
+SCHEDULE_NAME = 'schedule.json'
+
+
+class Schedule:
+    def __init__(self, kind='sequential', seed=None):
+        if kind not in SCHEDULES:
+            raise ValueError(f"unknown schedule: {kind}")
+        self.kind = kind
+        self.seed = seed if seed is not None else random.SystemRandom().randrange(2 ** 32)
+
+    @property
+    def paired(self):
+        return self.kind == 'randomized'
+
+    def shuffle(self, items, salt):
+        """条件の計測順（randomized ならシードと salt から決まる順序にシャッフルする）"""
+        items = list(items)
+        if self.paired:
+            random.Random(f"{self.seed}:{salt}").shuffle(items)
+        return items
+
+    def delays(self, delays):
+        """遅延条件の計測順"""
+        return self.shuffle(delays, 'delays')
+
+    def rng(self, latency_label):
+        """遅延条件ごとの乱数列（block に渡す）"""
+        return random.Random(f"{self.seed}:{latency_label}")
+
+    def block(self, rng, protocols):
+        """1組の中のプロトコルの計測順"""
+        protocols = list(protocols)
+        rng.shuffle(protocols)
+        return protocols
+
+    def save(self, directory):
+        with open(os.path.join(directory, SCHEDULE_NAME), 'w') as f:
+            json.dump({'schedule': self.kind, 'seed': self.seed}, f, indent=2)
+
+    @classmethod
+    def load(cls, directory):
+        """保存した設定を読む（無ければ None）"""
+        path = os.path.join(directory, SCHEDULE_NAME)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['schedule'], data['seed'])
@@ -6,9 +6,11 @@
 
 import pandas as pd
 import numpy as np
+import json
 import os
 import sys
 from datetime import datetime
+from scipy import stats
 
 def find_crossover_points(h2_means, h3_means, latencies):
     """HTTP/2とHTTP/3の優位逆転地点を特定"""
@@ -42,111 +44,232 @@ def find_crossover_points(h2_means, h3_means, latencies):
     
     return crossovers
 
-def generate_analysis_report(csv_file, output_dir):
-    """詳細分析レポートを生成"""
-    
-    # CSVファイルを読み込み
+def summarize_phases(df, latencies):
+    """フェーズ別タイミング列があれば、遅延ごとのハンドシェイク/転送の内訳行を返す"""
+    phase_columns = ['time_appconnect', 'time_starttransfer', 'time_lastbyte']
+    if any(c not in df.columns for c in phase_columns):
+        return []
+
+    df = df[df['success'] == 1].dropna(subset=phase_columns)
+    if len(df) == 0:
+        return []
+
+    lines = []
+    lines.append("【フェーズ別内訳】")
+    lines.append("-" * 80)
+    lines.append(f"{'遅延':<8} {'H2ハンドシェイク':<16} {'H3ハンドシェイク':<16} {'H2転送':<10} {'H3転送':<10} {'差の主因':<8}")
+    lines.append("-" * 80)
+
+    for lat in latencies:
+        row = {}
+        for protocol, key in [('HTTP/2', 'h2'), ('HTTP/3', 'h3')]:
+            subset = df[(df['protocol'] == protocol) & (df['latency'] == lat)]
+            # ハンドシェイク = 開始からハンドシェイク完了まで, 転送 = ヘッダー受信から最終バイトまで
+            row[f'{key}_handshake'] = subset['time_appconnect'].mean()
+            row[f'{key}_transfer'] = (subset['time_lastbyte'] - subset['time_starttransfer']).mean()
+
+        handshake_diff = abs(row['h2_handshake'] - row['h3_handshake'])
+        transfer_diff = abs(row['h2_transfer'] - row['h3_transfer'])
+        if np.isnan(handshake_diff) or np.isnan(transfer_diff):
+            cause = "-"
+        else:
+            cause = "ハンドシェイク" if handshake_diff > transfer_diff else "転送"
+
+        lines.append(f"{lat:<8} {row['h2_handshake']:<16.4f} {row['h3_handshake']:<16.4f} "
+                     f"{row['h2_transfer']:<10.4f} {row['h3_transfer']:<10.4f} {cause:<8}")
+
+    lines.append("")
+    return lines
+
+def is_paired_schedule(csv_file):
+    """CSVと同じディレクトリの schedule.json が組ごとの交互計測（randomized）かどうか"""
+    path = os.path.join(os.path.dirname(os.path.abspath(csv_file)), 'schedule.json')
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        return json.load(f).get('schedule') == 'randomized'
+
+def summarize_pairs(df, latencies):
+    """同じ (latency, iteration) のHTTP/2とHTTP/3を対応のある標本として、遅延ごとの差の行を返す"""
+    df = df[df['success'] == 1]
+    pairs = df.pivot_table(index=['latency', 'iteration'], columns='protocol', values='time_total').dropna()
+    if len(pairs) == 0 or not {'HTTP/2', 'HTTP/3'} <= set(pairs.columns):
+        return []
+
+    lines = []
+    lines.append("【対応のある比較（HTTP/2 − HTTP/3, 組ごとの交互計測）】")
+    lines.append("-" * 80)
+    lines.append(f"{'遅延':<8} {'組数':<6} {'平均差':<10} {'95%信頼区間':<22} {'p値':<10} {'判定':<8}")
+    lines.append("-" * 80)
+
+    significant = 0
+    for lat in latencies:
+        if lat not in pairs.index.get_level_values('latency'):
+            continue
+        diff = (pairs.loc[lat, 'HTTP/2'] - pairs.loc[lat, 'HTTP/3']).to_numpy()
+        if len(diff) < 2:
+            continue
+        mean = diff.mean()
+        half = stats.t.ppf(0.975, len(diff) - 1) * diff.std(ddof=1) / np.sqrt(len(diff))
+        p_value = stats.ttest_1samp(diff, 0).pvalue
+        if p_value < 0.05:
+            significant += 1
+            verdict = "HTTP/3" if mean > 0 else "HTTP/2"
+        else:
+            verdict = "有意差なし"
+        ci = f"[{mean - half:+.4f}, {mean + half:+.4f}]"
+        lines.append(f"{lat:<8} {len(diff):<6} {mean:<+10.4f} {ci:<22} {p_value:<10.4f} {verdict:<8}")
+
+    lines.append(f"有意差（p<0.05）のある遅延条件: {significant}/{len(latencies)}")
+    lines.append("")
+    return lines
+
+def summarize_payloads(df, latencies):
+    """複数のペイロードサイズがあれば、サイズ×遅延ごとの転送時間とグッドプットの行を返す"""
+    if 'payload_bytes' not in df.columns:
+        return []
+    df = df[df['success'] == 1].dropna(subset=['payload_bytes']).copy()
+    df['payload_bytes'] = df['payload_bytes'].astype(int)
+    sizes = sorted(df['payload_bytes'].unique())
+    if len(sizes) < 2:
+        return []
+    # グッドプット = ペイロード × 8 / 転送時間（Mbit/s, リクエストごとの値の平均）
+    df['goodput'] = df['payload_bytes'] * 8 / df['time_total'] / 1e6
+    means = df.groupby(['payload_bytes', 'latency', 'protocol'])[['time_total', 'goodput']].mean()
+
+    lines = []
+    lines.append("【ペイロードサイズ別（転送時間・グッドプット）】")
+    lines.append("-" * 80)
+    lines.append(f"{'サイズ':<12} {'遅延':<8} {'HTTP/2平均':<12} {'HTTP/3平均':<12} {'H2 Mbit/s':<11} {'H3 Mbit/s':<11} {'優位性':<8}")
+    lines.append("-" * 80)
+    for size in sizes:
+        h3_wins = compared = 0
+        for lat in latencies:
+            if (size, lat, 'HTTP/2') not in means.index or (size, lat, 'HTTP/3') not in means.index:
+                continue
+            h2 = means.loc[(size, lat, 'HTTP/2')]
+            h3 = means.loc[(size, lat, 'HTTP/3')]
+            compared += 1
+            if h3['time_total'] < h2['time_total']:
+                h3_wins += 1
+                advantage = "HTTP/3"
+            else:
+                advantage = "HTTP/2"
+            lines.append(f"{size:<12} {lat:<8} {h2['time_total']:<12.4f} {h3['time_total']:<12.4f} "
+                         f"{h2['goodput']:<11.2f} {h3['goodput']:<11.2f} {advantage:<8}")
+        if compared:
+            lines.append(f"{size}バイト: HTTP/3優位 {h3_wins}/{compared}遅延条件")
+        lines.append("")
+    return lines
+
+def load_results(csv_file):
+    """CSVを読み込む。ページ読み込みCSV（page_load.py）は1ページ1行に集約し、
+    page_load_time を time_total として扱う"""
     df = pd.read_csv(csv_file)
-    
-    # 遅延条件を動的に取得（数値でソート）
-    latencies_str = df['latency'].unique()
-    lat_values = [int(lat.replace('ms', '')) for lat in latencies_str]
-    
-    # 数値でソートしてインデックスを取得
-    sorted_indices = sorted(range(len(lat_values)), key=lambda i: lat_values[i])
-    latencies = [latencies_str[i] for i in sorted_indices]
-    lat_values = [lat_values[i] for i in sorted_indices]
-    
-    # プロトコル別データを準備
+    if 'page_load_time' in df.columns:
+        df = df.groupby(['protocol', 'latency', 'iteration', 'workload'], as_index=False).agg(
+            time_total=('page_load_time', 'first'),
+            success=('success', 'min'),
+        )
+    return df
+
+def sorted_latencies(df):
+    """遅延条件を数値でソートして (ラベル, ミリ秒) のリストで返す"""
+    latencies = sorted(df['latency'].unique(), key=lambda lat: int(lat.replace('ms', '')))
+    return latencies, [int(lat.replace('ms', '')) for lat in latencies]
+
+def payload_sizes(df):
+    """複数のペイロードサイズを計測したCSVならサイズのリスト、そうでなければ空のリストを返す"""
+    if 'payload_bytes' not in df.columns:
+        return []
+    sizes = sorted(int(size) for size in df['payload_bytes'].dropna().unique())
+    return sizes if len(sizes) > 1 else []
+
+def analyze_latencies(df, latencies, lat_values):
+    """遅延ごとのプロトコル別統計と優位逆転地点を求める"""
     h2_data = []
     h3_data = []
-    
+
     for lat in latencies:
         h2_subset = df[(df['protocol'] == 'HTTP/2') & (df['latency'] == lat)]['time_total']
         h3_subset = df[(df['protocol'] == 'HTTP/3') & (df['latency'] == lat)]['time_total']
-        
+
         h2_data.append({
             'latency': lat,
             'mean': h2_subset.mean(),
             'std': h2_subset.std(),
             'count': len(h2_subset)
         })
-        
+
         h3_data.append({
             'latency': lat,
             'mean': h3_subset.mean(),
             'std': h3_subset.std(),
             'count': len(h3_subset)
         })
-    
+
     # 優位逆転地点を特定
     h2_means = [d['mean'] for d in h2_data]
     h3_means = [d['mean'] for d in h3_data]
     crossovers = find_crossover_points(h2_means, h3_means, lat_values)
-    
-    # レポート生成
-    report_lines = []
-    report_lines.append("=" * 80)
-    report_lines.append("HTTP/2 vs HTTP/3 ベンチマーク詳細分析レポート")
-    report_lines.append("=" * 80)
-    report_lines.append(f"生成日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    report_lines.append(f"データファイル: {os.path.basename(csv_file)}")
-    report_lines.append(f"総遅延条件数: {len(latencies)}")
-    report_lines.append("")
-    
-    # サマリー統計
-    report_lines.append("【サマリー統計】")
-    report_lines.append("-" * 40)
-    
+    return h2_data, h3_data, crossovers
+
+def summary_lines(h2_data, h3_data, crossovers):
+    """サマリー統計と優位逆転地点の行を返す"""
+    lines = []
+    lines.append("【サマリー統計】")
+    lines.append("-" * 40)
+
     # 0msでの性能
     h2_0ms = h2_data[0]
     h3_0ms = h3_data[0]
-    report_lines.append(f"0ms遅延時:")
-    report_lines.append(f"  HTTP/2: 平均={h2_0ms['mean']:.3f}秒, 標準偏差={h2_0ms['std']:.4f}秒")
-    report_lines.append(f"  HTTP/3: 平均={h3_0ms['mean']:.3f}秒, 標準偏差={h3_0ms['std']:.4f}秒")
-    
+    lines.append(f"0ms遅延時:")
+    lines.append(f"  HTTP/2: 平均={h2_0ms['mean']:.3f}秒, 標準偏差={h2_0ms['std']:.4f}秒")
+    lines.append(f"  HTTP/3: 平均={h3_0ms['mean']:.3f}秒, 標準偏差={h3_0ms['std']:.4f}秒")
+
     # 150msでの性能
     h2_150ms = h2_data[-1]
     h3_150ms = h3_data[-1]
-    report_lines.append(f"150ms遅延時:")
-    report_lines.append(f"  HTTP/2: 平均={h2_150ms['mean']:.3f}秒, 標準偏差={h2_150ms['std']:.4f}秒")
-    report_lines.append(f"  HTTP/3: 平均={h3_150ms['mean']:.3f}秒, 標準偏差={h3_150ms['std']:.4f}秒")
-    
+    lines.append(f"150ms遅延時:")
+    lines.append(f"  HTTP/2: 平均={h2_150ms['mean']:.3f}秒, 標準偏差={h2_150ms['std']:.4f}秒")
+    lines.append(f"  HTTP/3: 平均={h3_150ms['mean']:.3f}秒, 標準偏差={h3_150ms['std']:.4f}秒")
+
     # 性能差の計算
     h2_improvement = ((h2_150ms['mean'] - h2_0ms['mean']) / h2_0ms['mean']) * 100
     h3_improvement = ((h3_150ms['mean'] - h3_0ms['mean']) / h3_0ms['mean']) * 100
-    
-    report_lines.append(f"遅延による性能劣化:")
-    report_lines.append(f"  HTTP/2: {h2_improvement:.1f}%")
-    report_lines.append(f"  HTTP/3: {h3_improvement:.1f}%")
-    report_lines.append("")
-    
+
+    lines.append(f"遅延による性能劣化:")
+    lines.append(f"  HTTP/2: {h2_improvement:.1f}%")
+    lines.append(f"  HTTP/3: {h3_improvement:.1f}%")
+    lines.append("")
+
     # 優位逆転地点
+    lines.append("【優位逆転地点】")
+    lines.append("-" * 40)
     if crossovers:
-        report_lines.append("【優位逆転地点】")
-        report_lines.append("-" * 40)
         for i, crossover in enumerate(crossovers, 1):
-            report_lines.append(f"逆転地点 {i}: {crossover['latency']:.1f}ms")
-            report_lines.append(f"  方向: {crossover['direction']}")
-            report_lines.append(f"  HTTP/2: {crossover['h2_time']:.3f}秒")
-            report_lines.append(f"  HTTP/3: {crossover['h3_time']:.3f}秒")
-            report_lines.append("")
+            lines.append(f"逆転地点 {i}: {crossover['latency']:.1f}ms")
+            lines.append(f"  方向: {crossover['direction']}")
+            lines.append(f"  HTTP/2: {crossover['h2_time']:.3f}秒")
+            lines.append(f"  HTTP/3: {crossover['h3_time']:.3f}秒")
+            lines.append("")
     else:
-        report_lines.append("【優位逆転地点】")
-        report_lines.append("-" * 40)
-        report_lines.append("優位逆転は発生していません")
-        report_lines.append("")
-    
-    # 詳細データテーブル
-    report_lines.append("【詳細データテーブル】")
-    report_lines.append("-" * 80)
-    report_lines.append(f"{'遅延':<8} {'HTTP/2平均':<12} {'HTTP/2標準偏差':<15} {'HTTP/3平均':<12} {'HTTP/3標準偏差':<15} {'優位性':<8}")
-    report_lines.append("-" * 80)
-    
+        lines.append("優位逆転は発生していません")
+        lines.append("")
+    return lines
+
+def table_lines(h2_data, h3_data, latencies):
+    """詳細データテーブルの行を返す"""
+    lines = []
+    lines.append("【詳細データテーブル】")
+    lines.append("-" * 80)
+    lines.append(f"{'遅延':<8} {'HTTP/2平均':<12} {'HTTP/2標準偏差':<15} {'HTTP/3平均':<12} {'HTTP/3標準偏差':<15} {'優位性':<8}")
+    lines.append("-" * 80)
+
     for i, lat in enumerate(latencies):
         h2 = h2_data[i]
         h3 = h3_data[i]
-        
+
         # 優位性の判定
         if h2['mean'] < h3['mean']:
             advantage = "HTTP/2"
@@ -154,97 +277,109 @@ def generate_analysis_report(csv_file, output_dir):
             advantage = "HTTP/3"
         else:
             advantage = "同等"
-        
-        report_lines.append(f"{lat:<8} {h2['mean']:<12.3f} {h2['std']:<15.4f} {h3['mean']:<12.3f} {h3['std']:<15.4f} {advantage:<8}")
-    
-    report_lines.append("")
-    
-    # 統計分析
-    report_lines.append("【統計分析】")
-    report_lines.append("-" * 40)
-    
+
+        lines.append(f"{lat:<8} {h2['mean']:<12.3f} {h2['std']:<15.4f} {h3['mean']:<12.3f} {h3['std']:<15.4f} {advantage:<8}")
+
+    lines.append("")
+    return lines
+
+def statistics_lines(h2_data, h3_data, latencies):
+    """統計分析（優位性の回数・平均性能差・平均標準偏差）の行を返す"""
+    lines = []
+    lines.append("【統計分析】")
+    lines.append("-" * 40)
+
     # 各遅延での優位性カウント
     h2_wins = sum(1 for i in range(len(latencies)) if h2_data[i]['mean'] < h3_data[i]['mean'])
     h3_wins = sum(1 for i in range(len(latencies)) if h3_data[i]['mean'] < h2_data[i]['mean'])
     ties = len(latencies) - h2_wins - h3_wins
-    
-    report_lines.append(f"HTTP/2優位: {h2_wins}回 ({h2_wins/len(latencies)*100:.1f}%)")
-    report_lines.append(f"HTTP/3優位: {h3_wins}回 ({h3_wins/len(latencies)*100:.1f}%)")
-    report_lines.append(f"同等: {ties}回 ({ties/len(latencies)*100:.1f}%)")
-    
+
+    lines.append(f"HTTP/2優位: {h2_wins}回 ({h2_wins/len(latencies)*100:.1f}%)")
+    lines.append(f"HTTP/3優位: {h3_wins}回 ({h3_wins/len(latencies)*100:.1f}%)")
+    lines.append(f"同等: {ties}回 ({ties/len(latencies)*100:.1f}%)")
+
     # 平均性能差
     avg_h2 = np.mean([d['mean'] for d in h2_data])
     avg_h3 = np.mean([d['mean'] for d in h3_data])
     avg_diff = ((avg_h2 - avg_h3) / avg_h3) * 100
-    
-    report_lines.append(f"平均性能差: {avg_diff:+.1f}% (HTTP/2基準)")
-    
+
+    lines.append(f"平均性能差: {avg_diff:+.1f}% (HTTP/2基準)")
+
     # 標準偏差の比較
     avg_h2_std = np.mean([d['std'] for d in h2_data])
     avg_h3_std = np.mean([d['std'] for d in h3_data])
+
+    lines.append(f"平均標準偏差:")
+    lines.append(f"  HTTP/2: {avg_h2_std:.4f}秒")
+    lines.append(f"  HTTP/3: {avg_h3_std:.4f}秒")
+    lines.append("")
+    return lines
+
+def generate_analysis_report(csv_file, output_dir):
+    """詳細分析レポートを生成"""
+    
+    # CSVファイルを読み込み
+    df = load_results(csv_file)
     
-    report_lines.append(f"平均標準偏差:")
-    report_lines.append(f"  HTTP/2: {avg_h2_std:.4f}秒")
-    report_lines.append(f"  HTTP/3: {avg_h3_std:.4f}秒")
+    # 遅延条件を動的に取得（数値でソート）
+    latencies, lat_values = sorted_latencies(df)
+
+    # 複数のペイロードサイズを計測した場合は、サイズを混ぜた平均では逆転地点に意味がないため
+    # 主要な表と優位逆転地点をサイズごとに求める
+    sizes = payload_sizes(df)
+    if sizes:
+        groups = [(f"ペイロード {size}バイト", df[df['payload_bytes'] == size]) for size in sizes]
+    else:
+        groups = [(None, df)]
+    paired = is_paired_schedule(csv_file)
+    
+    # レポート生成
+    header_lines = []
+    header_lines.append("=" * 80)
+    header_lines.append("HTTP/2 vs HTTP/3 ベンチマーク詳細分析レポート")
+    header_lines.append("=" * 80)
+    header_lines.append(f"生成日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    header_lines.append(f"データファイル: {os.path.basename(csv_file)}")
+    if 'workload' in df.columns:
+        header_lines.append(f"ワークロード: {', '.join(df['workload'].unique())}（ページ読み込み時間）")
+    header_lines.append(f"総遅延条件数: {len(latencies)}")
+    if sizes:
+        header_lines.append(f"ペイロードサイズ: {', '.join(f'{size}バイト' for size in sizes)}（以下の各表はサイズごと）")
+    header_lines.append("")
+
+    report_lines = list(header_lines)
+    console_lines = list(header_lines)
+    for title, subset in groups:
+        group_latencies, group_lat_values = sorted_latencies(subset)
+        h2_data, h3_data, crossovers = analyze_latencies(subset, group_latencies, group_lat_values)
+        title_lines = [f"■ {title}", "=" * 80] if title else []
+        summary = summary_lines(h2_data, h3_data, crossovers)
+        statistics = statistics_lines(h2_data, h3_data, group_latencies)
+        # フェーズ別内訳（列がある場合のみ）
+        phase_lines = summarize_phases(subset, group_latencies)
+        # 対応のある比較（schedule.py の randomized で計測した場合のみ）
+        pair_lines = summarize_pairs(subset, group_latencies) if paired else []
+
+        report_lines += (title_lines + summary + table_lines(h2_data, h3_data, group_latencies) + statistics
+                         + phase_lines + pair_lines)
+        # コンソールには詳細データテーブルを表示しない
+        console_lines += title_lines + summary + statistics + phase_lines + pair_lines
+
+    # ペイロードサイズ別の転送時間とグッドプット（docker_benchmark.py --payloads で複数のサイズを計測した場合のみ）
+    payload_lines = summarize_payloads(df, latencies)
+    report_lines += payload_lines
+    console_lines += payload_lines
     
     # レポートをファイルに保存
     report_content = "\n".join(report_lines)
     report_file = os.path.join(output_dir, "detailed_analysis_report.txt")
-    
     with open(report_file, 'w', encoding='utf-8') as f:
         f.write(report_content)
     
     print(f"詳細分析レポートを保存しました: {report_file}")
     
     # コンソールにも表示
-    print("\n" + "=" * 80)
-    print("HTTP/2 vs HTTP/3 ベンチマーク詳細分析レポート")
-    print("=" * 80)
-    print(f"生成日時: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"データファイル: {os.path.basename(csv_file)}")
-    print(f"総遅延条件数: {len(latencies)}")
-    print("")
-    
-    # サマリー統計
-    print("【サマリー統計】")
-    print("-" * 40)
-    print(f"0ms遅延時:")
-    print(f"  HTTP/2: 平均={h2_0ms['mean']:.3f}秒, 標準偏差={h2_0ms['std']:.4f}秒")
-    print(f"  HTTP/3: 平均={h3_0ms['mean']:.3f}秒, 標準偏差={h3_0ms['std']:.4f}秒")
-    print(f"150ms遅延時:")
-    print(f"  HTTP/2: 平均={h2_150ms['mean']:.3f}秒, 標準偏差={h2_150ms['std']:.4f}秒")
-    print(f"  HTTP/3: 平均={h3_150ms['mean']:.3f}秒, 標準偏差={h3_150ms['std']:.4f}秒")
-    print(f"遅延による性能劣化:")
-    print(f"  HTTP/2: {h2_improvement:.1f}%")
-    print(f"  HTTP/3: {h3_improvement:.1f}%")
-    print("")
-    
-    # 優位逆転地点
-    if crossovers:
-        print("【優位逆転地点】")
-        print("-" * 40)
-        for i, crossover in enumerate(crossovers, 1):
-            print(f"逆転地点 {i}: {crossover['latency']:.1f}ms")
-            print(f"  方向: {crossover['direction']}")
-            print(f"  HTTP/2: {crossover['h2_time']:.3f}秒")
-            print(f"  HTTP/3: {crossover['h3_time']:.3f}秒")
-            print("")
-    else:
-        print("【優位逆転地点】")
-        print("-" * 40)
-        print("優位逆転は発生していません")
-        print("")
-    
-    # 統計分析
-    print("【統計分析】")
-    print("-" * 40)
-    print(f"HTTP/2優位: {h2_wins}回 ({h2_wins/len(latencies)*100:.1f}%)")
-    print(f"HTTP/3優位: {h3_wins}回 ({h3_wins/len(latencies)*100:.1f}%)")
-    print(f"同等: {ties}回 ({ties/len(latencies)*100:.1f}%)")
-    print(f"平均性能差: {avg_diff:+.1f}% (HTTP/2基準)")
-    print(f"平均標準偏差:")
-    print(f"  HTTP/2: {avg_h2_std:.4f}秒")
-    print(f"  HTTP/3: {avg_h3_std:.4f}秒")
+    print("\n" + "\n".join(console_lines))
 
 if __name__ == "__main__":
     # 環境変数からファイルパスを取得
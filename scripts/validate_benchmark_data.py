@@ -3,9 +3,9 @@
 ベンチマークデータの検証スクリプト
 
 実測的なデータが得られているか確認:
-1. 転送サイズが約1MB（1024 KB）か
-2. 転送時間が妥当か（1-3秒程度）
-3. 転送速度が現実的か（300-800 kbps）
+1. 転送サイズが要求したサイズ（payload_bytes 列, 無ければ1MB = 1024 KB）か
+2. 転送時間が妥当か（1-3秒程度, 1MBの行のみ）
+3. 転送速度が現実的か（300-800 kbps, 1MBの行のみ）
 """
 
 import pandas as pd
@@ -13,6 +13,11 @@ import sys
 import os
 from pathlib import Path
 
+# payload_bytes 列がないCSV（/1mb のみ）の要求サイズ
+EXPECTED_BYTES = 1048576
+# 転送量と要求サイズの許容誤差（相対）
+SIZE_TOLERANCE = 0.1
+
 def validate_benchmark_data(csv_file):
     """ベンチマークデータの妥当性を検証"""
     
@@ -37,89 +42,99 @@ def validate_benchmark_data(csv_file):
         print("❌ 成功したレコードがありません！")
         return False
     
-    # 転送サイズの計算
+    # 転送サイズの計算（speed_kbps = バイト数 * 8 / (秒 * 1000)）
     print(f"\n【転送サイズ検証】")
-    df_success['transferred_kb'] = df_success['time_total'] * df_success['speed_kbps']
-    
-    avg_transferred = df_success['transferred_kb'].mean()
-    min_transferred = df_success['transferred_kb'].min()
-    max_transferred = df_success['transferred_kb'].max()
-    std_transferred = df_success['transferred_kb'].std()
-    
-    print(f"平均転送量: {avg_transferred:.2f} KB")
-    print(f"最小転送量: {min_transferred:.2f} KB")
-    print(f"最大転送量: {max_transferred:.2f} KB")
-    print(f"標準偏差:   {std_transferred:.2f} KB")
-    
-    # 1MB (1024 KB) 付近かチェック
-    expected_kb = 1024
-    tolerance = 100  # ±100 KBの許容範囲
-    
-    if abs(avg_transferred - expected_kb) < tolerance:
-        print(f"✅ 転送サイズが妥当（1024 KB 付近）")
-        size_ok = True
+    df_success = df_success.copy()
+    df_success['transferred_kb'] = df_success['time_total'] * df_success['speed_kbps'] * 1000 / 8 / 1024
+    if 'payload_bytes' in df_success.columns:
+        df_success['payload_bytes'] = df_success['payload_bytes'].fillna(EXPECTED_BYTES).astype(int)
     else:
-        print(f"❌ 転送サイズが異常（期待値: ~1024 KB, 実値: {avg_transferred:.2f} KB）")
-        if avg_transferred < 50:
-            print("   → ファイルサイズが非常に小さい（転送が正常に行われていない可能性）")
-        size_ok = False
-    
-    # 通信時間の検証
-    print(f"\n【通信時間検証】")
-    avg_time = df_success['time_total'].mean()
-    min_time = df_success['time_total'].min()
-    max_time = df_success['time_total'].max()
-    std_time = df_success['time_total'].std()
-    
-    print(f"平均通信時間: {avg_time:.4f}秒")
-    print(f"最小通信時間: {min_time:.4f}秒")
-    print(f"最大通信時間: {max_time:.4f}秒")
-    print(f"標準偏差:     {std_time:.4f}秒")
-    
-    # 1MBなら1-3秒程度が妥当
-    if 0.5 < avg_time < 5:
-        print(f"✅ 通信時間が妥当（0.5-5秒の範囲内）")
-        time_ok = True
-    else:
-        print(f"❌ 通信時間が異常")
-        if avg_time < 0.1:
-            print("   → 転送が異常に高速（実際のデータ転送ではない可能性）")
-        time_ok = False
-    
-    # 転送速度の検証
-    print(f"\n【転送速度検証】")
-    avg_speed = df_success['speed_kbps'].mean()
-    min_speed = df_success['speed_kbps'].min()
-    max_speed = df_success['speed_kbps'].max()
-    
-    print(f"平均転送速度: {avg_speed:.2f} kbps")
-    print(f"最小転送速度: {min_speed:.2f} kbps")
-    print(f"最大転送速度: {max_speed:.2f} kbps")
-    
-    # 300-800 kbps 程度が妥当
-    if 50 < avg_speed < 2000:
-        print(f"✅ 転送速度が妥当（50-2000 kbps の範囲内）")
-        speed_ok = True
+        df_success['payload_bytes'] = EXPECTED_BYTES
+
+    # 要求したサイズごとに、実際の転送量が ±SIZE_TOLERANCE に収まっているか
+    size_ok = True
+    for payload, group in df_success.groupby('payload_bytes'):
+        expected_kb = payload / 1024
+        transferred = group['transferred_kb']
+        deviation = (transferred - expected_kb).abs() / expected_kb
+        bad = int((deviation > SIZE_TOLERANCE).sum())
+        print(f"要求サイズ {expected_kb:.2f} KB ({len(group)}件): 平均転送量 {transferred.mean():.2f} KB, "
+              f"最小 {transferred.min():.2f} KB, 最大 {transferred.max():.2f} KB")
+        if bad == 0:
+            print(f"✅ 転送サイズが妥当（要求サイズの±{SIZE_TOLERANCE:.0%}以内）")
+        else:
+            print(f"❌ 転送サイズが異常な行: {bad}件（期待値: ~{expected_kb:.2f} KB）")
+            if transferred.mean() < expected_kb * 0.05:
+                print("   → ファイルサイズが非常に小さい（転送が正常に行われていない可能性）")
+            size_ok = False
+
+    # 以降の時間・速度の目安は1MB転送のもの（他のサイズは転送サイズのみ検証する）
+    other_sizes = sorted(set(df_success['payload_bytes']) - {EXPECTED_BYTES})
+    if other_sizes:
+        print(f"※ 通信時間・転送速度は1MBの行のみ検証します（対象外のサイズ: {', '.join(f'{n}B' for n in other_sizes)}）")
+    df_all = df_success
+    df_success = df_success[df_success['payload_bytes'] == EXPECTED_BYTES]
+
+    time_ok = speed_ok = True
+    if len(df_success) == 0:
+        print("1MBの行がないため通信時間・転送速度の検証をスキップします")
     else:
-        print(f"❌ 転送速度が異常")
-        if avg_speed < 5:
-            print("   → 転送速度が異常に遅い（通信が確立されていない可能性）")
-        speed_ok = False
+        # 通信時間の検証
+        print(f"\n【通信時間検証】")
+        avg_time = df_success['time_total'].mean()
+        min_time = df_success['time_total'].min()
+        max_time = df_success['time_total'].max()
+        std_time = df_success['time_total'].std()
+    
+        print(f"平均通信時間: {avg_time:.4f}秒")
+        print(f"最小通信時間: {min_time:.4f}秒")
+        print(f"最大通信時間: {max_time:.4f}秒")
+        print(f"標準偏差:     {std_time:.4f}秒")
+    
+        # 1MBなら1-3秒程度が妥当
+        if 0.5 < avg_time < 5:
+            print(f"✅ 通信時間が妥当（0.5-5秒の範囲内）")
+            time_ok = True
+        else:
+            print(f"❌ 通信時間が異常")
+            if avg_time < 0.1:
+                print("   → 転送が異常に高速（実際のデータ転送ではない可能性）")
+            time_ok = False
+    
+        # 転送速度の検証
+        print(f"\n【転送速度検証】")
+        avg_speed = df_success['speed_kbps'].mean()
+        min_speed = df_success['speed_kbps'].min()
+        max_speed = df_success['speed_kbps'].max()
+    
+        print(f"平均転送速度: {avg_speed:.2f} kbps")
+        print(f"最小転送速度: {min_speed:.2f} kbps")
+        print(f"最大転送速度: {max_speed:.2f} kbps")
+    
+        # 300-800 kbps 程度が妥当
+        if 50 < avg_speed < 2000:
+            print(f"✅ 転送速度が妥当（50-2000 kbps の範囲内）")
+            speed_ok = True
+        else:
+            print(f"❌ 転送速度が異常")
+            if avg_speed < 5:
+                print("   → 転送速度が異常に遅い（通信が確立されていない可能性）")
+            speed_ok = False
     
     # プロトコル確認
     print(f"\n【プロトコル検証】")
-    protocols = df_success['protocol'].unique()
+    protocols = df_all['protocol'].unique()
     print(f"検出されたプロトコル: {protocols}")
     
     for proto in protocols:
-        proto_data = df_success[df_success['protocol'] == proto]
+        proto_data = df_all[df_all['protocol'] == proto]
         if 'http_version' in proto_data.columns:
             versions = proto_data['http_version'].unique()
             print(f"  {proto}: {versions}")
     
     # 遅延条件の確認
     print(f"\n【遅延条件検証】")
-    latencies = sorted([int(lat.replace('ms', '')) for lat in df_success['latency'].unique()])
+    latencies = sorted([int(lat.replace('ms', '')) for lat in df_all['latency'].unique()])
     print(f"遅延条件数: {len(latencies)}")
     print(f"遅延範囲: {min(latencies)}ms - {max(latencies)}ms")
     if len(latencies) > 10:
@@ -149,7 +164,7 @@ def validate_benchmark_data(csv_file):
     else:
         print("⚠️  データに問題がある可能性があります:")
         if not size_ok:
-            print("   - 転送サイズが異常（1MB未満または非常に大きい）")
+            print("   - 転送サイズが異常（要求したサイズと一致しない）")
         if not time_ok:
             print("   - 通信時間が異常（0.1秒以下または5秒以上）")
         if not speed_ok:
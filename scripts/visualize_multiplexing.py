@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多重化ベンチマーク（1接続上のK本同時ストリーム）の可視化
+http3_client.py / http3_simple_client.py の --streams 出力CSV（1行 = 1ストリーム）を読み込み、
+バッチ全体の完了時間と、ストリーム間の完了時間のばらつき（ヘッドオブラインブロッキングの指標）を
+遅延・損失率ごとにプロットする
+"""
+
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+import matplotlib.font_manager as fm
+import os
+
+sns.set_style("whitegrid")
+
+plt.rcParams['font.family'] = 'sans-serif'
+if os.environ.get('FAST_PLOT') == '1':
+    plt.rcParams['font.sans-serif'] = ['Hiragino Sans', 'Yu Gothic', 'Meiryo', 'DejaVu Sans']
+else:
+    available_fonts = [f.name for f in fm.fontManager.ttflist]
+    japanese_fonts = ['Hiragino Sans', 'Hiragino Kaku Gothic Pro', 'Yu Gothic', 'Meiryo', 'MS Gothic', 'AppleGothic']
+    selected_font = None
+    for font in japanese_fonts:
+        if font in available_fonts:
+            selected_font = font
+            break
+    if selected_font:
+        plt.rcParams['font.sans-serif'] = [selected_font, 'DejaVu Sans']
+    else:
+        plt.rcParams['font.sans-serif'] = ['DejaVu Sans']
+
+plt.rcParams['axes.unicode_minus'] = False
+plt.rcParams['font.size'] = 10
+
+def visualize_multiplexing(csv_file, output_dir):
+    """バッチ完了時間とストリーム完了時間のばらつきを遅延・損失率ごとに可視化"""
+
+    df = pd.read_csv(csv_file)
+
+    if 'batch_time' not in df.columns or 'stream_time' not in df.columns:
+        print("多重化ベンチマークの列（batch_time, stream_time）がありません。スキップします")
+        return
+
+    df = df[df['success'] == 1].copy()
+    if len(df) == 0:
+        print("成功レコードがありません")
+        return
+
+    df['latency_ms'] = df['latency'].str.replace('ms', '').astype(int)
+    df['loss'] = df['loss'].astype(str)
+
+    # 1バッチ（プロトコル×条件×反復）ごとに集約
+    batches = df.groupby(['protocol', 'latency_ms', 'loss', 'streams', 'iteration']).agg(
+        batch_time=('batch_time', 'first'),
+        first_stream=('stream_time', 'min'),
+        last_stream=('stream_time', 'max'),
+    ).reset_index()
+    batches['stream_spread'] = batches['last_stream'] - batches['first_stream']
+
+    means = batches.groupby(['protocol', 'loss', 'streams', 'latency_ms']).mean(numeric_only=True).reset_index()
+
+    colors = {'HTTP/2': '#2E86AB', 'HTTP/3': '#A23B72'}
+    line_styles = ['-', '--', ':', '-.']
+    losses = sorted(means['loss'].unique(), key=lambda v: float(v.rstrip('%')))
+
+    fig, axes = plt.subplots(1, 2, figsize=(18, 7))
+    for (protocol, loss, streams), group in means.groupby(['protocol', 'loss', 'streams']):
+        style = line_styles[losses.index(loss) % len(line_styles)]
+        label = f"{protocol} 損失{loss} K={streams}"
+        color = colors.get(protocol)
+        axes[0].plot(group['latency_ms'], group['batch_time'], marker='o', linestyle=style,
+                     linewidth=2.5, markersize=7, color=color, label=label)
+        axes[1].plot(group['latency_ms'], group['stream_spread'], marker='o', linestyle=style,
+                     linewidth=2.5, markersize=7, color=color, label=label)
+
+    axes[0].set_title('バッチ全体の完了時間', fontsize=16, fontweight='bold')
+    axes[0].set_ylabel('平均完了時間 (秒)', fontsize=14, fontweight='bold')
+    axes[1].set_title('ストリーム完了時間のばらつき（最遅 − 最速）', fontsize=16, fontweight='bold')
+    axes[1].set_ylabel('平均ばらつき (秒)', fontsize=14, fontweight='bold')
+    for ax in axes:
+        ax.set_xlabel('遅延 (ms)', fontsize=14, fontweight='bold')
+        ax.grid(True, alpha=0.3, linewidth=1)
+        ax.legend(fontsize=11, loc='upper left', framealpha=0.9)
+        ax.set_ylim(bottom=0)
+
+    plt.tight_layout()
+    output_file = os.path.join(output_dir, 'multiplexing_comparison.png')
+    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    print(f"多重化比較グラフを保存しました: {output_file}")
+    plt.close()
+
+    print("\n=== 多重化ベンチマークサマリー ===")
+    for _, row in means.sort_values(['loss', 'streams', 'latency_ms', 'protocol']).iterrows():
+        print(f"{row['latency_ms']}ms 損失{row['loss']} K={row['streams']} {row['protocol']}: "
+              f"バッチ={row['batch_time']:.3f}秒, ばらつき={row['stream_spread'] * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    csv_file = os.environ.get('BENCHMARK_CSV')
+    output_dir = os.environ.get('BENCHMARK_OUTPUT_DIR')
+
+    if not csv_file or not output_dir:
+        print("エラー: BENCHMARK_CSV と BENCHMARK_OUTPUT_DIR 環境変数を設定してください")
+        print("例: BENCHMARK_CSV='logs/latest/multiplex_results.csv' BENCHMARK_OUTPUT_DIR='logs/latest' python3 scripts/visualize_multiplexing.py")
+        exit(1)
+
+    if not os.path.exists(csv_file):
+        print(f"CSVファイルが見つかりません: {csv_file}")
+        exit(1)
+
+    visualize_multiplexing(csv_file, output_dir)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ペイロードサイズ掃引の可視化
+docker_benchmark.py --payloads（または experiment.py の payload 次元）の結果CSVを読み込み、
+サイズ × 遅延ごとの平均転送時間（HTTP/2, HTTP/3, 比）のヒートマップと、
+サイズごとのグッドプット（ペイロード × 8 / 転送時間）の遅延依存性をプロットする。
+小さいオブジェクトはハンドシェイクと往復の回数で、大きいオブジェクトは輻輳制御と帯域で決まるため、
+1つのサイズで両方を代表させない。
+"""
+
+import pandas as pd
+import matplotlib.pyplot as plt
+import numpy as np
+import seaborn as sns
+import matplotlib.font_manager as fm
+import os
+
+sns.set_style("whitegrid")
+
+plt.rcParams['font.family'] = 'sans-serif'
+if os.environ.get('FAST_PLOT') == '1':
+    plt.rcParams['font.sans-serif'] = ['Hiragino Sans', 'Yu Gothic', 'Meiryo', 'DejaVu Sans']
+else:
+    available_fonts = [f.name for f in fm.fontManager.ttflist]
+    japanese_fonts = ['Hiragino Sans', 'Hiragino Kaku Gothic Pro', 'Yu Gothic', 'Meiryo', 'MS Gothic', 'AppleGothic']
+    selected_font = None
+    for font in japanese_fonts:
+        if font in available_fonts:
+            selected_font = font
+            break
+    if selected_font:
+        plt.rcParams['font.sans-serif'] = [selected_font, 'DejaVu Sans']
+    else:
+        plt.rcParams['font.sans-serif'] = ['DejaVu Sans']
+
+plt.rcParams['axes.unicode_minus'] = False
+plt.rcParams['font.size'] = 10
+
+def format_size(n):
+    """バイト数を 1KB / 1MB 形式で表す"""
+    for unit, scale in (('MB', 1024 ** 2), ('KB', 1024)):
+        if n >= scale:
+            return f"{n / scale:g}{unit}"
+    return f"{n}B"
+
+def payload_means(df):
+    """成功した行をプロトコル×サイズ×遅延ごとに平均する（グッドプットは Mbit/s）"""
+    df = df[df['success'] == 1].dropna(subset=['payload_bytes']).copy()
+    df['payload_bytes'] = df['payload_bytes'].astype(int)
+    df['latency_ms'] = df['latency'].str.replace('ms', '').astype(int)
+    df['goodput_mbps'] = df['payload_bytes'] * 8 / df['time_total'] / 1e6
+    return df.groupby(['protocol', 'payload_bytes', 'latency_ms'])[['time_total', 'goodput_mbps']].mean().reset_index()
+
+def visualize_payload_sweep(csv_file, output_dir):
+    """サイズ × 遅延の転送時間ヒートマップとグッドプットの曲線を保存"""
+
+    df = pd.read_csv(csv_file)
+
+    if 'payload_bytes' not in df.columns or df['payload_bytes'].nunique() < 2:
+        print("複数のペイロードサイズ（payload_bytes 列）がありません。スキップします")
+        return
+
+    means = payload_means(df)
+    if len(means) == 0:
+        print("成功レコードがありません")
+        return
+
+    # 転送時間のヒートマップ（行 = サイズ, 列 = 遅延）
+    tables = {protocol: means[means['protocol'] == protocol].pivot(
+        index='payload_bytes', columns='latency_ms', values='time_total') for protocol in ('HTTP/2', 'HTTP/3')}
+    panels = [(f'{protocol} 平均転送時間 (秒)', table, 'viridis', None) for protocol, table in tables.items()]
+    if all(len(t) for t in tables.values()):
+        ratio = tables['HTTP/3'] / tables['HTTP/2']
+        # 比 < 1 は HTTP/3 が速い（中央を1にした発散カラーマップ）
+        spread = max(abs(np.log2(ratio.min().min())), abs(np.log2(ratio.max().max())), 0.05)
+        panels.append(('転送時間の比 HTTP/3 / HTTP/2（<1 で HTTP/3 優位）', ratio, 'RdBu_r',
+                       (2 ** -spread, 2 ** spread)))
+
+    fig, axes = plt.subplots(1, len(panels), figsize=(7 * len(panels), 6), squeeze=False)
+    for ax, (title, table, cmap, limits) in zip(axes[0], panels):
+        if len(table) == 0:
+            ax.set_visible(False)
+            continue
+        vmin, vmax = limits if limits else (None, None)
+        sns.heatmap(table.sort_index(ascending=False), ax=ax, cmap=cmap, vmin=vmin, vmax=vmax,
+                    annot=table.size <= 80, fmt='.3f', cbar=True,
+                    yticklabels=[format_size(n) for n in table.sort_index(ascending=False).index])
+        ax.set_title(title, fontsize=14, fontweight='bold')
+        ax.set_xlabel('遅延 (ms)', fontsize=12, fontweight='bold')
+        ax.set_ylabel('ペイロード', fontsize=12, fontweight='bold')
+
+    plt.tight_layout()
+    output_file = os.path.join(output_dir, 'payload_time_heatmap.png')
+    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    print(f"ペイロード×遅延の転送時間ヒートマップを保存しました: {output_file}")
+    plt.close()
+
+    # グッドプット（サイズごとの線, 左 = HTTP/2, 右 = HTTP/3）
+    sizes = sorted(means['payload_bytes'].unique())
+    palette = sns.color_palette('viridis', len(sizes))
+    fig, axes = plt.subplots(1, 2, figsize=(18, 7), sharey=True)
+    for ax, protocol in zip(axes, ('HTTP/2', 'HTTP/3')):
+        for color, size in zip(palette, sizes):
+            group = means[(means['protocol'] == protocol) & (means['payload_bytes'] == size)]
+            ax.plot(group['latency_ms'], group['goodput_mbps'], marker='o', linewidth=2.5, markersize=6,
+                    color=color, label=format_size(size))
+        ax.set_title(f'{protocol} グッドプット', fontsize=16, fontweight='bold')
+        ax.set_xlabel('遅延 (ms)', fontsize=14, fontweight='bold')
+        ax.grid(True, alpha=0.3, linewidth=1)
+        ax.legend(title='ペイロード', fontsize=11, loc='upper right', framealpha=0.9)
+        ax.set_ylim(bottom=0)
+    axes[0].set_ylabel('平均グッドプット (Mbit/s)', fontsize=14, fontweight='bold')
+
+    plt.tight_layout()
+    output_file = os.path.join(output_dir, 'payload_goodput.png')
+    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    print(f"ペイロード別グッドプットのグラフを保存しました: {output_file}")
+    plt.close()
+
+if __name__ == "__main__":
+    csv_file = os.environ.get('BENCHMARK_CSV')
+    output_dir = os.environ.get('BENCHMARK_OUTPUT_DIR')
+
+    if not csv_file or not output_dir:
+        print("エラー: BENCHMARK_CSV と BENCHMARK_OUTPUT_DIR 環境変数を設定してください")
+        print("例: BENCHMARK_CSV='logs/latest/benchmark_results.csv' BENCHMARK_OUTPUT_DIR='logs/latest' python3 scripts/visualize_payload_sweep.py")
+        exit(1)
+
+    if not os.path.exists(csv_file):
+        print(f"CSVファイルが見つかりません: {csv_file}")
+        exit(1)
+
+    visualize_payload_sweep(csv_file, output_dir)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+フェーズ別タイミング（接続・ハンドシェイク・TTFB・転送）の可視化
+http3_client.py / http3_simple_client.py が出力する time_connect 等の列を使用し、
+高遅延時の差がハンドシェイク由来か転送由来かを遅延ごとに積み上げ表示する
+"""
+
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+import numpy as np
+import matplotlib.font_manager as fm
+import os
+
+sns.set_style("whitegrid")
+
+plt.rcParams['font.family'] = 'sans-serif'
+if os.environ.get('FAST_PLOT') == '1':
+    plt.rcParams['font.sans-serif'] = ['Hiragino Sans', 'Yu Gothic', 'Meiryo', 'DejaVu Sans']
+else:
+    available_fonts = [f.name for f in fm.fontManager.ttflist]
+    japanese_fonts = ['Hiragino Sans', 'Hiragino Kaku Gothic Pro', 'Yu Gothic', 'Meiryo', 'MS Gothic', 'AppleGothic']
+    selected_font = None
+    for font in japanese_fonts:
+        if font in available_fonts:
+            selected_font = font
+            break
+    if selected_font:
+        plt.rcParams['font.sans-serif'] = [selected_font, 'DejaVu Sans']
+    else:
+        plt.rcParams['font.sans-serif'] = ['DejaVu Sans']
+
+plt.rcParams['axes.unicode_minus'] = False
+plt.rcParams['font.size'] = 10
+
+PHASE_COLUMNS = ['time_connect', 'time_appconnect', 'time_starttransfer', 'time_lastbyte']
+
+# 累積タイムスタンプの差分として求めるフェーズ
+PHASES = [
+    ('接続', None, 'time_connect'),
+    ('ハンドシェイク', 'time_connect', 'time_appconnect'),
+    ('TTFB', 'time_appconnect', 'time_starttransfer'),
+    ('転送', 'time_starttransfer', 'time_lastbyte'),
+]
+PHASE_COLORS = ['#F18F01', '#C73E1D', '#6A994E', '#2E86AB']
+
+def visualize_phase_breakdown(csv_file, output_dir):
+    """遅延ごとのフェーズ別平均所要時間をプロトコル別に積み上げ表示"""
+
+    df = pd.read_csv(csv_file)
+
+    missing = [c for c in PHASE_COLUMNS if c not in df.columns]
+    if missing:
+        print(f"フェーズ別タイミング列がありません（{', '.join(missing)}）。スキップします")
+        return
+
+    df = df[df['success'] == 1].dropna(subset=PHASE_COLUMNS).copy()
+    if len(df) == 0:
+        print("フェーズ別タイミングを含む成功レコードがありません")
+        return
+
+    df['latency_ms'] = df['latency'].str.replace('ms', '').astype(int)
+    for name, begin, end in PHASES:
+        df[name] = df[end] - (df[begin] if begin else 0)
+
+    latencies = sorted(df['latency_ms'].unique())
+    protocols = [p for p in ['HTTP/2', 'HTTP/3'] if p in df['protocol'].unique()]
+
+    fig, axes = plt.subplots(1, len(protocols), figsize=(9 * len(protocols), 7), sharey=True, squeeze=False)
+    summary = {}
+
+    for ax, protocol in zip(axes[0], protocols):
+        data = df[df['protocol'] == protocol]
+        means = data.groupby('latency_ms')[[name for name, _, _ in PHASES]].mean().reindex(latencies)
+        summary[protocol] = means
+
+        ax.stackplot(latencies, *[means[name].values for name, _, _ in PHASES],
+                     labels=[name for name, _, _ in PHASES], colors=PHASE_COLORS, alpha=0.85)
+        ax.set_title(protocol, fontsize=16, fontweight='bold')
+        ax.set_xlabel('遅延 (ms)', fontsize=14, fontweight='bold')
+        ax.grid(True, alpha=0.3, linewidth=1)
+        ax.legend(fontsize=12, loc='upper left', framealpha=0.9)
+
+    axes[0][0].set_ylabel('平均所要時間 (秒)', fontsize=14, fontweight='bold')
+    fig.suptitle('フェーズ別所要時間の内訳', fontsize=18, fontweight='bold')
+
+    plt.tight_layout()
+    output_file = os.path.join(output_dir, 'phase_breakdown.png')
+    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    print(f"フェーズ別内訳グラフを保存しました: {output_file}")
+    plt.close()
+
+    print("\n=== フェーズ別平均所要時間 (ms) ===")
+    for protocol, means in summary.items():
+        print(f"\n{protocol}:")
+        for lat, row in means.iterrows():
+            phases = ", ".join(f"{name}={row[name] * 1000:.1f}" for name, _, _ in PHASES if not np.isnan(row[name]))
+            print(f"  {lat}ms: {phases}")
+
+if __name__ == "__main__":
+    csv_file = os.environ.get('BENCHMARK_CSV')
+    output_dir = os.environ.get('BENCHMARK_OUTPUT_DIR')
+
+    if not csv_file or not output_dir:
+        print("エラー: BENCHMARK_CSV と BENCHMARK_OUTPUT_DIR 環境変数を設定してください")
+        print("例: BENCHMARK_CSV='logs/latest/benchmark_results.csv' BENCHMARK_OUTPUT_DIR='logs/latest' python3 scripts/visualize_phase_breakdown.py")
+        exit(1)
+
+    if not os.path.exists(csv_file):
+        print(f"CSVファイルが見つかりません: {csv_file}")
+        exit(1)
+
+    visualize_phase_breakdown(csv_file, output_dir)
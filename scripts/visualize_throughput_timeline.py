@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+受信スループットの時系列（スロースタート・立ち上がり）の可視化
+http3_client.py / http3_simple_client.py の --timeline-dir が保存したサイドカーを読み込み、
+遅延ごとにHTTP/2とHTTP/3の平均スループット曲線と累積受信量を重ねて表示する
+（高遅延で1MB転送時間の差が開く原因が、立ち上がりの遅さか定常速度かを見分ける）
+"""
+
+import glob
+import os
+import sys
+
+import numpy as np
+import matplotlib.pyplot as plt
+import seaborn as sns
+import matplotlib.font_manager as fm
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from throughput_timeline import SUFFIX, ThroughputTimeline
+
+sns.set_style("whitegrid")
+
+plt.rcParams['font.family'] = 'sans-serif'
+if os.environ.get('FAST_PLOT') == '1':
+    plt.rcParams['font.sans-serif'] = ['Hiragino Sans', 'Yu Gothic', 'Meiryo', 'DejaVu Sans']
+else:
+    available_fonts = [f.name for f in fm.fontManager.ttflist]
+    japanese_fonts = ['Hiragino Sans', 'Hiragino Kaku Gothic Pro', 'Yu Gothic', 'Meiryo', 'MS Gothic', 'AppleGothic']
+    selected_font = None
+    for font in japanese_fonts:
+        if font in available_fonts:
+            selected_font = font
+            break
+    if selected_font:
+        plt.rcParams['font.sans-serif'] = [selected_font, 'DejaVu Sans']
+    else:
+        plt.rcParams['font.sans-serif'] = ['DejaVu Sans']
+
+plt.rcParams['axes.unicode_minus'] = False
+plt.rcParams['font.size'] = 10
+
+# 表示する遅延条件の上限（多い場合は等間隔に間引く）
+MAX_PANELS = 6
+
+def load_timelines(timeline_dir):
+    """サイドカーを (protocol, latency_ms) ごとに [(bin_sec, bins配列), ...] へまとめる"""
+    groups = {}
+    for path in sorted(glob.glob(os.path.join(timeline_dir, f'*{SUFFIX}'))):
+        try:
+            timeline, meta = ThroughputTimeline.read(path)
+        except (OSError, ValueError) as e:
+            print(f"読み込みに失敗しました: {path}: {e}")
+            continue
+        key = (meta['protocol'], int(str(meta['latency']).replace('ms', '')))
+        groups.setdefault(key, []).append((timeline.bin_sec, np.frombuffer(timeline.bins, dtype=np.uint64)))
+    return groups
+
+def mean_curve(samples):
+    """反復間で平均したビンごとの受信バイト数（長さを揃えるため末尾は0で埋める）"""
+    bin_sec = samples[0][0]
+    samples = [bins for width, bins in samples if width == bin_sec]
+    length = max(len(bins) for bins in samples)
+    stacked = np.zeros((len(samples), length))
+    for row, bins in zip(stacked, samples):
+        row[:len(bins)] = bins
+    return bin_sec, stacked.mean(axis=0)
+
+def visualize_throughput_timeline(timeline_dir, output_dir):
+    """遅延ごとのスループット曲線と累積受信量をプロトコル別に重ねて表示"""
+
+    groups = load_timelines(timeline_dir)
+    if not groups:
+        print(f"時系列サイドカーがありません: {timeline_dir}")
+        return
+
+    latencies = sorted({lat for _, lat in groups})
+    if len(latencies) > MAX_PANELS:
+        latencies = [latencies[int(i)] for i in np.linspace(0, len(latencies) - 1, MAX_PANELS)]
+
+    colors = {'HTTP/2': '#2E86AB', 'HTTP/3': '#A23B72'}
+    fig, axes = plt.subplots(len(latencies), 2, figsize=(18, 4.5 * len(latencies)), squeeze=False)
+    summary = []
+
+    for (ax_rate, ax_cum), lat in zip(axes, latencies):
+        for protocol in ['HTTP/2', 'HTTP/3']:
+            samples = groups.get((protocol, lat))
+            if not samples:
+                continue
+            bin_sec, curve = mean_curve(samples)
+            t_ms = np.arange(len(curve)) * bin_sec * 1000
+            cumulative = np.cumsum(curve)
+            label = f"{protocol} (n={len(samples)})"
+
+            ax_rate.plot(t_ms, curve * 8 / bin_sec / 1e6, linewidth=2, color=colors[protocol], label=label)
+            ax_cum.plot(t_ms, cumulative / 1e6, linewidth=2.5, color=colors[protocol], label=label)
+
+            # 総受信量の50%・100%に達した時刻
+            total = cumulative[-1]
+            t50 = t_ms[np.searchsorted(cumulative, total * 0.5)]
+            summary.append((lat, protocol, t50, t_ms[-1] + bin_sec * 1000, total))
+
+        ax_rate.set_title(f'{lat}ms: 受信スループット', fontsize=14, fontweight='bold')
+        ax_rate.set_ylabel('スループット (Mbps)', fontsize=12, fontweight='bold')
+        ax_cum.set_title(f'{lat}ms: 累積受信量', fontsize=14, fontweight='bold')
+        ax_cum.set_ylabel('累積受信量 (MB)', fontsize=12, fontweight='bold')
+        for ax in (ax_rate, ax_cum):
+            ax.set_xlabel('リクエスト開始からの時間 (ms)', fontsize=12, fontweight='bold')
+            ax.grid(True, alpha=0.3, linewidth=1)
+            ax.legend(fontsize=11, loc='upper left', framealpha=0.9)
+            ax.set_xlim(left=0)
+            ax.set_ylim(bottom=0)
+
+    plt.tight_layout()
+    output_file = os.path.join(output_dir, 'throughput_timeline.png')
+    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    print(f"スループット時系列グラフを保存しました: {output_file}")
+    plt.close()
+
+    print("\n=== 受信の立ち上がり（平均曲線） ===")
+    for lat, protocol, t50, t100, total in summary:
+        print(f"{lat}ms {protocol}: 50%到達={t50:.0f}ms, 完了={t100:.0f}ms, 平均受信量={total / 1e6:.2f}MB")
+
+if __name__ == "__main__":
+    output_dir = os.environ.get('BENCHMARK_OUTPUT_DIR')
+    timeline_dir = os.environ.get('BENCHMARK_TIMELINE_DIR') or (output_dir and os.path.join(output_dir, 'timelines'))
+
+    if not output_dir:
+        print("エラー: BENCHMARK_OUTPUT_DIR 環境変数を設定してください（時系列は BENCHMARK_TIMELINE_DIR、既定は <出力先>/timelines）")
+        print("例: BENCHMARK_OUTPUT_DIR='logs/latest' python3 scripts/visualize_throughput_timeline.py")
+        exit(1)
+
+    if not os.path.isdir(timeline_dir):
+        print(f"時系列ディレクトリが見つかりません: {timeline_dir}")
+        exit(1)
+
+    visualize_throughput_timeline(timeline_dir, output_dir)
@@ -5,11 +5,32 @@ import (
 	"fmt"
 	"log"
 	"net/http"
+	"strconv"
+	"strings"
 
+	"github.com/quic-go/quic-go"
 	"github.com/quic-go/quic-go/http3"
 	"golang.org/x/net/http2"
 )
 
+// /bytes/<N> で返す最大サイズ（100MB）
+const maxBytesResponse = 100 * 1024 * 1024
+
+// /bytes/<N> 用の共有バッファ（リクエストごとの確保を避ける）
+var zeroBuffer = make([]byte, maxBytesResponse)
+
+// serveBytes は /bytes/<N> に対してNバイトのボディを返す（ページ読み込みワークロード用）
+func serveBytes(w http.ResponseWriter, r *http.Request) {
+	n, err := strconv.Atoi(strings.TrimPrefix(r.URL.Path, "/bytes/"))
+	if err != nil || n < 0 || n > maxBytesResponse {
+		http.Error(w, "invalid size", http.StatusBadRequest)
+		return
+	}
+	w.Header().Set("Content-Type", "application/octet-stream")
+	w.Header().Set("Content-Length", strconv.Itoa(n))
+	w.Write(zeroBuffer[:n])
+}
+
 func main() {
 	fmt.Println("Running...")
 
@@ -38,6 +59,8 @@ func main() {
 				w.Header().Set("Content-Type", "application/octet-stream")
 				data := make([]byte, 1*1024*1024)
 				w.Write(data)
+			} else if strings.HasPrefix(r.URL.Path, "/bytes/") {
+				serveBytes(w, r)
 			} else {
 				w.Write([]byte("hello, world from HTTP/1.1/2\n"))
 			}
@@ -54,6 +77,8 @@ func main() {
 			Certificates: []tls.Certificate{cert},
 			NextProtos:   []string{"h3", "h3-29", "h3-28", "h3-27"},
 		},
+		// 0-RTT再接続（クライアントの resume モード）を受け付ける
+		QuicConfig: &quic.Config{Allow0RTT: true},
 		Handler: http.HandlerFunc(func(w http.ResponseWriter, r *http.Request) {
 			fmt.Printf("Received HTTP/3 request: %s %s (Protocol: %s)\n", r.Method, r.URL.Path, r.Proto)
 
@@ -65,6 +90,8 @@ func main() {
 				w.Header().Set("Content-Type", "application/octet-stream")
 				data := make([]byte, 1*1024*1024)
 				w.Write(data)
+			} else if strings.HasPrefix(r.URL.Path, "/bytes/") {
+				serveBytes(w, r)
 			} else {
 				w.Write([]byte("hello, world from HTTP/3\n"))
 			}
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+QUICセッションチケットのディスクキャッシュ
+プロセスをまたいで0-RTT再接続を計測するため、aioquicのSessionTicketを
+host:port と ALPN をキーとしてファイルに保存する
+
+- 有効期限切れ（チケット自身の not_valid_after、または max_age 超過）は読み出さない
+- エントリ数が max_entries を超えたら保存が古いものから削除する
+- 書き込みは一時ファイル + os.replace で原子的に行い、ロックファイルで
+  同時に動く複数のクライアントプロセスの読み書きを直列化する
+"""
+
+import fcntl
+import os
+import pickle
+import tempfile
+import time
+from contextlib import contextmanager
+
+# 既定のキャッシュファイル（環境変数 HTTP3_TICKET_CACHE で上書き可能）
+DEFAULT_CACHE_PATH = os.environ.get(
+    'HTTP3_TICKET_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'http3_client', 'session_tickets.pickle'),
+)
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_AGE_SEC = 24 * 60 * 60
+
+
+def cache_key(host, port, alpn_protocols):
+    """キャッシュキー（例: localhost:8443/h3）"""
+    return f"{host}:{port}/{','.join(alpn_protocols or [])}"
+
+
+class SessionTicketCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_age=DEFAULT_MAX_AGE_SEC):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+    @contextmanager
+    def _locked(self, exclusive):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        # キャッシュが無い・壊れている場合は空として扱う（計測は継続させる）
+        try:
+            with open(self.path, 'rb') as f:
+                entries = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def _write(self, entries):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.session_tickets.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entries, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _is_fresh(self, entry, now):
+        ticket = entry['ticket']
+        return ticket.is_valid and now - entry['stored_at'] <= self.max_age
+
+    def load(self, key):
+        """有効なチケットがあれば返し、無ければNoneを返す"""
+        with self._locked(exclusive=False):
+            entry = self._read().get(key)
+        if entry is None or not self._is_fresh(entry, time.time()):
+            return None
+        return entry['ticket']
+
+    def store(self, key, ticket):
+        """チケットを保存し、期限切れの削除とエントリ数の上限適用を行う"""
+        now = time.time()
+        with self._locked(exclusive=True):
+            entries = self._read()
+            entries[key] = {'ticket': ticket, 'stored_at': now}
+            entries = {k: v for k, v in entries.items() if self._is_fresh(v, now)}
+            if len(entries) > self.max_entries:
+                newest = sorted(entries, key=lambda k: entries[k]['stored_at'], reverse=True)
+                entries = {k: entries[k] for k in newest[:self.max_entries]}
+            self._write(entries)
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Docker不要のローカル代替サーバー（HTTP/2 + HTTP/3）
+server/main.go と同じポート・エンドポイントを Python（asyncio）だけで提供する:
+
+  /           テキスト（"hello, world from HTTP/1.1/2" / "hello, world from HTTP/3"）
+  /1mb        1MiB
+  /large      10MiB
+  /bytes/<N>  Nバイト（最大 MAX_BYTES_RESPONSE, 範囲外は400）
+
+HTTP/3 は aioquic、HTTP/2 は h2（httpx[http2] の依存）で、同じポート番号のUDPとTCPで待ち受ける。
+ボディはすべて起動時に確保した共有のゼロバッファ（SHARED_BUFFER_SIZE）の切り出しを繰り返し送るので、
+リクエストごとにサイズ分のバッファを確保しない。HTTP/1.1 には対応しない（ALPN は h2 のみ）。
+
+証明書は certs/localhost+2.pem（mkcert, certs/README.md）を使い、無ければ起動時に自己署名証明書を
+一時ディレクトリに生成する（クライアントはいずれも証明書検証を無効にしている）。
+
+  python3 standin_server.py --port 8443
+  python3 docker_benchmark.py --standin --delays 0 --iterations 10   # 起動・停止までランナーが行う
+"""
+
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import os
+import signal
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+from aioquic.asyncio import QuicConnectionProtocol, serve
+from aioquic.h3.connection import H3_ALPN, H3Connection
+from aioquic.h3.events import HeadersReceived
+from aioquic.quic.configuration import QuicConfiguration
+from aioquic.quic.events import ConnectionTerminated, ProtocolNegotiated, StopSendingReceived, StreamReset
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+CERT_DIR = os.path.join(PROJECT_ROOT, 'certs')
+DEFAULT_CERT = os.path.join(CERT_DIR, 'localhost+2.pem')
+DEFAULT_KEY = os.path.join(CERT_DIR, 'localhost+2-key.pem')
+DEFAULT_PORT = 8443
+
+# /bytes/<N> で返す最大サイズ（server/main.go と同じ100MB）
+MAX_BYTES_RESPONSE = 100 * 1024 * 1024
+
+# ボディの送信元の共有バッファ（この大きさの切り出しを繰り返し送る）
+SHARED_BUFFER_SIZE = 1024 * 1024
+SHARED_BUFFER = bytes(SHARED_BUFFER_SIZE)
+
+# HTTP/3 でストリームに一度に積む切り出しの大きさと、接続ごとに未送信のまま積んでおく上限
+# （aioquic は memoryview を受け付けないため、満杯の切り出しは共有の bytes を使い回す）
+H3_PIECE_SIZE = 64 * 1024
+H3_PIECE = SHARED_BUFFER[:H3_PIECE_SIZE]
+H3_SEND_AHEAD = 256 * 1024
+
+# spawn() で待ち受けを待つ上限（秒）
+STARTUP_TIMEOUT_SEC = 10.0
+
+FIXED_SIZES = {'/1mb': 1 * 1024 * 1024, '/large': 10 * 1024 * 1024}
+
+ALT_SVC = 'h3=":{port}"; ma=86400, h3-29=":{port}"; ma=86400'
+
+
+def route(path, greeting):
+    """パスから (ステータス, ボディ長, テキストボディ) を決める（テキスト以外のボディはNone）"""
+    if path in FIXED_SIZES:
+        return 200, FIXED_SIZES[path], None
+    if path.startswith('/bytes/'):
+        try:
+            n = int(path[len('/bytes/'):])
+        except ValueError:
+            n = -1
+        if n < 0 or n > MAX_BYTES_RESPONSE:
+            return 400, len(b'invalid size\n'), b'invalid size\n'
+        return 200, n, None
+    return 200, len(greeting), greeting
+
+
+def chunks(size, chunk_size=SHARED_BUFFER_SIZE):
+    """共有バッファから size バイト分の切り出しを順に返す"""
+    view = memoryview(SHARED_BUFFER)
+    while size > 0:
+        n = min(size, chunk_size)
+        yield view[:n]
+        size -= n
+
+
+class CountingTransport:
+    """送ったデータグラムのバイト数を数えるトランスポートのラッパー（サーバーの共有トランスポートを包む）"""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.sent = 0
+
+    def sendto(self, data, addr=None):
+        self.sent += len(data)
+        self.transport.sendto(data, addr)
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+
+class H3Protocol(QuicConnectionProtocol):
+    greeting = b"hello, world from HTTP/3\n"
+    verbose = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._http = None
+        self.counter = None
+        # ストリームID → ボディの残りのバイト数
+        self.pending = {}
+        # 送信を待つストリームに積んだボディの合計（バイト）
+        self.written = 0
+
+    def connection_made(self, transport):
+        self.counter = CountingTransport(transport)
+        super().connection_made(self.counter)
+
+    def quic_event_received(self, event):
+        if isinstance(event, ProtocolNegotiated):
+            self._http = H3Connection(self._quic)
+        elif isinstance(event, (StreamReset, StopSendingReceived)):
+            self.pending.pop(event.stream_id, None)
+        elif isinstance(event, ConnectionTerminated):
+            self.pending.clear()
+        if self._http is None:
+            return
+        for http_event in self._http.handle_event(event):
+            if isinstance(http_event, HeadersReceived):
+                self._respond(http_event)
+
+    def _respond(self, event):
+        headers = dict(event.headers)
+        path = headers.get(b':path', b'/').decode()
+        if self.verbose:
+            print(f"Received HTTP/3 request: {headers.get(b':method', b'').decode()} {path}", flush=True)
+        status, length, body = route(path, self.greeting)
+        content_type = b'application/octet-stream' if body is None else b'text/plain; charset=utf-8'
+        self._http.send_headers(event.stream_id, [
+            (b':status', str(status).encode()),
+            (b'content-type', content_type),
+            (b'content-length', str(length).encode()),
+        ])
+        if body is not None:
+            self._http.send_data(event.stream_id, body, end_stream=True)
+        elif length == 0:
+            self._http.send_data(event.stream_id, b'', end_stream=True)
+        else:
+            # ボディは transmit() のたびに送信の進み具合に合わせて積む
+            self.pending[event.stream_id] = length
+        self.transmit()
+
+    def transmit(self):
+        if self.pending:
+            self._send_pending()
+        super().transmit()
+
+    def _send_pending(self):
+        """接続の未送信のボディが H3_SEND_AHEAD を下回るまで、ストリームに順に1切り出しずつ積む
+
+        ACK の受信やタイマーで transmit() が呼ばれるたびに補充するので、ボディ全体を一度に
+        ストリームの送信バッファへ積まない。aioquic には送信バッファの残量を知る公開APIが無いため、
+        積んだボディの合計と送ったデータグラムの合計の差を未送信量とする。データグラムにはヘッダーや
+        ACK も含まれるのでこの見積もりは実際の未送信量以下になり、送信が止まったまま補充されない
+        ことはない（その分だけ上限を超えて積むことはある）。
+        """
+        while self.pending and self.written - self.counter.sent < H3_SEND_AHEAD:
+            for stream_id in list(self.pending):
+                if self.written - self.counter.sent >= H3_SEND_AHEAD:
+                    break
+                n = min(self.pending[stream_id], H3_PIECE_SIZE)
+                remaining = self.pending[stream_id] - n
+                try:
+                    self._http.send_data(stream_id, H3_PIECE if n == H3_PIECE_SIZE else SHARED_BUFFER[:n],
+                                         end_stream=remaining == 0)
+                except RuntimeError:
+                    # 送信側がリセット済み（STOP_SENDING を受けた等）のストリーム
+                    del self.pending[stream_id]
+                    continue
+                self.written += n
+                if remaining:
+                    self.pending[stream_id] = remaining
+                else:
+                    del self.pending[stream_id]
+
+
+class H2Protocol(asyncio.Protocol):
+    """h2 による HTTP/2 サーバー接続（フロー制御のウィンドウに合わせて送る）"""
+    greeting = b"hello, world from HTTP/1.1/2\n"
+    verbose = False
+    port = DEFAULT_PORT
+
+    def __init__(self):
+        self.conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        self.transport = None
+        # ストリームID → 残りのボディ（共有バッファの切り出しのイテレータと送信途中の切り出し）
+        self.pending = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.conn.initiate_connection()
+        self.transport.write(self.conn.data_to_send())
+
+    def data_received(self, data):
+        try:
+            events = self.conn.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.write(self.conn.data_to_send())
+            self.transport.close()
+            return
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self._respond(event)
+            elif isinstance(event, h2.events.DataReceived):
+                self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.StreamReset):
+                self.pending.pop(event.stream_id, None)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self._send_pending()
+        self.transport.write(self.conn.data_to_send())
+
+    def _respond(self, event):
+        headers = dict(event.headers)
+        path = headers.get(':path', '/')
+        if self.verbose:
+            print(f"Received HTTP/1.1/2 request: {headers.get(':method', '')} {path}", flush=True)
+        status, length, body = route(path, self.greeting)
+        self.conn.send_headers(event.stream_id, [
+            (':status', str(status)),
+            ('content-type', 'application/octet-stream' if body is None else 'text/plain; charset=utf-8'),
+            ('content-length', str(length)),
+            ('alt-svc', ALT_SVC.format(port=self.port)),
+        ])
+        source = iter([memoryview(body)]) if body is not None else chunks(length)
+        self.pending[event.stream_id] = [source, memoryview(b'')]
+
+    def _send_pending(self):
+        """各ストリームをフロー制御ウィンドウの範囲で送り、送り切ったストリームを閉じる"""
+        for stream_id in list(self.pending):
+            source, current = self.pending[stream_id]
+            while True:
+                if not current:
+                    current = next(source, None)
+                    if current is None:
+                        self.conn.end_stream(stream_id)
+                        del self.pending[stream_id]
+                        break
+                window = min(self.conn.local_flow_control_window(stream_id), self.conn.max_outbound_frame_size)
+                if window <= 0:
+                    self.pending[stream_id][1] = current
+                    break
+                n = min(window, len(current))
+                self.conn.send_data(stream_id, current[:n])
+                current = current[n:]
+
+    def connection_lost(self, exc):
+        self.pending.clear()
+
+
+def generate_self_signed(directory):
+    """localhost / 127.0.0.1 / ::1 用の自己署名証明書を生成し (証明書, 秘密鍵) のパスを返す"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=30))
+            .add_extension(x509.SubjectAlternativeName([
+                x509.DNSName('localhost'),
+                x509.IPAddress(ipaddress.ip_address('127.0.0.1')),
+                x509.IPAddress(ipaddress.ip_address('::1')),
+            ]), critical=False)
+            .sign(key, hashes.SHA256()))
+    cert_path = os.path.join(directory, 'standin.pem')
+    key_path = os.path.join(directory, 'standin-key.pem')
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+async def run_server(host, port, cert_path, key_path, verbose=False):
+    H3Protocol.verbose = H2Protocol.verbose = verbose
+    H2Protocol.port = port
+
+    quic_config = QuicConfiguration(alpn_protocols=H3_ALPN, is_client=False, max_datagram_frame_size=65536)
+    quic_config.load_cert_chain(cert_path, key_path)
+    # 0-RTT再接続（クライアントの resume モード）用のセッションチケット
+    tickets = {}
+    quic_server = await serve(host, port, configuration=quic_config, create_protocol=H3Protocol,
+                              session_ticket_fetcher=lambda label: tickets.pop(label, None),
+                              session_ticket_handler=lambda t: tickets.__setitem__(t.ticket, t))
+
+    tls = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    tls.load_cert_chain(cert_path, key_path)
+    tls.set_alpn_protocols(['h2'])
+    loop = asyncio.get_running_loop()
+    server = await loop.create_server(H2Protocol, host, port, ssl=tls, reuse_address=True)
+
+    # spawn() の terminate（SIGTERM）でも一時証明書を片付けて終了できるようにする
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    print(f"Starting HTTP/2 and HTTP/3 stand-in server on {host}:{port}", flush=True)
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        quic_server.close()
+
+
+def spawn(port=DEFAULT_PORT, log_path=None, timeout=STARTUP_TIMEOUT_SEC):
+    """代替サーバーを子プロセスとして起動し、待ち受けを始めるまで待つ（ランナー用, Popen を返す）
+
+    TCPはUDP（QUIC）の後に待ち受けるので、TCPのポートに接続できれば両方とも準備できている。
+    """
+    log = open(log_path, 'w') if log_path else subprocess.DEVNULL
+    try:
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--port', str(port)],
+                                stdout=log, stderr=subprocess.STDOUT)
+    finally:
+        # 子プロセスが複製を持つので親では閉じる
+        if log_path:
+            log.close()
+    where = f" (log: {log_path})" if log_path else ''
+    deadline = time.monotonic() + timeout
+    while True:
+        if proc.poll() is not None:
+            raise RuntimeError(f"stand-in server exited with {proc.returncode}{where}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return proc
+        except OSError:
+            if time.monotonic() > deadline:
+                proc.terminate()
+                proc.wait()
+                raise RuntimeError(f"stand-in server did not listen on port {port} within {timeout:g}s{where}")
+            time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local HTTP/2 + HTTP/3 stand-in for server/main.go')
+    parser.add_argument('--host', default='0.0.0.0', help='待ち受けアドレス')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='待ち受けポート（TCPとUDPの両方）')
+    parser.add_argument('--certificate', default=DEFAULT_CERT, help='証明書（無ければ自己署名証明書を生成）')
+    parser.add_argument('--private-key', default=DEFAULT_KEY, help='秘密鍵')
+    parser.add_argument('--verbose', action='store_true', help='リクエストごとにログを出力する')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cert_path, key_path = args.certificate, args.private_key
+        if not (os.path.exists(cert_path) and os.path.exists(key_path)):
+            print(f"{cert_path} が無いため自己署名証明書を生成します", flush=True)
+            cert_path, key_path = generate_self_signed(tmp)
+        asyncio.run(run_server(args.host, args.port, cert_path, key_path, args.verbose))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+逐次停止規則
+条件ごとに反復を1回ずつ追加し、信頼区間の幅が目標以下になった時点で打ち切る
+（安定した条件は少ない反復で終え、ばらつきの大きい条件に計測時間を回す）
+
+criterion:
+  mean  プロトコルごとに平均の信頼区間（t分布）を見て、それぞれ独立に停止する
+  diff  HTTP/2 − HTTP/3 の平均の差の信頼区間（Welch）を見て、両プロトコル同時に停止する
+
+幅は信頼区間の全幅を平均（diff では両プロトコルの平均の平均）で割った相対値で比較する。
+停止理由は 'ci'（目標の幅に到達）または 'max'（最大反復回数に到達）。
+"""
+
+import math
+import statistics
+
+from scipy import stats
+
+CRITERIA = ('mean', 'diff')
+DEFAULT_CONFIDENCE = 0.95
+
+
+def mean_ci(samples, confidence=DEFAULT_CONFIDENCE):
+    """標本平均と信頼区間の半幅を返す（2標本未満なら半幅は無限大）"""
+    if not samples:
+        return math.nan, math.inf
+    mean = statistics.fmean(samples)
+    if len(samples) < 2:
+        return mean, math.inf
+    sem = statistics.stdev(samples) / math.sqrt(len(samples))
+    return mean, float(stats.t.ppf((1 + confidence) / 2, len(samples) - 1)) * sem
+
+
+def diff_ci(a, b, confidence=DEFAULT_CONFIDENCE):
+    """平均の差 a − b とWelchの信頼区間の半幅を返す"""
+    if len(a) < 2 or len(b) < 2:
+        return math.nan, math.inf
+    va = statistics.variance(a) / len(a)
+    vb = statistics.variance(b) / len(b)
+    se = math.sqrt(va + vb)
+    if se == 0:
+        dof = len(a) + len(b) - 2
+    else:
+        dof = (va + vb) ** 2 / (va ** 2 / (len(a) - 1) + vb ** 2 / (len(b) - 1))
+    return statistics.fmean(a) - statistics.fmean(b), float(stats.t.ppf((1 + confidence) / 2, dof)) * se
+
+
+class SequentialStopper:
+    """プロトコルごとの計測値を受け取り、反復を続けるプロトコルを判定する
+
+    min_iterations / max_iterations は記録する反復（ウォームアップを除く）の回数。
+    失敗した反復は回数には数えるが、信頼区間には含めない。
+    """
+
+    def __init__(self, protocols, target_width, criterion='mean', min_iterations=10, max_iterations=100,
+                 confidence=DEFAULT_CONFIDENCE):
+        if criterion not in CRITERIA:
+            raise ValueError(f"unknown criterion: {criterion}")
+        if criterion == 'diff' and len(protocols) != 2:
+            raise ValueError("diff criterion needs exactly two protocols")
+        self.protocols = list(protocols)
+        self.target_width = target_width
+        self.criterion = criterion
+        self.min_iterations = min_iterations
+        self.max_iterations = max(max_iterations, min_iterations)
+        self.confidence = confidence
+        self.samples = {p: [] for p in self.protocols}
+        self.attempts = {p: 0 for p in self.protocols}
+        self.stop_reasons = {}
+
+    def record(self, protocol, value):
+        """1回分の結果を記録する（失敗は None）"""
+        self.attempts[protocol] += 1
+        if value is not None:
+            self.samples[protocol].append(value)
+
+    def relative_width(self, protocol=None):
+        """判定に使う信頼区間の相対全幅（diff では protocol は無視）"""
+        if self.criterion == 'diff':
+            a, b = (self.samples[p] for p in self.protocols)
+            _, half = diff_ci(a, b, self.confidence)
+            scale = (statistics.fmean(a) + statistics.fmean(b)) / 2 if a and b else math.nan
+        else:
+            scale, half = mean_ci(self.samples[protocol], self.confidence)
+        return 2 * half / scale if scale and scale > 0 else math.inf
+
+    def _reason(self, group):
+        attempts = min(self.attempts[p] for p in group)
+        if attempts < self.min_iterations:
+            return None
+        if self.relative_width(group[0]) <= self.target_width:
+            return 'ci'
+        if attempts >= self.max_iterations:
+            return 'max'
+        return None
+
+    def active(self):
+        """まだ反復を続けるプロトコルのリストを返す（停止したものは理由を記録する）"""
+        # diff では両プロトコルを1組として同時に止める
+        groups = [self.protocols] if self.criterion == 'diff' else [[p] for p in self.protocols]
+        for group in groups:
+            if group[0] not in self.stop_reasons:
+                reason = self._reason(group)
+                if reason is not None:
+                    self.stop_reasons.update({p: reason for p in group})
+        return [p for p in self.protocols if p not in self.stop_reasons]
+
+    def summary(self, protocol):
+        """プロトコルの反復回数・平均・信頼区間・停止理由を辞書で返す"""
+        mean, half = mean_ci(self.samples[protocol], self.confidence)
+        return {
+            'criterion': self.criterion,
+            'target_width': self.target_width,
+            'iterations': self.attempts[protocol],
+            'samples': len(self.samples[protocol]),
+            'mean': mean,
+            'ci_low': mean - half,
+            'ci_high': mean + half,
+            'relative_width': self.relative_width(protocol),
+            'stop_reason': self.stop_reasons.get(protocol, ''),
+        }
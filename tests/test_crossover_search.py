@@ -0,0 +1,36 @@
+"""crossover_search.py: 中点の計測に失敗しても探索が終わること"""
+
+import asyncio
+
+import pytest
+
+from crossover_search import CrossoverSearch
+
+
+def run_search(search, failing=()):
+    measured = []
+
+    async def measure(delay):
+        measured.append(delay)
+        if delay in failing:
+            return {'HTTP/2': None, 'HTTP/3': None}
+        # 20ms より低遅延では HTTP/3 が速い
+        return {'HTTP/2': 1.0 + (20 - delay) * 0.001, 'HTTP/3': 1.0}
+
+    crossovers = asyncio.run(asyncio.wait_for(search.run(measure), 5))
+    return crossovers, measured
+
+
+def test_failed_midpoint_probes_nearest_untried_delay():
+    crossovers, measured = run_search(CrossoverSearch(0, 50, 25, 1), failing={12})
+    assert measured.count(12) == 1
+    assert len(crossovers) == 1
+    assert crossovers[0]['high'] - crossovers[0]['low'] <= 1
+    assert crossovers[0]['latency'] == pytest.approx(20)
+
+
+def test_bracket_without_untried_points_is_given_up():
+    failing = set(range(1, 25))
+    crossovers, measured = run_search(CrossoverSearch(0, 50, 25, 1), failing=failing)
+    assert len(measured) == len(set(measured))
+    assert (crossovers[0]['low'], crossovers[0]['high']) == (0, 25)
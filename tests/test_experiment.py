@@ -0,0 +1,15 @@
+"""experiment.py: 遅延0で並べ替えのある条件を無効な条件として計画から除くこと"""
+
+from experiment import expand
+
+
+def test_reorder_without_delay_is_reported_as_invalid():
+    spec = {'design': 'cartesian', 'samples': 0, 'seed': None,
+            'dimensions': {'bandwidth': ['5mbit'], 'delay': [0, 50], 'loss': [0], 'jitter': [0],
+                           'reorder': [0, 25], 'payload': [1048576]}}
+
+    conditions, invalid = expand(spec)
+
+    assert [(c['delay'], c['reorder']) for c in conditions] == [(0, 0), (50, 0), (50, 25)]
+    assert [(c['condition'], c['delay'], c['reorder']) for c, _ in invalid] == [('c002', 0, 25)]
+    assert [c['condition'] for c in conditions] == ['c001', 'c003', 'c004']
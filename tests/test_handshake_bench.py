@@ -0,0 +1,34 @@
+"""handshake_bench.py: 0-RTT の計測で失敗後のフルハンドシェイクを 0-RTT として数えないこと"""
+
+import asyncio
+
+import pytest
+
+import handshake_bench
+
+
+def test_full_handshake_after_failure_is_not_counted_as_0rtt(monkeypatch):
+    outcomes = iter(['prime', 'resumed', 'error', 'full'])
+
+    async def quic_connection(target, ticket_slot=None):
+        await asyncio.sleep(0.01)
+        outcome = next(outcomes, 'resumed')
+        if outcome == 'error':
+            raise ConnectionError('handshake failed')
+        resumed = outcome == 'resumed'
+        # フルハンドシェイクは再開より遅い
+        handshake = 0.001 if resumed else 0.05
+        return {'connect': 0.0, 'handshake': handshake, 'request': None,
+                'resumed': resumed, 'early_data': False}, None
+
+    async def close(handle):
+        pass
+
+    monkeypatch.setattr(handshake_bench, 'quic_connection', quic_connection)
+    monkeypatch.setattr(handshake_bench, '_close', close)
+    summary = asyncio.run(handshake_bench.run_handshakes('https://localhost:8443/', '0rtt', 0.2))
+
+    assert summary['errors'] == 1
+    assert summary['not_resumed'] == 1
+    assert summary['handshakes'] == summary['resumed'] > 0
+    assert summary['latency']['handshake']['max'] == pytest.approx(0.001, rel=0.1)
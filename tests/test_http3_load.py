@@ -0,0 +1,47 @@
+"""http3_load.py: ワーカーに分割した一定間隔の到着が全体として等間隔になり、開始時刻が全ワーカーの準備後に決まること"""
+
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from http3_load import StartBarrier, arrival_offsets
+
+
+def test_constant_arrivals_interleave_across_workers():
+    rate, workers, duration = 100, 4, 1.0
+    offsets = sorted(offset for w in range(workers)
+                     for offset in arrival_offsets(rate / workers, duration, 'constant', phase=w / rate))
+    assert len(offsets) == rate * duration
+    assert offsets == pytest.approx([k / rate for k in range(int(rate * duration))])
+
+
+def test_start_time_is_set_after_every_worker_is_ready():
+    with multiprocessing.Manager() as manager:
+        barrier = StartBarrier(manager, 2)
+        ready_at, start_times = [], []
+
+        def worker(delay):
+            # 接続確立に時間のかかるワーカーを模す
+            time.sleep(delay)
+            ready_at.append(time.time())
+            start_times.append(barrier.wait(timeout=10))
+
+        threads = [threading.Thread(target=worker, args=(delay,)) for delay in (0.0, 0.3)]
+        for thread in threads:
+            thread.start()
+        start_at = barrier.release(timeout=10)
+        for thread in threads:
+            thread.join()
+
+    assert start_times == [start_at, start_at]
+    assert start_at > max(ready_at)
+
+
+def test_failed_worker_releases_the_parent():
+    with multiprocessing.Manager() as manager:
+        barrier = StartBarrier(manager, 2)
+        barrier.abort()
+        with pytest.raises(threading.BrokenBarrierError):
+            barrier.release(timeout=10)
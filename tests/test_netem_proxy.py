@@ -0,0 +1,134 @@
+"""netem_proxy.py: 損失モデル・トークンバケット・タイマーホイールと、TCPのバイト列の順序"""
+
+import asyncio
+import os
+import random
+import socket
+
+import pytest
+
+import netem_proxy
+from netem_proxy import TCP_SEGMENT_BYTES, Emulator, LossModel, TimerWheel, TokenBucket
+
+PAYLOAD = os.urandom(400 * TCP_SEGMENT_BYTES)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def test_gemodel_loss_rate_matches_steady_state():
+    model = LossModel('gemodel 2% 20% 60% 0.5%')
+    rng = random.Random(1)
+    draws = 200000
+    lost = sum(model.drop(rng) for _ in range(draws))
+    assert model.mean_pct == pytest.approx((2 / 22 * 60 + 20 / 22 * 0.5))
+    assert lost / draws * 100 == pytest.approx(model.mean_pct, rel=0.05)
+
+
+def test_token_bucket_paces_at_rate_after_burst():
+    bucket = TokenBucket(8_000_000, burst_bytes=15000)  # 1MB/s
+    departures = [bucket.departure(0.0, 1500) for _ in range(40)]
+    # バーストの10パケットは即座に、以降は 1500B / 1MB/s = 1.5ms 間隔
+    assert departures[:10] == [0.0] * 10
+    assert departures[10:] == pytest.approx([1.5e-3 * k for k in range(1, 31)])
+    # 空いている間にトークンが溜まり直す
+    assert bucket.departure(1.0, 1500) == 1.0
+
+
+def test_timer_wheel_fires_in_time_order_across_slot_wrap():
+    async def main():
+        loop = asyncio.get_running_loop()
+        # 8スロット × 1ms なので 8ms を超える予定はオーバーフローからホイールを周回して移る
+        wheel = TimerWheel(loop, tick=0.001, size=8, spin=0)
+        fired = []
+        done = loop.create_future()
+        offsets = [0.020, 0.003, 0.011, 0.009, 0.0175, 0.001, 0.0105, 0.030, 0.0031, 0.019]
+        base = loop.time()
+
+        def callback(when, tag):
+            fired.append((when, tag))
+            if len(fired) == len(offsets):
+                done.set_result(None)
+
+        for tag, offset in enumerate(offsets):
+            wheel.schedule(base + offset, callback, tag)
+        await asyncio.wait_for(done, 2)
+        return fired
+
+    fired = asyncio.run(main())
+    assert [when for when, _ in fired] == sorted(when for when, _ in fired)
+    assert [tag for _, tag in fired] == [5, 1, 8, 3, 6, 2, 4, 9, 0, 7]
+
+
+def test_emulator_rejects_loss_while_relaying_tcp():
+    async def main():
+        loop = asyncio.get_running_loop()
+        with pytest.raises(ValueError):
+            Emulator(loop).set('5mbit', '20ms', '1%')
+        with pytest.raises(ValueError):
+            Emulator(loop).set('5mbit', '20ms', 'gemodel 1% 10%')
+        return Emulator(loop, tcp=False).set('5mbit', '20ms', '1%')
+
+    assert asyncio.run(main())['loss_pct'] == 1.0
+
+
+def test_link_keeps_stream_order_across_delay_decrease():
+    async def main():
+        loop = asyncio.get_running_loop()
+        emulator = Emulator(loop, seed=1)
+        emulator.set('100mbit', '70ms', jitter='10ms', reorder='25%')
+        received = []
+        finished = loop.create_future()
+
+        def send(data):
+            received.append(bytes(data))
+            if sum(map(len, received)) == len(PAYLOAD):
+                finished.set_result(None)
+
+        view = memoryview(PAYLOAD)
+        half = len(PAYLOAD) // 2
+        for offset in range(0, len(PAYLOAD), TCP_SEGMENT_BYTES):
+            if offset == half:
+                # 転送中に遅延を減らし、トークンバケットも作り直す
+                await asyncio.sleep(0.02)
+                emulator.set('200mbit', '63ms', jitter='10ms', reorder='25%')
+            emulator.down.submit(view[offset:offset + TCP_SEGMENT_BYTES], send, droppable=False)
+        await asyncio.wait_for(finished, 10)
+        return b''.join(received)
+
+    assert asyncio.run(main()) == PAYLOAD
+
+
+def test_tcp_relay_delivers_identical_bytes_under_jitter_and_delay_change():
+    async def main():
+        loop = asyncio.get_running_loop()
+
+        async def serve(reader, writer):
+            await reader.readexactly(1)
+            writer.write(PAYLOAD)
+            await writer.drain()
+            writer.close()
+
+        upstream = await asyncio.start_server(serve, '127.0.0.1', 0)
+        upstream_port = upstream.sockets[0].getsockname()[1]
+        listen, control = ('127.0.0.1', free_port()), ('127.0.0.1', free_port())
+        proxy = asyncio.ensure_future(netem_proxy.run_proxy(listen, ('127.0.0.1', upstream_port), control,
+                                                            '50mbit', '70ms', '0%', jitter='10ms', seed=1))
+        try:
+            await asyncio.sleep(0.2)
+            reader, writer = await asyncio.open_connection(*listen)
+            writer.write(b'G')
+            received = await reader.readexactly(len(PAYLOAD) // 4)
+            await asyncio.to_thread(netem_proxy.control, control,
+                                    {'cmd': 'set', 'bandwidth': '80mbit', 'delay': '63ms', 'jitter': '10ms'})
+            received += await asyncio.wait_for(reader.read(), 20)
+            writer.close()
+            return received
+        finally:
+            proxy.cancel()
+            upstream.close()
+
+    assert asyncio.run(main()) == PAYLOAD
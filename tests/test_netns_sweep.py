@@ -0,0 +1,29 @@
+"""netns_sweep.py: 作業単位の時系列がペイロードサイズのディレクトリを入れ子にせずまとまること"""
+
+import os
+
+from netns_sweep import merge_parts
+
+
+def write(path, text=''):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def test_merge_parts_merges_timelines_per_file(tmp_path):
+    parts = tmp_path / 'parts'
+    write(str(parts / '0' / 'timelines' / '1024B' / 'h2_10ms_1.csv'))
+    write(str(parts / '1' / 'timelines' / '1024B' / 'h2_50ms_1.csv'))
+    write(str(parts / '1' / 'timelines' / 'h3_50ms_1.csv'))
+    header = 'latency,protocol,iteration,time\n'
+    write(str(parts / '0' / 'benchmark_results.csv'), header + '10ms,HTTP/2,1,1.0\n')
+    write(str(parts / '1' / 'benchmark_results.csv'), header + '50ms,HTTP/2,1,1.2\n')
+
+    csv_path = merge_parts(str(tmp_path))
+
+    timelines = tmp_path / 'timelines'
+    assert sorted(os.listdir(timelines / '1024B')) == ['h2_10ms_1.csv', 'h2_50ms_1.csv']
+    assert (timelines / 'h3_50ms_1.csv').exists()
+    with open(csv_path) as f:
+        assert f.read().splitlines()[1:] == ['10ms,HTTP/2,1,1.0', '50ms,HTTP/2,1,1.2']
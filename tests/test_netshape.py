@@ -0,0 +1,71 @@
+"""netshape.py: 並べ替えを0に戻す条件変更が読み戻しと一致すること"""
+
+import pytest
+
+from netshape import Shaper, ShapingError, TcBackend, parse_loss, parse_time
+
+
+class FakeTcBackend(TcBackend):
+    """tc コマンドの代わりにカーネルの netem を模す（reorder を省いた change は直前の値を残す）"""
+
+    def __init__(self):
+        super().__init__('eth0')
+        self.rate = None
+        self.netem = None
+
+    def _tc(self, *args, check=True):
+        args = list(args)
+        if args[:2] == ['qdisc', 'show']:
+            if self.netem is None:
+                return 'qdisc noqueue 0: root refcnt 2\n'
+            line = f"qdisc netem 10: parent 1:10 limit 1000 delay {self.netem['delay'] / 1000:g}ms"
+            if self.netem['jitter']:
+                line += f"  {self.netem['jitter'] / 1000:g}ms"
+            if self.netem['loss']:
+                line += f" loss {self.netem['loss']:g}%"
+            if self.netem['reorder']:
+                line += f" reorder {self.netem['reorder']:g}% gap 1"
+            return 'qdisc htb 1: root refcnt 2 r2q 10 default 0x10\n' + line + '\n'
+        if args[:2] == ['class', 'show']:
+            return '' if self.rate is None else f"class htb 1:10 root prio 0 rate {self.rate} ceil {self.rate}\n"
+        if args[:2] == ['qdisc', 'del']:
+            self.rate = self.netem = None
+        elif args[0] == 'class':
+            self.rate = args[args.index('rate') + 1]
+        elif args[0] == 'qdisc' and 'netem' in args:
+            options = args[args.index('netem') + 1:]
+            netem = {'delay': parse_time(options[1]), 'jitter': parse_time(options[2]),
+                     'loss': parse_loss(options[options.index('loss') + 1])}
+            if 'reorder' in options:
+                netem['reorder'] = parse_loss(options[options.index('reorder') + 1])
+                if netem['reorder'] and not netem['delay']:
+                    raise ShapingError('reordering not possible without specifying some delay')
+            elif args[1] == 'change':
+                netem['reorder'] = self.netem['reorder']
+            else:
+                netem['reorder'] = 0.0
+            self.netem = netem
+        return ''
+
+
+def test_reorder_can_be_turned_off_and_on_again():
+    shaper = Shaper(FakeTcBackend())
+    for reorder in ('25%', '0%', '25%'):
+        applied = shaper.apply('5mbit', 50, '0%', 0, reorder)
+        assert applied['reorder'] == parse_loss(reorder)
+
+
+def test_reorder_without_delay_is_rejected_by_every_backend():
+    with pytest.raises(ShapingError):
+        Shaper(FakeTcBackend()).apply('5mbit', 0, '0%', 0, '25%')
+
+
+def test_netlink_options_always_carry_reorder():
+    pytest.importorskip('pyroute2')
+    from netshape import NetlinkBackend, Shaping
+
+    backend = NetlinkBackend.__new__(NetlinkBackend)
+    for reorder_pct in (25.0, 0.0):
+        options = backend._netem_options(Shaping(5_000_000, 50_000, 0.0, 0.0, reorder_pct))
+        reorder = dict(options['attrs'])['TCA_NETEM_REORDER']
+        assert (reorder['prob_reorder'] != 0) == bool(reorder_pct)
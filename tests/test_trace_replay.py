@@ -0,0 +1,43 @@
+"""trace_replay.py: 区間の変更に失敗したら再生を止め、計測側に伝えること"""
+
+import time
+
+import pytest
+
+from netshape import ShapingError
+from trace_replay import TraceReplayer, TraceReplayError, TraceSegment
+
+SEGMENTS = [TraceSegment(0, 0.0, '8mbit', 40, 0.0), TraceSegment(1, 0.02, '2mbit', 80, 0.0)]
+
+
+def test_failed_change_stops_replay_and_is_reported():
+    calls = []
+
+    def apply(bandwidth, delay_ms, loss):
+        calls.append(bandwidth)
+        if len(calls) == 3:
+            raise ShapingError('control port timed out')
+
+    replayer = TraceReplayer('flaky', SEGMENTS, 0.04, apply)
+    replayer.start()
+    deadline = time.perf_counter() + 2
+    while replayer.error is None and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    replayer.stop()
+
+    assert isinstance(replayer.error, ShapingError)
+    assert len(calls) == 3 and len(replayer.records) == 2
+    with pytest.raises(TraceReplayError):
+        replayer.check()
+
+
+def test_failed_first_segment_does_not_start_thread():
+    def apply(bandwidth, delay_ms, loss):
+        raise OSError('netlink error')
+
+    replayer = TraceReplayer('broken', SEGMENTS, 0.04, apply)
+    replayer.start()
+    replayer.stop()
+    assert replayer.records == []
+    with pytest.raises(TraceReplayError):
+        replayer.check()
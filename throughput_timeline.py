@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+受信スループットの時系列記録
+レスポンスボディの受信バイト数を固定幅の時間ビン（既定5ms）ごとに array('Q') へ加算し、
+1リクエスト1ファイルのサイドカーバイナリとして保存する
+
+サイドカー形式（リトルエンディアン）:
+  magic 'TPTL' | version (uint16) | 予約 (uint16) | ビン幅ns (uint64) | メタデータ長 (uint32)
+  | メタデータ(JSON, UTF-8) | ビンごとの受信バイト数 (uint64 × N)
+"""
+
+import json
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b'TPTL'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQI')
+
+# 既定のビン幅（秒）
+DEFAULT_BIN_SEC = 0.005
+
+# サイドカーの拡張子
+SUFFIX = '.tl'
+
+
+class ThroughputTimeline:
+    """start_ns を起点とした時間ビンごとの受信バイト数"""
+
+    def __init__(self, start_ns, bin_sec=DEFAULT_BIN_SEC):
+        self.start_ns = start_ns
+        self.bin_ns = int(bin_sec * 1e9)
+        if self.bin_ns <= 0:
+            raise ValueError(f"bin width must be positive: {bin_sec}")
+        self.bins = array('Q')
+
+    def record(self, now_ns, nbytes):
+        index = max((now_ns - self.start_ns) // self.bin_ns, 0)
+        if index >= len(self.bins):
+            # 途中の空ビンも0で埋めて伸ばす
+            self.bins.frombytes(bytes(self.bins.itemsize * (index + 1 - len(self.bins))))
+        self.bins[index] += nbytes
+
+    @property
+    def bin_sec(self):
+        return self.bin_ns / 1e9
+
+    def total(self):
+        return sum(self.bins)
+
+    def write(self, path, **metadata):
+        """サイドカーファイルに書き出す（metadata はJSONとして埋め込む）"""
+        meta = json.dumps(metadata).encode()
+        bins = array('Q', self.bins)
+        if sys.byteorder != 'little':
+            bins.byteswap()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, 0, self.bin_ns, len(meta)))
+            f.write(meta)
+            bins.tofile(f)
+
+    @classmethod
+    def read(cls, path):
+        """サイドカーファイルを読み込み、(timeline, metadata) を返す"""
+        with open(path, 'rb') as f:
+            magic, version, _, bin_ns, meta_len = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path}: not a throughput timeline (version {VERSION})")
+            metadata = json.loads(f.read(meta_len))
+            data = f.read()
+
+        timeline = cls(0, bin_ns / 1e9)
+        timeline.bins.frombytes(data[:len(data) - len(data) % timeline.bins.itemsize])
+        if sys.byteorder != 'little':
+            timeline.bins.byteswap()
+        return timeline, metadata
+
+
+def timeline_path(directory, protocol, latency_label, iteration):
+    """サイドカーのパス（例: timelines/h3_50ms_0007.tl）"""
+    slug = protocol.replace('HTTP/', 'h').lower()
+    return os.path.join(directory, f"{slug}_{latency_label}_{iteration:04d}{SUFFIX}")
+
+
+def next_timeline_path(directory, protocol, latency_label):
+    """既存ファイルと重ならない次の通し番号のパス（単発実行用）"""
+    iteration = 1
+    while os.path.exists(timeline_path(directory, protocol, latency_label, iteration)):
+        iteration += 1
+    return timeline_path(directory, protocol, latency_label, iteration)
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+トレース駆動の時間変化するネットワーク条件（帯域・遅延・損失の再生）
+tc_setup.sh は1回の計測に1つの固定条件しか与えないが、モバイル回線の条件は転送中にも変わる。
+トレースファイルの各行の時刻に帯域・遅延・損失を切り替えながら計測し、各リクエストがトレースの
+どの区間（セグメント）と重なったかを結果CSVに記録する。
+
+トレースはCSV（ヘッダー行と # で始まる行は無視）:
+
+  # time_ms, rate, delay_ms, loss
+  0,    8mbit,   40, 0
+  250,  2.5mbit, 65, 0.5
+  500,  600,     120, 2      # rate が数値なら kbit/s、loss は %
+
+各行の条件は次の行の時刻まで続き、最終行は直前の間隔と同じ長さだけ続く（その長さがトレースの周期）。
+周期の終わりで先頭に戻って繰り返す。
+
+再生は専用スレッドで行い、予定時刻にシェーパー（netshape.Shaper）を変更する（読み戻しの確認を含む）。
+実際に反映された時刻を区間の開始として記録し（trace_applied.csv）、変更が間に合わず既に終わった区間は
+飛ばして skipped に数える。ミリ秒単位の変更には tc より netem_proxy.py（--emulator）が速い。
+ただし netem_proxy.py はTCPに損失を与えられない（HTTP/3 だけが損失を受ける）ため、--emulator では
+損失のあるトレースを拒否する（損失は --tc-netns か Docker のサーバーコンテナで再生する）。
+
+結果CSVは共通スキーマに benchmark_csv.TRACE_FIELDS を加えたもので、latency 列にはトレース名を入れる:
+
+  trace_cycle     リクエスト開始時の周期（--align request では常に0）
+  trace_offset    リクエスト開始時の周期内の位置（秒）
+  trace_segments  転送中に有効だった区間の番号（; 区切り, 0始まり）
+
+--align request ではリクエストごとにトレースを先頭から再生し直し、全てのリクエストが同じ条件の
+変化を受けるようにする（既定の free はトレースを流し続け、区間の記録で比較する）。
+トレース×プロトコルの統計を trace_summary.csv に保存する。
+
+  python3 trace_replay.py experiments/sample_trace.csv --emulator --standin --iterations 20
+"""
+
+import argparse
+import asyncio
+import bisect
+import csv
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from urllib.parse import urlparse
+
+from bench_client import warm_up
+from benchmark_csv import STOPPING_CSV_FIELDS, TRACE_APPLIED_FIELDS, TRACE_CSV_FIELDS, open_result_csv
+from checkpoint import Journal
+from docker_benchmark import (EMULATOR_PORT, SERVER_CONTAINER, STARTUP_WAIT_SEC, TARGET_URL, BenchmarkRunner,
+                              compose, env_config)
+from netem_proxy import EmulatorBackend
+import netem_proxy
+from netshape import Shaper, ShapingError, open_shaper, parse_rate
+from schedule import SCHEDULES, Schedule
+import standin_server
+from stopping_rule import CRITERIA
+
+ALIGNS = ('free', 'request')
+SUMMARY_NAME = 'trace_summary.csv'
+APPLIED_NAME = 'trace_applied.csv'
+
+
+@dataclass
+class TraceSegment:
+    index: int
+    start: float          # 周期の先頭からの秒
+    bandwidth: str        # tc 形式（'5mbit'）
+    delay_ms: float
+    loss: float           # %
+
+
+def load_trace(path):
+    """トレースファイルを読み、(区間のリスト, 周期の長さ[秒]) を返す"""
+    rows = []
+    with open(path, newline='') as f:
+        for line_no, fields in enumerate(csv.reader(f), 1):
+            fields = [v.split('#', 1)[0].strip() for v in fields]
+            if not fields or not fields[0] or fields[0].startswith('#'):
+                continue
+            try:
+                t = float(fields[0])
+            except ValueError:
+                # ヘッダー行
+                continue
+            if len(fields) < 3:
+                raise ValueError(f"{path}:{line_no}: expected time_ms, rate, delay_ms[, loss]")
+            rate = fields[1].lower()
+            bandwidth = f"{rate}kbit" if rate.replace('.', '', 1).isdigit() else rate
+            parse_rate(bandwidth)
+            loss = float(fields[3].rstrip('%')) if len(fields) > 3 and fields[3] else 0.0
+            rows.append((t / 1000, bandwidth, float(fields[2]), loss))
+
+    if not rows:
+        raise ValueError(f"{path}: empty trace")
+    if rows[0][0] != 0:
+        raise ValueError(f"{path}: trace must start at time 0")
+    if any(b[0] <= a[0] for a, b in zip(rows, rows[1:])):
+        raise ValueError(f"{path}: times must be strictly increasing")
+    if len(rows) == 1:
+        raise ValueError(f"{path}: trace needs at least two rows")
+    segments = [TraceSegment(i, *row) for i, row in enumerate(rows)]
+    duration = rows[-1][0] + (rows[-1][0] - rows[-2][0])
+    return segments, duration
+
+
+def trace_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+class TraceReplayError(RuntimeError):
+    """区間の変更に失敗した（以降の計測はトレースどおりの条件にならない）"""
+
+
+class TraceReplayer:
+    """別スレッドでトレースを再生し、各区間が実際に有効になった時刻を記録する"""
+
+    def __init__(self, name, segments, duration, apply):
+        """apply(bandwidth, delay_ms, loss) は条件を設定する同期関数（Shaper.apply と同じ引数）"""
+        self.name = name
+        self.segments = segments
+        self.duration = duration
+        self.apply = apply
+        # 有効になった順の区間: dict(run, run_start, cycle, segment, cycle_start, scheduled, applied, apply_ms, skipped)
+        self.records = []
+        self._effective = []
+        self.run_index = -1
+        # 区間の変更に失敗したときの例外（以降は再生しない）
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """先頭の区間を設定してから再生を始める"""
+        self.run_index += 1
+        self._stop.clear()
+        t0 = time.perf_counter()
+        if not self._try_apply(t0, 0, 0, t0, 0):
+            return
+        self._thread = threading.Thread(target=self._run, args=(t0,), name=f"trace-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def check(self):
+        """区間の変更に失敗していれば TraceReplayError を送出する"""
+        if self.error is not None:
+            raise TraceReplayError(f"trace {self.name}: shaping change failed: {self.error}") from self.error
+
+    def _try_apply(self, t0, cycle, index, scheduled, skipped):
+        """区間を設定する（失敗したら error に記録して False を返す）"""
+        try:
+            self._apply(t0, cycle, index, scheduled, skipped)
+        except (ShapingError, OSError, ValueError) as e:
+            self.error = e
+            print(f"[ERROR] トレース {self.name} の区間 {index} を設定できません: {e}", file=sys.stderr)
+            return False
+        return True
+
+    def _apply(self, t0, cycle, index, scheduled, skipped):
+        segment = self.segments[index]
+        started = time.perf_counter()
+        self.apply(segment.bandwidth, segment.delay_ms, f"{segment.loss:g}%")
+        applied = time.perf_counter()
+        self.records.append({'run': self.run_index, 'run_start': t0, 'cycle': cycle, 'segment': index,
+                             'cycle_start': t0 + cycle * self.duration, 'scheduled': scheduled, 'applied': applied,
+                             'apply_ms': (applied - started) * 1000, 'skipped': skipped})
+        self._effective.append(applied)
+
+    def _run(self, t0):
+        n = len(self.segments)
+        cycle, index = 0, 1
+        while True:
+            scheduled = t0 + cycle * self.duration + self.segments[index].start
+            wait = scheduled - time.perf_counter()
+            if wait > 0 and self._stop.wait(wait):
+                return
+            if self._stop.is_set():
+                return
+            # 前の変更が長引いて既に終わった区間は飛ばす
+            skipped = 0
+            now = time.perf_counter()
+            while True:
+                next_cycle, next_index = (cycle, index + 1) if index + 1 < n else (cycle + 1, 0)
+                if t0 + next_cycle * self.duration + self.segments[next_index].start > now:
+                    break
+                cycle, index = next_cycle, next_index
+                skipped += 1
+            if not self._try_apply(t0, cycle, index, t0 + cycle * self.duration + self.segments[index].start, skipped):
+                return
+            cycle, index = (cycle, index + 1) if index + 1 < n else (cycle + 1, 0)
+
+    def annotate(self, started, ended):
+        """[started, ended]（perf_counter）に有効だった区間を結果CSVの列として返す"""
+        first = max(bisect.bisect_right(self._effective, started) - 1, 0)
+        last = max(bisect.bisect_right(self._effective, ended) - 1, 0)
+        records = self.records[first:last + 1]
+        if not records:
+            return {}
+        return {
+            'trace': self.name,
+            'trace_cycle': records[0]['cycle'],
+            'trace_offset': f"{started - records[0]['cycle_start']:.3f}",
+            'trace_segments': ';'.join(str(r['segment']) for r in records),
+        }
+
+    def write_log(self, path):
+        """区間の変更を trace_applied.csv に追記する（時刻は再生の開始からの秒）"""
+        f, writer = open_result_csv(path, TRACE_APPLIED_FIELDS)
+        with f:
+            for record in self.records:
+                segment = self.segments[record['segment']]
+                writer.writerow({
+                    'trace': self.name, 'run': record['run'], 'cycle': record['cycle'], 'segment': record['segment'],
+                    'scheduled_offset': f"{record['scheduled'] - record['run_start']:.6f}",
+                    'applied_offset': f"{record['applied'] - record['run_start']:.6f}",
+                    'apply_ms': f"{record['apply_ms']:.3f}", 'skipped': record['skipped'],
+                    'bandwidth': segment.bandwidth, 'delay_ms': f"{segment.delay_ms:g}", 'loss': f"{segment.loss:g}",
+                })
+
+
+async def run_traces(runner, traces, apply, align, applied_path):
+    """トレースを順に再生しながら計測する（traces: [(名前, 区間, 周期)]）
+
+    区間の変更に失敗したトレースはその時点で計測を中止し、ジャーナルに完了を記録しない
+    （--resume で最初から計測し直す）。中止したトレースの名前のリストを返す。
+    """
+    name, segments, _ = traces[0]
+    # 接続確認と安定化は最初のトレースの先頭の条件で行う
+    await asyncio.to_thread(apply, segments[0].bandwidth, segments[0].delay_ms, f"{segments[0].loss:g}%")
+    await warm_up(runner.url)
+    await runner.check_connectivity()
+    print("初期安定化実行中...")
+    await runner.stabilize()
+
+    journal = runner.journal
+    for label in journal.rollback(runner.log_dir, runner.timeline_dir):
+        print(f"書きかけのトレース {label} の結果を破棄して計測し直します")
+
+    f, writer = open_result_csv(runner.csv_path, TRACE_CSV_FIELDS)
+    summary_f, summary_writer = (open_result_csv(runner.stopping_csv_path, STOPPING_CSV_FIELDS)
+                                 if runner.stopping else (None, None))
+    runner._result_file = f
+    failed = []
+    try:
+        for n, (name, segments, duration) in enumerate(traces, 1):
+            if journal.is_done(name):
+                print(f"\n=== [{n}/{len(traces)}] トレース {name} === 完了済みのためスキップ")
+                continue
+            print(f"\n=== [{n}/{len(traces)}] トレース {name}: {len(segments)}区間, 周期 {duration:.3f}秒, "
+                  f"再生 {align} ===")
+            journal.start(name, [runner.csv_path, runner.stopping_csv_path, applied_path])
+            replayer = TraceReplayer(name, segments, duration, apply)
+            runner.trace = replayer
+            runner.trace_align = align == 'request'
+            replayer.start()
+            try:
+                if runner.stopping:
+                    times = await runner.run_latency_adaptive(writer, summary_writer, name)
+                else:
+                    times = await runner.run_latency(writer, name)
+            except TraceReplayError as e:
+                print(f"[ERROR] {e} — トレース {name} の計測を中止します", file=sys.stderr)
+                failed.append(name)
+                times = None
+            finally:
+                replayer.stop()
+                runner.trace = None
+            replayer.write_log(applied_path)
+            late = [r['applied'] - r['scheduled'] for r in replayer.records]
+            if late:
+                print(f"区間の変更: {len(replayer.records)}回, 遅れ 平均{statistics.fmean(late) * 1000:.2f}ms "
+                      f"最大{max(late) * 1000:.2f}ms, 飛ばした区間 {sum(r['skipped'] for r in replayer.records)}")
+            if times is None:
+                f.flush()
+                continue
+
+            f.flush()
+            if summary_f is not None:
+                summary_f.flush()
+            journal.finish(name, {label: statistics.fmean(t) if t else None for label, t in times.items()})
+    finally:
+        f.close()
+        if summary_f is not None:
+            summary_f.close()
+    return failed
+
+
+def write_summary(csv_path, output_path):
+    """トレース×プロトコルごとの標本数・平均・標準偏差・中央値・重なった区間数の平均を保存する"""
+    groups = {}
+    with open(csv_path, newline='') as f:
+        for row in csv.DictReader(f):
+            if row['success'] != '1':
+                continue
+            groups.setdefault((row['latency'], row['protocol']), []).append(
+                (float(row['time_total']), len(row['trace_segments'].split(';')) if row.get('trace_segments') else 0))
+
+    with open(output_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['trace', 'protocol', 'samples', 'mean', 'std', 'median', 'segments_mean'])
+        writer.writeheader()
+        for (name, protocol), values in sorted(groups.items()):
+            times = [t for t, _ in values]
+            writer.writerow({'trace': name, 'protocol': protocol, 'samples': len(times),
+                             'mean': f"{statistics.fmean(times):.6f}",
+                             'std': f"{statistics.stdev(times):.6f}" if len(times) > 1 else '',
+                             'median': f"{statistics.median(times):.6f}",
+                             'segments_mean': f"{statistics.fmean(n for _, n in values):.2f}"})
+    return len(groups)
+
+
+def main():
+    defaults = env_config()
+    parser = argparse.ArgumentParser(description='Replay bandwidth/delay/loss traces while benchmarking')
+    parser.add_argument('traces', nargs='+', help='トレースファイル（CSV: time_ms, rate, delay_ms, loss）')
+    parser.add_argument('--align', choices=ALIGNS, default='free',
+                        help='free=トレースを流し続ける, request=リクエストごとに先頭から再生し直す')
+    parser.add_argument('--url', default=TARGET_URL, help='計測対象のURL')
+    parser.add_argument('--iterations', type=int, default=defaults['iterations'], help='各トレースの反復回数')
+    parser.add_argument('--sleep', type=float, default=defaults['sleep'], help='反復間の待機時間（秒）')
+    parser.add_argument('--log-dir', help='出力先（既定: logs/trace_<日時>）')
+    parser.add_argument('--timeline', action='store_true', default=defaults['timeline'],
+                        help='受信スループットの時系列を <ログ>/timelines に保存')
+    parser.add_argument('--timeline-bin', type=float, default=defaults['timeline_bin'], help='時系列のビン幅（ミリ秒）')
+    parser.add_argument('--ci-width', type=float, default=defaults['ci_width'],
+                        help='逐次停止規則: 信頼区間の相対全幅の目標（docker_benchmark.py と同じ）')
+    parser.add_argument('--ci-target', choices=CRITERIA, default=defaults['ci_target'],
+                        help='逐次停止規則: mean / diff')
+    parser.add_argument('--min-iterations', type=int, default=defaults['min_iterations'], help='逐次停止規則: 最小反復回数')
+    parser.add_argument('--max-iterations', type=int, default=defaults['max_iterations'], help='逐次停止規則: 最大反復回数')
+    parser.add_argument('--schedule', choices=SCHEDULES, default=defaults['schedule'],
+                        help='計測順: sequential / randomized（トレースの順序とプロトコルの組の順序）')
+    parser.add_argument('--seed', type=int, default=defaults['seed'], help='--schedule randomized の乱数シード')
+    parser.add_argument('--no-docker', action='store_true', help='docker-compose の起動・停止を行わない')
+    parser.add_argument('--standin', action='store_true', help='standin_server.py をローカルで起動して計測する')
+    parser.add_argument('--emulator', action='store_true', help='tcの代わりに netem_proxy.py を経由して計測する')
+    parser.add_argument('--tc-netns', help='tcをこのネットワーク名前空間内で設定する（--no-docker を含意）')
+    parser.add_argument('--tc-dev', default='eth0', help='--tc-netns で設定するインターフェース')
+    parser.add_argument('--resume', action='store_true', default=defaults['resume'],
+                        help='--log-dir のジャーナルから再開する（完了済みのトレースをスキップ）')
+
+    args = parser.parse_args()
+    if args.resume and not args.log_dir:
+        parser.error('--resume には --log-dir が必要です')
+    traces = []
+    for path in args.traces:
+        try:
+            traces.append((trace_name(path), *load_trace(path)))
+        except (OSError, ValueError) as e:
+            parser.error(f"トレースを読み込めません: {e}")
+    if len({name for name, _, _ in traces}) < len(traces):
+        parser.error('トレースのファイル名（拡張子を除く）が重複しています')
+    lossy = [name for name, segments, _ in traces if any(segment.loss > 0 for segment in segments)]
+    if args.emulator and lossy:
+        parser.error(f"--emulator ではHTTP/2（TCP）に損失を与えられないため、損失のあるトレースは再生できません: "
+                     f"{', '.join(lossy)}（--tc-netns か Docker で再生してください）")
+    if args.standin or args.tc_netns:
+        args.no_docker = True
+    if args.no_docker and not (args.emulator or args.tc_netns):
+        parser.error('トレースの再生には --emulator か --tc-netns（または Docker のサーバーコンテナ）が必要です')
+
+    log_dir = args.log_dir or os.path.join('logs', f"trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(log_dir, exist_ok=True)
+    stopping = None
+    if args.ci_width is not None:
+        stopping = {'target_width': args.ci_width, 'criterion': args.ci_target,
+                    'min_iterations': args.min_iterations, 'max_iterations': args.max_iterations}
+    journal = Journal(log_dir, 'trace', resume=args.resume)
+    schedule = (args.resume and Schedule.load(log_dir)) or Schedule(args.schedule, args.seed)
+    schedule.save(log_dir)
+    traces = schedule.shuffle(traces, 'traces')
+    runner = BenchmarkRunner(args.url, log_dir, args.iterations, args.sleep,
+                             args.timeline_bin / 1000 if args.timeline else None, stopping, journal, schedule)
+    applied_path = os.path.join(log_dir, APPLIED_NAME)
+
+    print("=========================================")
+    print("トレース再生ベンチマーク開始")
+    print("=========================================")
+    for name, segments, duration in traces:
+        print(f"  {name}: {len(segments)}区間, 周期 {duration:.3f}秒")
+    print(f"反復回数: {args.iterations}回" if not stopping else f"反復回数: 逐次停止 ({args.ci_target}, 相対幅≤{args.ci_width})")
+    print(f"計測順: {schedule.kind}" + (f" (シード: {schedule.seed})" if schedule.paired else ""))
+    print(f"出力先: {log_dir}")
+
+    failed = []
+    if all(journal.is_done(name) for name, _, _ in traces):
+        print("全てのトレースが完了済みのため計測をスキップします")
+    else:
+        shaper = None
+        processes = []
+        try:
+            if args.standin:
+                port = urlparse(args.url).port or 443
+                print(f"代替サーバーを起動中... (standin_server.py, ポート {port})")
+                processes.append(standin_server.spawn(port, os.path.join(log_dir, 'standin.log')))
+            if not args.no_docker:
+                print("Docker環境を起動中...")
+                compose(traces[0][1][0].bandwidth, 'up', '-d')
+                print("サービス起動を待機中...")
+                time.sleep(STARTUP_WAIT_SEC)
+            if args.emulator:
+                target = urlparse(args.url)
+                upstream = (socket.gethostbyname(target.hostname), target.port or 443)
+                print(f"エミュレータを起動中... (netem_proxy.py, ポート {EMULATOR_PORT} → {upstream[0]}:{upstream[1]})")
+                processes.append(netem_proxy.spawn(EMULATOR_PORT, upstream,
+                                                   log_path=os.path.join(log_dir, 'emulator.log')))
+                runner.url = target._replace(netloc=f"{target.hostname}:{EMULATOR_PORT}").geturl()
+                shaper = Shaper(EmulatorBackend(('127.0.0.1', EMULATOR_PORT + 1)))
+            elif args.tc_netns:
+                shaper = open_shaper(args.tc_dev, netns=args.tc_netns)
+            else:
+                shaper = open_shaper('eth0', container=SERVER_CONTAINER)
+            print(f"tc設定方法: {shaper.name}")
+            failed = asyncio.run(run_traces(runner, traces, shaper.apply, args.align, applied_path))
+        finally:
+            if shaper is not None:
+                shaper.close()
+            for proc in processes:
+                proc.terminate()
+                proc.wait()
+            if not args.no_docker:
+                print("Docker環境を停止中...")
+                compose(traces[0][1][0].bandwidth, 'down', check=False)
+
+    summary_path = os.path.join(log_dir, SUMMARY_NAME)
+    groups = write_summary(runner.csv_path, summary_path)
+    print("")
+    print("=========================================")
+    print("トレース再生ベンチマーク完了")
+    print("=========================================")
+    print(f"結果ファイル: {runner.csv_path}")
+    print(f"区間の変更: {applied_path}")
+    print(f"トレース別サマリー: {summary_path} ({groups}行)")
+    print(f"完了: {log_dir}")
+    if failed:
+        print(f"[ERROR] 区間の変更に失敗して中止したトレース: {', '.join(failed)}（--resume で計測し直せます）",
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()